@@ -1,7 +1,65 @@
+import math
+from functools import lru_cache
 import numpy as np
-import scipy as sc
-from scipy.optimize import fsolve
-import sympy as sp
+
+
+# Equilibria and Jacobians only depend on (a, b, tau, I_ext), and every
+# simulation of an ensemble asks for them again with identical parameters,
+# so both are computed in closed form and memoized on the parameter tuple.
+
+@lru_cache(maxsize=1024)
+def fhn_equilibria(a, b, tau, I_ext):
+    """
+    All real equilibria of the FHN model, sorted by v.
+
+    Substituting the w-nullcline w = (v + a)/b into the v-nullcline gives the
+    depressed cubic
+        v^3 + p v + q = 0,  p = 3(1/b - 1),  q = 3(a/b - I_ext)
+    which is solved with Cardano's formula (one real root) or the
+    trigonometric form (three real roots).
+
+    Returns:
+        tuple: ((v_e, w_e), ...) with one or three equilibria.
+    """
+    if b == 0:
+        # Vertical w-nullcline v = -a: exactly one equilibrium
+        v = -a
+        return ((v, v - (v*v*v/3) + I_ext),)
+
+    p = 3*(1/b - 1)
+    q = 3*(a/b - I_ext)
+    disc = (q/2)**2 + (p/3)**3
+
+    if disc > 0:
+        sqrt_disc = math.sqrt(disc)
+        roots = [np.cbrt(-q/2 + sqrt_disc) + np.cbrt(-q/2 - sqrt_disc)]
+    elif p == 0:
+        roots = [0.0]
+    else:
+        r = 2*math.sqrt(-p/3)
+        phi = math.acos(max(-1.0, min(1.0, (3*q)/(p*r))))
+        roots = sorted({r*math.cos(phi/3 - 2*math.pi*k/3) for k in range(3)})
+
+    # One Newton step on the cubic polishes the rounding of the closed form
+    polished = []
+    for v in roots:
+        slope = 3*v*v + p
+        if slope != 0:
+            v = v - (v*v*v + p*v + q)/slope
+        polished.append(float(v))
+
+    return tuple((v, (v + a)/b) for v in polished)
+
+
+@lru_cache(maxsize=1024)
+def fhn_jacobian(a, b, tau, v):
+    """
+    Closed-form Jacobian of the FHN vector field at membrane potential v:
+        [[df/dv, df/dw],     [[1 - v^2,  -1    ],
+         [dg/dv, dg/dw]]  =   [1/tau,    -b/tau]]
+    (it does not depend on w or I_ext).
+    """
+    return ((1 - v*v, -1.0), (1/tau, -b/tau))
 
 class FHN:
     def __init__(self, a,b,tau,I_ext):
@@ -13,6 +71,7 @@ class FHN:
         self.w_e = None
         self.J = []
         self.J_e = []
+        self.stability = None
 
     # v: sodium-driven spike upswing (fast)
     # w: potassium / recovery / adaptation (slow)
@@ -29,7 +88,10 @@ class FHN:
     # less neuron-like  
 
     def f(self,vt,wt):
-        dvt = vt - (vt**3/3) - wt + self.I_ext
+        # vt*vt*vt rather than vt**3: plain multiplication rounds identically for
+        # Python floats, NumPy arrays and compiled kernels, so every integrator
+        # path produces bit-for-bit the same trajectory.
+        dvt = vt - (vt*vt*vt/3) - wt + self.I_ext
         return dvt
     
     def g(self, vt,wt):
@@ -39,27 +101,38 @@ class FHN:
 
     #An equilibrium point is any point that makes all rates 0 simultaneously
 
+    def get_equilibria(self):
+        # Every real root of the nullcline intersection (one in the excitable
+        # regime, up to three in the bistable regime)
+        return list(fhn_equilibria(self.a, self.b, self.tau, self.I_ext))
+
     def get_equilibrium(self):
-        #This creates an anonymous function called system.
-        # Input: state, which is a list or array of two numbers. Example: state = [v, w].
-        # Output: a list of two values:
-        # First element: self.f(state[0], state[1]) → f evaluated at v,w
-        # Second element: self.w(state[0], state[1]) → w evaluated at v,w
-        # So basically, system([v, w]) returns [f(v, w), w(v, w)]
-
-        system = lambda state: [self.f(state[0], state[1]), 
-                            self.g(state[0], state[1])]
-        initial_guess = [-1,0]
-        solution = fsolve(system, initial_guess)
-        self.v_e = solution[0]  # first value (state[0])
-        self.w_e = solution[1]  # second value (state[1])
+        # The equilibrium closest to [-1, 0], the initial guess the original
+        # fsolve-based search started from. In the excitable regime it is the
+        # only one.
+        initial_guess = (-1, 0)
+        self.v_e, self.w_e = min(self.get_equilibria(),
+                                 key=lambda e: (e[0] - initial_guess[0])**2 + (e[1] - initial_guess[1])**2)
         return self.v_e, self.w_e
 
     #After identifying the equilibrium points, the stability can be analysed using Jacobian matrix
 
+    def jacobian_at(self, v, w):
+        return np.array(fhn_jacobian(self.a, self.b, self.tau, float(v)))
+
     def jacobian(self):
+        # J is the closed-form Jacobian as a function of (v, w); J_e is its
+        # value at the equilibrium, as a 2x2 array ready for np.linalg.eigvals
         if self.v_e is None or self.w_e is None:
             self.get_equilibrium()
+        self.J = self.jacobian_at
+        self.J_e = self.jacobian_at(self.v_e, self.w_e)
+        return self.J, self.J_e
+
+    def symbolic_jacobian(self):
+        # SymPy form of the Jacobian, for inspection only. SymPy is imported
+        # here so that it never sits on the simulation import path.
+        import sympy as sp
         v = sp.symbols('v')
         w = sp.symbols('w') 
         a = sp.symbols('a')
@@ -69,18 +142,21 @@ class FHN:
         dw = (1/self.tau) * (v + a - (b*w))
         F = sp.Matrix([dv,dw])
         var = sp.Matrix([v,w])
-        self.J = F.jacobian(var)
-        self.J_e = self.J.subs({v: self.v_e, w: self.w_e, a: self.a, b: self.b, I: self.I_ext})
-        #Formatting required to use np.linalg.eigvals
-        self.J_e = np.array(self.J_e).astype(np.float64).reshape(2,2)
-        return self.J, self.J_e
+        return F.jacobian(var)
 
     #J = Jacobian Matrix
     #v = eigenvector
 
     def is_excitable(self):
+        # Stability of the equilibrium from get_equilibrium (kept in
+        # self.stability); the model is excitable when that equilibrium is
+        # stable and the only one. analysis.stability does the same for whole
+        # parameter grids at once.
+        if len(self.J_e) == 0:
+            self.jacobian()
         eigenvalues = np.linalg.eigvals(self.J_e)
         if np.all(np.real(eigenvalues) < 0):
-            stability = "stable"
+            self.stability = "stable"
         else:
-            stability = "unstable"
+            self.stability = "unstable"
+        return self.stability == "stable" and len(self.get_equilibria()) == 1
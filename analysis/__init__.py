@@ -1 +1,31 @@
-from .ensemble_stats import ensemble_stats
\ No newline at end of file
+import importlib
+
+from .ensemble_stats import ensemble_stats
+
+# Loaded on first attribute access (PEP 562): scipy is only imported by the
+# parts that need it (sweeps and the biological comparison).
+_LAZY = {
+    "SpikeStore": "spike_store",
+    "spike_statistics": "spike_stats",
+    "compare_bio": "bio_comparison",
+    "run_sweep": "parameter_sweep",
+    "biological_isi": "parameter_sweep",
+    "load_reference": "reference",
+    "escape_rate": "rare_events",
+    "stability_map": "stability",
+    "OnlineStats": "online_stats",
+}
+
+__all__ = ["ensemble_stats", *_LAZY]
+
+
+def __getattr__(name):
+    if name not in _LAZY:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{_LAZY[name]}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
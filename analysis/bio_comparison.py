@@ -0,0 +1,97 @@
+import numpy as np
+from analysis.ensemble_stats import ensemble_stats
+from simulation.config import load_settings
+from analysis.reference import load_reference
+from analysis.bootstrap import DEFAULT_RESAMPLES, bootstrap, ks_permutation_test
+
+
+def compare_bio(ch, sigma, ensemble, n_resamples=DEFAULT_RESAMPLES, n_permutations=0, seed=0, max_workers=1):
+    """
+    Compares the ISI statistics of the FHN and LIF models with the biological data.
+
+    This is the computation behind "Comparison with Biological Ground Truth" in
+    main.py: an FHN ensemble (multiplicative if ch is 3, additive otherwise) and a
+    LIF ensemble are simulated at the same sigma, and their CVs and
+    Kolmogorov-Smirnov distances to the biological ISI distribution are computed.
+
+    Args:
+        ch (int): The simulation type chosen by the user.
+        sigma (float): Noise intensity (0 is replaced by 0.05 so the FHN fires at all).
+        ensemble (callable): ensemble(ch, sigma) -> SpikeStore, e.g. a cached,
+            seeded analysis.ensemble_stats.run_ensemble.
+        n_resamples (int): Bootstrap resamples for the confidence intervals (0: none).
+        n_permutations (int): Permutations for the KS p-values (0: none).
+        seed (int): Seed of the resampling (analysis.bootstrap).
+        max_workers (int): Processes for the resampling (None: all cores).
+
+    Returns:
+        dict: fhn_label, sigma, the CVs (bio_cv, fhn_cv, lif_cv; None-safe as 0.0),
+            the Fano factors (fhn_fano, lif_fano), ks_fhn and ks_lif (None when a
+            model produced no ISIs), 95% bootstrap intervals of each of these as
+            <name>_ci ((low, high) or None), permutation p-values ks_fhn_p and
+            ks_lif_p (None unless n_permutations > 0), and the ISI arrays in ms
+            (bio_isi_ms, fhn_isi_ms, lif_isi_ms), and the precomputed biological
+            density histogram as bio_histogram (densities, bin edges).
+    """
+    stats = ensemble_stats()
+    reference = load_reference()
+    bio_isi_ms = reference.isi_ms
+
+    # Safeguard sigma so FHN doesn't crash on 0 spikes
+    fhn_sigma = 0.05 if sigma == 0.0 else sigma
+
+    # Run Multiplicative FHN if the user chose 3, otherwise Additive
+    fhn_ch = ch if ch in [2, 3] else 2
+    fhn_label = "Multiplicative FHN" if fhn_ch == 3 else "Additive FHN"
+
+    fhn_store = ensemble(fhn_ch, fhn_sigma)
+    lif_store = ensemble(4, fhn_sigma)
+    _, _, fhn_isi_timesteps, fhn_cv, fhn_fano = stats.store_stats(fhn_store)
+    _, _, lif_isi_timesteps, lif_cv, lif_fano = stats.store_stats(lif_store)
+
+    # Convert to ms with the timestep each ensemble ran with
+    fhn_ms = np.array(fhn_isi_timesteps) * fhn_store.meta.get("dt", load_settings().dt)
+    lif_ms = np.array(lif_isi_timesteps) * lif_store.meta.get("dt", load_settings().dt)
+
+    ks_fhn = ks_lif = None
+    if len(fhn_ms) > 0 and len(lif_ms) > 0:
+        ks_fhn = reference.ks(fhn_ms)
+        ks_lif = reference.ks(lif_ms)
+
+    # Uncertainty: CV and Fano resample trials, KS resamples both ISI samples
+    fhn_stats = fhn_store.statistics()
+    lif_stats = lif_store.statistics()
+    intervals = bootstrap({
+        "bio_cv": ("cv", bio_isi_ms),
+        "fhn_cv": ("mean_cv", fhn_stats["cv"]),
+        "lif_cv": ("mean_cv", lif_stats["cv"]),
+        "fhn_fano": ("fano", fhn_stats["counts"]),
+        "lif_fano": ("fano", lif_stats["counts"]),
+        # Like the point values, no KS interval unless both models have ISIs
+        "ks_fhn": ("ks", (fhn_ms if ks_fhn is not None else [], bio_isi_ms)),
+        "ks_lif": ("ks", (lif_ms if ks_lif is not None else [], bio_isi_ms)),
+    }, n_resamples, seed=seed, max_workers=max_workers)
+
+    p_values = {"ks_fhn_p": None, "ks_lif_p": None}
+    if n_permutations > 0 and ks_fhn is not None:
+        p_values["ks_fhn_p"] = ks_permutation_test(fhn_ms, bio_isi_ms, n_permutations, seed, max_workers)[1]
+        p_values["ks_lif_p"] = ks_permutation_test(lif_ms, bio_isi_ms, n_permutations, seed, max_workers)[1]
+
+    return {
+        "fhn_label": fhn_label,
+        "sigma": fhn_sigma,
+        "bio_cv": reference.cv,
+        # Replace 'None' CVs with 0.0 so formatting doesn't crash
+        "fhn_cv": float(fhn_cv) if fhn_cv is not None else 0.0,
+        "lif_cv": float(lif_cv) if lif_cv is not None else 0.0,
+        "ks_fhn": None if ks_fhn is None else float(ks_fhn),
+        "ks_lif": None if ks_lif is None else float(ks_lif),
+        "fhn_fano": None if fhn_fano is None else float(fhn_fano),
+        "lif_fano": None if lif_fano is None else float(lif_fano),
+        **{f"{name}_ci": interval for name, interval in intervals.items()},
+        **p_values,
+        "bio_isi_ms": bio_isi_ms,
+        "bio_histogram": (reference.histogram, reference.bins),
+        "fhn_isi_ms": fhn_ms,
+        "lif_isi_ms": lif_ms,
+    }
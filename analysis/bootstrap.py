@@ -0,0 +1,217 @@
+"""
+Bootstrap and permutation uncertainty for model-vs-biology comparisons.
+
+All resamples of a block are drawn as one (n_resamples, n) index matrix, and
+the statistics are evaluated for every row at once:
+
+    CV, Fano     row-wise moments of the resampled per-trial CVs / spike counts
+    KS distance  two-sample Kolmogorov-Smirnov statistic of every row pair.
+                 Both samples are mapped once onto the sorted array of their
+                 pooled distinct values, and the ECDFs of all resamples are
+                 cumulative rank counts on that grid
+
+so no scipy.stats.ks_2samp call (and no sort) is made per resample. Blocks are
+sized to keep the per-block arrays near 32 MB, and the resamples are split into
+tasks that run on a ProcessPoolExecutor. Each task gets its own child
+np.random.SeedSequence, so results depend on the seed only, not on the number
+of workers.
+"""
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+DEFAULT_RESAMPLES = 2000
+CONFIDENCE = 0.95
+
+# Elements per resample block (~32 MB of 8-byte values)
+BLOCK_ELEMENTS = 2**22
+
+
+def resample_indices(n, n_resamples, rng):
+    """(n_resamples, n) matrix of indices drawn with replacement from range(n)."""
+    return rng.integers(0, n, size=(n_resamples, n))
+
+
+def value_ranks(x, y):
+    """
+    Maps two samples onto the sorted array of their pooled distinct values.
+
+    Returns:
+        tuple: (x_ranks, y_ranks, n_values) with integer ranks in [0, n_values).
+    """
+    values = np.unique(np.concatenate([np.ravel(x), np.ravel(y)]))
+    return np.searchsorted(values, x), np.searchsorted(values, y), len(values)
+
+
+def ks_from_ranks(x_ranks, y_ranks, n_values):
+    """
+    Two-sample KS statistics of matching rows of rank matrices (see value_ranks).
+
+    Both ECDFs are evaluated on the whole sorted value grid: per-row counts
+    of every rank (one bincount for the whole block) are accumulated along the
+    rows, so ties need no special care and the cost is linear in the block.
+    """
+    x_ranks = np.atleast_2d(x_ranks)
+    y_ranks = np.atleast_2d(y_ranks)
+    B, n = x_ranks.shape
+    m = y_ranks.shape[1]
+    row_start = (np.arange(B)*n_values)[:, None]
+    F_x = np.bincount((x_ranks + row_start).ravel(), minlength=B*n_values).reshape(B, n_values).cumsum(axis=1)
+    F_y = np.bincount((y_ranks + row_start).ravel(), minlength=B*n_values).reshape(B, n_values).cumsum(axis=1)
+    return np.abs(F_x/n - F_y/m).max(axis=1)
+
+
+def ks_statistic(x, y):
+    """
+    Two-sample KS statistics sup_t |F_x(t) - F_y(t)| of matching rows of x and y.
+
+    Args:
+        x (ndarray): (B, n) samples (or one 1-D sample).
+        y (ndarray): (B, m) samples (or one 1-D sample).
+
+    Returns:
+        ndarray: (B,) statistics, equal to ks_2samp(x[b], y[b]).statistic.
+    """
+    return ks_from_ranks(*value_ranks(np.atleast_2d(x), np.atleast_2d(y)))
+
+
+def cv_rows(samples):
+    """std/mean of every row (NaN where the mean is 0)."""
+    mean = samples.mean(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(mean > 0, samples.std(axis=1)/mean, np.nan)
+
+
+def fano_rows(counts):
+    """var/mean of every row of spike counts (NaN where the mean is 0)."""
+    mean = counts.mean(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(mean > 0, counts.var(axis=1)/mean, np.nan)
+
+
+def percentile_ci(values, confidence=CONFIDENCE):
+    """
+    Percentile interval of a bootstrap distribution, ignoring NaN resamples.
+
+    Returns:
+        tuple: (low, high), or None when no resample is defined.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    values = values[~np.isnan(values)]
+    if len(values) == 0:
+        return None
+    alpha = (1 - confidence)/2
+    low, high = np.quantile(values, [alpha, 1 - alpha])
+    return float(low), float(high)
+
+
+def _block_rows(sample_size, n_resamples):
+    return max(1, min(n_resamples, BLOCK_ELEMENTS // max(sample_size, 1)))
+
+
+def _bootstrap_block(seed_seq, n_resamples, samples):
+    """
+    Bootstrap distributions of every statistic for n_resamples resamples.
+
+    samples maps a statistic name to (kind, data): ("cv", x), ("mean_cv", per-trial
+    CVs), ("fano", counts) or ("ks", value_ranks(x, y)).
+    """
+    rng = np.random.default_rng(seed_seq)
+    out = {name: [] for name in samples}
+    for name, (kind, data) in samples.items():
+        size = sum(len(d) for d in data[:2]) + data[2] if kind == "ks" else len(data)
+        rows = _block_rows(size, n_resamples)
+        for start in range(0, n_resamples, rows):
+            b = min(rows, n_resamples - start)
+            if kind == "ks":
+                x_ranks, y_ranks, n_values = data
+                out[name].append(ks_from_ranks(x_ranks[resample_indices(len(x_ranks), b, rng)],
+                                               y_ranks[resample_indices(len(y_ranks), b, rng)], n_values))
+            else:
+                resampled = data[resample_indices(len(data), b, rng)]
+                if kind == "cv":
+                    out[name].append(cv_rows(resampled))
+                elif kind == "mean_cv":
+                    with np.errstate(invalid="ignore"):
+                        # All-NaN rows (no trial with an ISI) stay NaN
+                        counts = (~np.isnan(resampled)).sum(axis=1)
+                        out[name].append(np.where(counts > 0, np.nansum(resampled, axis=1)/np.maximum(counts, 1), np.nan))
+                else:
+                    out[name].append(fano_rows(resampled))
+    return {name: np.concatenate(parts) if parts else np.array([]) for name, parts in out.items()}
+
+
+def _permutation_block(seed_seq, n_permutations, x_ranks, y_ranks, n_values):
+    rng = np.random.default_rng(seed_seq)
+    pooled = np.concatenate([x_ranks, y_ranks])
+    n = len(x_ranks)
+    rows = _block_rows(len(pooled) + n_values, n_permutations)
+    out = []
+    for start in range(0, n_permutations, rows):
+        b = min(rows, n_permutations - start)
+        # One random permutation of the pooled sample per row
+        shuffled = rng.permuted(np.broadcast_to(pooled, (b, len(pooled))), axis=1)
+        out.append(ks_from_ranks(shuffled[:, :n], shuffled[:, n:], n_values))
+    return np.concatenate(out)
+
+
+def _run_blocks(func, n, seed, max_workers, *args):
+    # Work is split into fixed-size tasks (independent of max_workers), each
+    # with its own child stream, so the result only depends on the seed
+    tasks = max(1, min(n, 16))
+    sizes = [n // tasks + (k < n % tasks) for k in range(tasks)]
+    children = np.random.SeedSequence(seed).spawn(tasks)
+    if max_workers == 1:
+        return [func(child, size, *args) for child, size in zip(children, sizes)]
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(func, children, sizes, *([arg]*tasks for arg in args)))
+
+
+def bootstrap(samples, n_resamples=DEFAULT_RESAMPLES, confidence=CONFIDENCE, seed=None, max_workers=1):
+    """
+    Bootstrap confidence intervals of several statistics at once.
+
+    Args:
+        samples (dict): name -> (kind, data) with kind one of
+            "cv"       data is a 1-D sample (e.g. pooled ISIs); statistic std/mean
+            "mean_cv"  data are per-trial CVs (NaN allowed); statistic their mean
+            "fano"     data are per-trial spike counts; statistic var/mean
+            "ks"       data is (x, y); both are resampled; statistic the KS distance
+        n_resamples (int): Bootstrap resamples per statistic.
+        confidence (float): Coverage of the percentile intervals.
+        seed (int): Root seed of the resampling streams.
+        max_workers (int): Processes (None: all cores, 1: in-process).
+
+    Returns:
+        dict: name -> (low, high) percentile interval (None when undefined).
+    """
+    intervals = dict.fromkeys(samples)
+    # Empty samples have no interval
+    samples = {name: (kind, value_ranks(*(np.asarray(d, dtype=np.float64) for d in data)) if kind == "ks"
+                      else np.asarray(data, dtype=np.float64))
+               for name, (kind, data) in samples.items()
+               if (len(data[0]) and len(data[1]) if kind == "ks" else len(data))}
+    if not samples or n_resamples < 1:
+        return intervals
+    parts = _run_blocks(_bootstrap_block, n_resamples, seed, max_workers, samples)
+    intervals.update({name: percentile_ci(np.concatenate([p[name] for p in parts]), confidence) for name in samples})
+    return intervals
+
+
+def ks_permutation_test(x, y, n_permutations=DEFAULT_RESAMPLES, seed=None, max_workers=1):
+    """
+    Permutation p-value of the two-sample KS distance between x and y.
+
+    The pooled sample is shuffled n_permutations times and split into groups of
+    the original sizes; p = (1 + #{D_perm >= D_obs}) / (1 + n_permutations).
+
+    Returns:
+        tuple: (observed KS distance, p-value).
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    ranks = value_ranks(x, y)
+    observed = float(ks_from_ranks(*ranks)[0])
+    null = np.concatenate(_run_blocks(_permutation_block, n_permutations, seed, max_workers, *ranks))
+    # Tolerance for float noise in D, which only takes values k/n - l/m
+    p_value = (1 + np.count_nonzero(null >= observed - 1e-12))/(1 + len(null))
+    return observed, float(p_value)
@@ -0,0 +1,245 @@
+"""
+Checkpoint / resume of long seeded ensembles and parameter sweeps.
+
+A checkpointed ensemble is simulated in blocks of trials, and every block in
+chunks of timesteps. The checkpoint directory holds
+
+    manifest.json             run description; resuming with a different run fails
+    block_000000/
+        segment_000000.npz    spikes (trial, step) found since the previous
+        segment_000001.npz    checkpoint, append-only
+        state.npz             integrator state vectors after the last segment
+        state.json            next timestep, number of segments and the bit
+                              generator state of every trial's random stream
+        done                  marker of a finished block
+    block_000100/
+        ...
+
+Files are written to a temporary name and renamed into place, and the state
+always after its segment, so a crash leaves the last complete checkpoint
+intact (a segment written after it is discarded on resume). Resuming skips
+finished blocks, restores the state vectors and random streams of an
+interrupted block and continues at its next timestep. Every trial draws from
+its own stream (simulation.rng), so a resumed run produces exactly the spikes
+of an uninterrupted one.
+
+Sweeps (analysis.parameter_sweep) append one JSON line per finished grid cell
+to rows.jsonl and keep the ensemble checkpoint of every running cell in
+cell_<k>/, so a resumed sweep re-runs only unfinished cells, from their
+last checkpoint.
+"""
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+import numpy as np
+from simulation.batched import _split_by_trial
+from simulation.rng import TrialStreams
+
+# Trials per block, and seconds of simulation between two checkpoints of a block
+BLOCK_TRIALS = 100
+CHECKPOINT_SECONDS = 60.0
+
+
+def _replace_into(path, write):
+    # Write to a temporary sibling, then rename: readers never see half a file
+    tmp = path.with_name(f".{path.name}.tmp")
+    write(tmp)
+    os.replace(tmp, path)
+
+
+def save_npz(path, **arrays):
+    """np.savez to path, atomically."""
+    def write(tmp):
+        with open(tmp, "wb") as f:
+            np.savez(f, **arrays)
+    _replace_into(Path(path), write)
+
+
+def save_json(path, data):
+    """json.dump to path, atomically."""
+    def write(tmp):
+        with open(tmp, "w") as f:
+            json.dump(data, f, indent=2, default=float)
+    _replace_into(Path(path), write)
+
+
+def seed_description(seed):
+    """A JSON form of an int or SeedSequence seed (for manifests)."""
+    if isinstance(seed, np.random.SeedSequence):
+        return {"entropy": seed.entropy, "spawn_key": list(seed.spawn_key)}
+    return int(seed)
+
+
+def open_manifest(directory, manifest):
+    """
+    Creates the checkpoint directory with its manifest, or checks that an
+    existing one describes the same run.
+
+    Raises:
+        ValueError: The directory holds a checkpoint of a different run.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / "manifest.json"
+    # Round trip through JSON so tuples and numpy scalars compare as stored
+    manifest = json.loads(json.dumps(manifest, default=float))
+    if path.exists():
+        with open(path) as f:
+            stored = json.load(f)
+        if stored != manifest:
+            raise ValueError(f"{directory} holds a checkpoint of a different run; "
+                             "use another directory or remove it")
+    else:
+        save_json(path, manifest)
+    return directory
+
+
+class _Block:
+    """Checkpoint files of one block of trials."""
+
+    def __init__(self, directory, start, n_trials, seed):
+        self.path = Path(directory) / f"block_{start:06d}"
+        self.path.mkdir(exist_ok=True)
+        self.streams = TrialStreams(seed, n_trials, start)
+        self.n_trials = n_trials
+        self.state = None
+        self.segments = 0
+        self._buffer = ([], [])
+
+    @property
+    def done(self):
+        return (self.path / "done").exists()
+
+    def restore(self):
+        """Loads the last checkpoint (if any); returns the integrator state or None."""
+        info_path = self.path / "state.json"
+        if info_path.exists():
+            with open(info_path) as f:
+                info = json.load(f)
+            with np.load(self.path / "state.npz") as arrays:
+                self.state = {"step": info["step"], **{name: arrays[name] for name in arrays.files}}
+            self.segments = info["segments"]
+            self.streams.set_state(info["rng"])
+        # Segments written after the last state belong to no checkpoint
+        for path in self.path.glob("segment_*.npz"):
+            if int(path.stem.split("_")[1]) >= self.segments:
+                path.unlink()
+        return self.state
+
+    def record(self, trial_idx, step_idx):
+        self._buffer[0].append(np.asarray(trial_idx, dtype=np.int64))
+        self._buffer[1].append(np.asarray(step_idx, dtype=np.int64))
+
+    def flush(self, step=None, state=None):
+        """
+        Writes the buffered spikes as a new segment, then (unless state is None,
+        as for the last segment of a block) the state after it.
+        """
+        trials, steps = self._buffer
+        save_npz(self.path / f"segment_{self.segments:06d}.npz",
+                 trial=np.concatenate(trials) if trials else np.array([], dtype=np.int64),
+                 step=np.concatenate(steps) if steps else np.array([], dtype=np.int64))
+        self.segments += 1
+        self._buffer = ([], [])
+        if state is None:
+            return
+        save_npz(self.path / "state.npz", **{name: np.array(value) for name, value in state.items()})
+        save_json(self.path / "state.json", {"step": step, "segments": self.segments,
+                                             "rng": self.streams.get_state()})
+
+    def finish(self):
+        (self.path / "done").touch()
+        for name in ("state.npz", "state.json"):
+            (self.path / name).unlink(missing_ok=True)
+
+    def spikes(self):
+        """One sorted array of spike timesteps per trial, from all segments."""
+        trials, steps = [], []
+        for path in sorted(self.path.glob("segment_*.npz")):
+            with np.load(path) as segment:
+                trials.append(segment["trial"])
+                steps.append(segment["step"])
+        # Segments are in time order, so the stable per-trial split keeps steps sorted
+        trials = [t for t in trials if len(t)]
+        steps = [s for s in steps if len(s)]
+        return _split_by_trial(trials, steps, self.n_trials)
+
+
+def run_checkpointed(simulate, n_trials, seed, directory, manifest, block_trials=BLOCK_TRIALS,
+                     every=CHECKPOINT_SECONDS, verbose=True):
+    """
+    Runs a seeded ensemble in checkpointed blocks of trials, resuming from an
+    existing checkpoint in directory.
+
+    Args:
+        simulate (callable): simulate(n_trials, rng, state, on_chunk) running a
+            batch with the batched-integrator interface (see
+            analysis.ensemble_stats.ensemble_stats.batched_spikes).
+        n_trials (int): Trials of the ensemble.
+        seed (int or SeedSequence): Ensemble seed (trial k uses simulation.rng.trial_rng(seed, k)).
+        directory (str or Path): Checkpoint directory.
+        manifest (dict): Run description stored with the checkpoint.
+        block_trials (int): Trials per block.
+        every (float): Seconds between two checkpoints of a block.
+        verbose (bool): Print a line per block and per checkpoint.
+
+    Returns:
+        list: One ndarray of spike timesteps per trial.
+    """
+    block_trials = max(1, int(block_trials))
+    directory = open_manifest(directory, dict(manifest, n_trials=n_trials, stream_seed=seed_description(seed),
+                                              block_trials=block_trials))
+    trials = []
+    for start in range(0, n_trials, block_trials):
+        block = _Block(directory, start, min(block_trials, n_trials - start), seed)
+        if not block.done:
+            state = block.restore()
+            if verbose:
+                resumed = "" if state is None else f", resumed at step {state['step']}"
+                print(f"Trials {start}-{start + block.n_trials - 1} of {n_trials}{resumed}...")
+            last = time.monotonic()
+
+            def on_chunk(step, chunk_state, trial_idx, step_idx):
+                nonlocal last
+                block.record(trial_idx, step_idx)
+                if time.monotonic() - last >= every:
+                    block.flush(step, chunk_state)
+                    last = time.monotonic()
+                    if verbose:
+                        print(f"  checkpoint at step {step}")
+
+            simulate(block.n_trials, block.streams, state, on_chunk)
+            block.flush()
+            block.finish()
+        trials.extend(block.spikes())
+    return trials
+
+
+def completed_rows(directory):
+    """{cell index: row} of the cells a checkpointed sweep has finished."""
+    path = Path(directory) / "rows.jsonl"
+    rows = {}
+    if path.exists():
+        with open(path) as f:
+            for line in f:
+                # A line cut short by a crash is simply not a finished cell
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                rows[entry["index"]] = entry["row"]
+    return rows
+
+
+def append_row(directory, index, row):
+    """Appends a finished sweep cell to rows.jsonl and removes its ensemble checkpoint."""
+    path = Path(directory) / "rows.jsonl"
+    # Start on a fresh line if a crash cut the last one short
+    torn = path.exists() and path.stat().st_size > 0 and path.read_bytes()[-1:] != b"\n"
+    with open(path, "a") as f:
+        f.write(("\n" if torn else "") + json.dumps({"index": index, "row": row}, default=float) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    shutil.rmtree(path.parent / f"cell_{index:05d}", ignore_errors=True)
@@ -1,6 +1,42 @@
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 import simulation
 from simulation.path_calling import path_calling_lif
+from analysis.spike_store import SpikeStore
+from simulation.cache import simulation_key
+from simulation.config import load_settings
+from analysis.spike_stats import spike_statistics
+from simulation.rng import TrialStreams
+
+# Integration scheme of every simulation type. It is part of the cache key, so
+# it is kept next to the dispatch that uses it; the initial conditions (also in
+# the key) come from simulation.config.load_settings().
+INTEGRATORS = {1: "euler", 2: "euler_maruyama", 3: "heun", 4: "euler_maruyama_lif"}
+
+
+def _trial_block(ch, sigma, params, seed, start, n_trials, settings):
+    # Trials start, ..., start + n_trials - 1 of a seeded ensemble (pool task).
+    # settings is resolved by the parent: config overrides are process-local.
+    return ensemble_stats().batched_spikes(ch, sigma, n_trials, params, TrialStreams(seed, n_trials, start),
+                                           settings=settings)
+
+
+def _accumulate_block(ch, sigma, params, seed, start, n_trials, settings):
+    # The same block, reduced to a mergeable OnlineStats partial (pool task)
+    from analysis.online_stats import OnlineStats
+    return OnlineStats(settings.dt).add_trials(_trial_block(ch, sigma, params, seed, start, n_trials, settings))
+
+
+def _sim_settings(settings, dt, T):
+    # SimSettings of a run: the config's (overrides included) unless given,
+    # with dt / T replaced where set
+    settings = load_settings() if settings is None else settings
+    changes = {name: value for name, value in (("dt", dt), ("T", T)) if value is not None}
+    return settings.replace(**changes) if changes else settings
+
 
 class ensemble_stats:
     """
@@ -13,16 +49,24 @@ class ensemble_stats:
     def __init__(self):
         pass
 
-    def trials_stats(self,ch, sigma):
+    def trials_stats(self,ch, sigma, n_trials=100, params=None, rng=None, verbose=True, checkpoint=None):
         """
-        Executes 100 simulation trials and calculates aggregate firing statistics.
+        Executes an ensemble of simulation trials and calculates aggregate firing statistics.
         
-        This method manages the ensemble execution loop and processes the resulting 
-        spike data to compute the Inter-Spike Interval (ISI) distribution, 
-        Coefficient of Variation (CV), and Fano Factor.
+        All trials are advanced together by the batched integrators in 
+        simulation.batched, which hold the ensemble as (n_trials,) state vectors. 
+        The resulting spike data is processed to compute the Inter-Spike Interval (ISI) 
+        distribution, Coefficient of Variation (CV), and Fano Factor.
 
         Args:
-            ch (int): The simulation type (1: Deterministic, 2: Additive, 3: Multiplicative).
+            ch (int): The simulation type (1: Deterministic, 2: Additive, 3: Multiplicative, 4: LIF).
+            sigma (float): Noise intensity.
+            n_trials (int): Number of independent trials in the ensemble (default 100).
+            params (tuple): Optional model parameters overriding the JSON config 
+                ((I_ext, a, b, tau) for FHN, (I_ext, R, V_r, tau) for LIF).
+            rng: Optional random source or seed (see simulation.rng).
+            verbose (bool): Print a progress line before simulating.
+            checkpoint (str or Path): Optional checkpoint directory (see run_ensemble).
         
         Returns:
             tuple: 
@@ -33,44 +77,262 @@ class ensemble_stats:
                 - fano_factor (float): Fano Factor (variability of spike counts).
         """
 
-        trial_spike_timing_dict = {}
-        trial_spike_count_dict = {}
-
-        # 1. Ensemble Execution: Collect raw data over 100 independent trials
-        for i in range(1,101):
-            if i % 10 == 0:  # This will give an update every 10 trials
-                print(f"Simulation in progress: {i}% complete...")
-            trial_data = self.spikes(ch,sigma)
-            trial_spike_timing_dict[i] = trial_data
-            trial_spike_count_dict[i] = len(trial_data)
-
-        # 2. Data Preparation for Statistical Analysis
-        spike_trials = list(trial_spike_timing_dict.values())
-        counts = np.array(list(trial_spike_count_dict.values()))
-
-        all_isi = []  # Master list of all intervals across the ensemble
-        cv_trial = []  # List of CV values calculated per individual trial
-
-        # 3. ISI and CV Calculation
-        # Iterate through trials to find the intervals between spikes
-        for trial in spike_trials:
-            if len(trial) > 1:
-                isi_trial = np.diff(trial)
-                cv_trial.append(np.std(isi_trial)/np.mean(isi_trial))
-                all_isi.extend(isi_trial.tolist())
-
-        if len(cv_trial) > 0:
-            cv = np.mean(cv_trial)
-        else:
-            cv = None
+        store = self.run_ensemble(ch, sigma, n_trials, params=params, rng=rng, verbose=verbose, checkpoint=checkpoint)
+        return self.store_stats(store)
+
+    def run_ensemble(self, ch, sigma, n_trials=100, params=None, rng=None, seed=None, dt=None, T=None, verbose=True, cache=None,
+                     max_workers=1, checkpoint=None, settings=None):
+        """
+        Simulates an ensemble and packs its spike times into a SpikeStore.
 
-        if np.mean(counts) > 0:
-            fano_factor = np.var(counts) / np.mean(counts)
+        The store carries the run description (model, sigma, parameters, seed, 
+        dt, T) as metadata, so it can be saved with SpikeStore.save and analysed 
+        again later without re-simulating.
+
+        Args:
+            ch (int): The simulation type (1: Deterministic, 2: Additive, 3: Multiplicative, 4: LIF).
+            sigma (float): Noise intensity.
+            n_trials (int): Number of independent trials.
+            params (tuple): Optional model parameters overriding the JSON config.
+            rng: Optional random source or seed (see simulation.rng).
+            seed (int): Ensemble seed when rng is not given. Trial k draws from
+                its own stream simulation.rng.trial_rng(seed, k), so every trial
+                is the same whatever n_trials and max_workers are.
+            cache (SimulationCache): Optional result cache. Only seeded runs 
+                (seed given, no rng) are reproducible, so only those are cached.
+            max_workers (int): Processes for a seeded run (None: all cores, 1:
+                in-process). The trials are split into contiguous blocks; the
+                result is bit-for-bit the same as in-process.
+            checkpoint (str or Path): Optional checkpoint directory for a seeded
+                run (seed, or rng given as a seed). Completed trials, integrator
+                state and random streams are saved periodically, and a rerun
+                with the same directory resumes where the last run stopped
+                (analysis.checkpoint). Checkpointed runs are in-process.
+            dt, T (float): Timestep and duration (default: those of settings).
+            settings (SimSettings): Thresholds, refractory period, initial
+                conditions, dt and T (default: simulation.config.load_settings(),
+                overrides included).
+
+        Returns:
+            SpikeStore: CSR-style spike indices plus run metadata.
+        """
+        if params is None:
+            params = path_calling_lif() if ch == 4 else simulation.path_calling_fhn()
+        settings = _sim_settings(settings, dt, T)
+        meta = {
+            "ch": ch,
+            "model": "LIF" if ch == 4 else "FHN",
+            "integrator": INTEGRATORS.get(ch),
+            "initial_conditions": list(settings.initial_conditions(ch)),
+            "v_th": settings.v_th_lif if ch == 4 else settings.v_th_fhn,
+            "t_ref": settings.t_ref if ch == 4 else None,
+            "sigma": sigma,
+            "params": list(params),
+            "seed": seed,
+            "n_trials": n_trials,
+            "dt": settings.dt,
+            "T": settings.T,
+        }
+
+        use_cache = cache is not None and seed is not None and rng is None
+        if use_cache:
+            key = simulation_key(**meta)
+            hit = cache.get(key)
+            if hit is not None:
+                arrays, cached_meta = hit
+                return SpikeStore(arrays["spikes"], arrays["offsets"], cached_meta)
+
+        # 1. Ensemble Execution: Collect raw data over n_trials independent trials
+        if verbose:
+            print(f"Simulating {n_trials} trials...")
+        if checkpoint is not None:
+            trials = self._checkpointed_spikes(ch, sigma, n_trials, params, seed if rng is None else rng,
+                                               settings, checkpoint, meta, verbose)
+        elif rng is None and seed is not None and max_workers != 1:
+            trials = self._pooled_spikes(ch, sigma, n_trials, params, seed, settings, max_workers)
         else:
-            fano_factor = None
+            if rng is None and seed is not None:
+                rng = TrialStreams(seed, n_trials)
+            trials = self.batched_spikes(ch, sigma, n_trials, params, rng, settings=settings)
+        store = SpikeStore.from_trials(trials, meta)
+
+        if use_cache:
+            cache.put(key, {"spikes": store.spikes, "offsets": store.offsets}, meta)
+        return store
+
+    def _checkpointed_spikes(self, ch, sigma, n_trials, params, seed, settings, directory, meta, verbose):
+        """Spike trains of a seeded ensemble run through analysis.checkpoint."""
+        from analysis.checkpoint import run_checkpointed
+
+        if not isinstance(seed, (int, np.integer, np.random.SeedSequence)):
+            raise ValueError("checkpointed ensembles need a seed (seed=, or rng= as an int or SeedSequence)")
+
+        def simulate(n, streams, state, on_chunk):
+            return self.batched_spikes(ch, sigma, n, params, streams, state=state, on_chunk=on_chunk, settings=settings)
+
+        manifest = {name: value for name, value in meta.items() if name != "seed"}
+        return run_checkpointed(simulate, n_trials, seed, directory, manifest, verbose=verbose)
+
+    def _pooled_spikes(self, ch, sigma, n_trials, params, seed, settings, max_workers):
+        """
+        Spike trains of a seeded ensemble, with contiguous blocks of trials on a
+        ProcessPoolExecutor. Each block seeds its trials by their ensemble index.
+        """
+        n_blocks = min(n_trials, max_workers or os.cpu_count() or 1)
+        bounds = np.linspace(0, n_trials, n_blocks + 1).astype(int)
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            blocks = pool.map(_trial_block, *zip(*[(ch, sigma, params, seed, lo, hi - lo, settings)
+                                                    for lo, hi in zip(bounds[:-1], bounds[1:])]))
+            return [trial for block in blocks for trial in block]
+
+    def run_adaptive(self, ch, sigma, cv_width=None, fano_width=None, confidence=0.95, min_trials=20, max_trials=2000,
+                     max_seconds=None, params=None, seed=None, dt=None, T=None, max_workers=1, verbose=False,
+                     settings=None):
+        """
+        Simulates a seeded ensemble in batches until the confidence intervals of
+        the mean CV and the Fano factor are narrower than the requested widths,
+        or the trial or time budget is spent (analysis.online_stats).
+
+        Trial k draws from simulation.rng.trial_rng(seed, k) as in run_ensemble,
+        so the first n trials are those of run_ensemble(..., n, seed=seed). After
+        each batch the trials still needed are predicted from the current widths
+        (which shrink as 1/sqrt(n)); a batch at most doubles the ensemble.
+
+        Args:
+            ch (int): The simulation type (1: Deterministic, 2: Additive, 3: Multiplicative, 4: LIF).
+            sigma (float): Noise intensity.
+            cv_width, fano_width (float): Target full widths of the intervals;
+                at least one is required, an unset one is not waited for.
+            confidence (float): Confidence level of the intervals.
+            min_trials (int): Size of the first batch.
+            max_trials (int): Trial budget.
+            max_seconds (float): Optional wall-time budget, checked after each batch.
+            params (tuple): Optional model parameters overriding the JSON config.
+            seed (int or SeedSequence): Ensemble seed (None: a fresh one, kept
+                in the result's seed attribute).
+            dt, T, settings: As in run_ensemble.
+            max_workers (int): Processes (None: all cores, 1: in-process). Every
+                worker returns an OnlineStats partial of its block of trials.
+            verbose (bool): Print a line per batch.
+
+        Returns:
+            OnlineStats: The ensemble statistics, with attributes seed and
+                stop_reason ("converged", "max_trials" or "max_seconds").
+
+        Raises:
+            ValueError: Neither cv_width nor fano_width is given.
+        """
+        from analysis.online_stats import OnlineStats
+
+        targets = {name: width for name, width in (("cv", cv_width), ("fano", fano_width)) if width is not None}
+        if not targets:
+            raise ValueError("run_adaptive needs cv_width and/or fano_width")
+        if params is None:
+            params = path_calling_lif() if ch == 4 else simulation.path_calling_fhn()
+        if seed is None:
+            seed = np.random.SeedSequence()
+        settings = _sim_settings(settings, dt, T)
+
+        stats = OnlineStats(settings.dt)
+        started = time.monotonic()
+        n_next = min(max(1, int(min_trials)), max_trials)
+        pool = ProcessPoolExecutor(max_workers=max_workers) if max_workers != 1 else None
+        try:
+            while True:
+                start = stats.n_trials
+                if pool is None:
+                    stats.add_trials(self.batched_spikes(ch, sigma, n_next, params, TrialStreams(seed, n_next, start),
+                                                         settings=settings))
+                else:
+                    n_blocks = min(n_next, max_workers or os.cpu_count() or 1)
+                    bounds = start + np.linspace(0, n_next, n_blocks + 1).astype(int)
+                    for part in pool.map(_accumulate_block, *zip(*[(ch, sigma, params, seed, lo, hi - lo, settings)
+                                                                   for lo, hi in zip(bounds[:-1], bounds[1:])])):
+                        stats.merge(part)
+
+                widths = stats.widths(confidence)
+                if verbose:
+                    print(f"{stats.n_trials} trials: " + ", ".join(
+                        f"{name} width {'-' if widths[name] is None else f'{widths[name]:.4g}'}" for name in targets))
+                if all(widths[name] is not None and widths[name] <= width for name, width in targets.items()):
+                    stats.stop_reason = "converged"
+                    break
+                if stats.n_trials >= max_trials:
+                    stats.stop_reason = "max_trials"
+                    break
+                if max_seconds is not None and time.monotonic() - started >= max_seconds:
+                    stats.stop_reason = "max_seconds"
+                    break
+
+                # Widths shrink as 1/sqrt(n): predict the trials still needed,
+                # with 10% to spare; undefined widths double the ensemble
+                n = stats.n_trials
+                needed = max(n*(1.1*(widths[name]/width)**2 if widths[name] is not None else 2.0)
+                             for name, width in targets.items())
+                n_next = min(max(math.ceil(needed) - n, min_trials // 2, 1), n, max_trials - n)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        stats.seed = seed
+        return stats
+
+    def store_stats(self, store):
+        """
+        Calculates the aggregate firing statistics of a (possibly memory-mapped) SpikeStore.
+
+        Returns:
+            tuple: Same layout as trials_stats.
+        """
+        spikes = np.asarray(store.spikes)
+        offsets = np.asarray(store.offsets)
+
+        # Per-trial dictionaries keep the original 1-based trial IDs
+        trial_ids = range(1, len(offsets))
+        trial_spike_timing_dict = dict(zip(trial_ids, (t.tolist() for t in np.split(spikes, offsets[1:-1]))))
+        trial_spike_count_dict = dict(zip(trial_ids, np.diff(offsets).tolist()))
+
+        # ISIs, CV and Fano factor with segment reductions over the CSR arrays
+        # (see analysis.spike_stats) instead of a loop over trials
+        stats = spike_statistics(spikes, offsets)
+        all_isi = stats["isi"].tolist()
+        cv = stats["cv_mean"]
+        fano_factor = stats["fano_count"]
 
         return trial_spike_count_dict, trial_spike_timing_dict, all_isi,cv,fano_factor
 
+    def batched_spikes(self, ch, sigma, n_trials, params=None, rng=None, dt=None, T=None, state=None, on_chunk=None,
+                       settings=None):
+        """
+        Runs n_trials simulations of one model at once and detects spikes in each.
+        
+        Args:
+            ch (int): The simulation type (1: Deterministic, 2: Additive, 3: Multiplicative, 4: LIF).
+            sigma (float): Noise intensity.
+            n_trials (int): Number of independent trials.
+            params (tuple): Optional model parameters overriding the JSON config.
+            rng: Optional random source or seed (see simulation.rng).
+            state (dict), on_chunk (callable): Resume / progress hooks of the
+                batched integrators (see simulation.batched).
+            dt, T, settings: As in run_ensemble.
+            
+        Returns:
+            list: One ndarray of spike indices (timesteps) per trial.
+        """
+        settings = _sim_settings(settings, dt, T)
+        common = dict(dt=settings.dt, T=settings.T, params=params, state=state, on_chunk=on_chunk)
+        if(ch == 1):
+            return simulation.batched_deterministic(*settings.initial_conditions(1), n_trials, v_th=settings.v_th_fhn, **common)
+        elif(ch == 2):
+            return simulation.batched_additive_noise_fhn(*settings.initial_conditions(2), sigma, n_trials, v_th=settings.v_th_fhn, rng=rng, **common)
+        elif(ch == 3):
+            return simulation.batched_multiplicative_noise(*settings.initial_conditions(3), sigma, n_trials, v_th=settings.v_th_fhn, rng=rng, **common)
+        elif(ch == 4):
+            return simulation.batched_additive_noise_lif(sigma, n_trials, v_th=settings.v_th_lif, t_ref=settings.t_ref, rng=rng, **common)
+        else:
+            print("Invalid Choice!")
+            return []
+
     def spikes(self,ch,sigma):
         """
         Runs a single FHN simulation and detects action potentials (spikes).
@@ -85,23 +347,22 @@ class ensemble_stats:
             list: A list of indices (timesteps) where a spike was detected.
         """
         if(ch == 1):
-            v,w,v_e,w_e,J_e = simulation.deterministic(-1.00125,-0.46)
+            v,w,v_e,w_e,J_e = simulation.deterministic(*load_settings().initial_conditions(1))
         elif(ch == 2):
-            v,w,v_e,w_e,J_e = simulation.additive_noise_fhn(-1.00125,-0.4, sigma)
+            v,w,v_e,w_e,J_e = simulation.additive_noise_fhn(*load_settings().initial_conditions(2), sigma)
         elif(ch == 3):
-            v,w,v_e,w_e,J_e = simulation.multiplicative_noise(-1.00125,-0.4, sigma)
+            v,w,v_e,w_e,J_e = simulation.multiplicative_noise(*load_settings().initial_conditions(3), sigma)
         elif(ch == 4):
             v, spike_times = simulation.additive_noise_lif(sigma)
             return spike_times
         else:
             print("Invalid Choice!")
-        v_th = -0.55
+        v_th = load_settings().v_th_fhn
 
         spike_times = []
         if ch in [1,2, 3]:
-            for i in range(1, len(v)):
-                if v[i-1] < v_th and v[i] >= v_th:
-                    spike_times.append(i)
+            # Upward threshold crossings: v[i-1] < v_th <= v[i]
+            spike_times = (np.flatnonzero((v[:-1] < v_th) & (v[1:] >= v_th)) + 1).tolist()
 
         #print("Number of spikes:", len(spike_times))
         #print("Spike Times: ",spike_times)
@@ -0,0 +1,387 @@
+"""
+Simulation-based fitting of model parameters to the biological ISI distribution.
+
+The search space is (sigma, I_ext, a, b, tau) for the FHN variants (ch 2 and 3)
+and (sigma, I_ext, R, tau, t_ref) for LIF (ch 4). A candidate is scored by
+
+    loss = KS(model ISIs, biological ISIs) + cv_weight * |CV_model - CV_bio| / CV_bio
+
+against allen_data/biological_isi.npy (same < 200 ms filter as the comparison).
+
+The search is a random search with successive halving: every iteration draws
+a batch of candidates, scores all of them on a few trials, keeps the best
+fraction and re-scores only the survivors on more trials, so bad candidates
+are dropped after the cheapest round. Each later iteration samples around the
+best point so far in a box that shrinks by half. Within a round all candidates
+share the same random numbers (common random numbers), which makes their
+losses directly comparable. The candidates of a round are simulated together
+as batched ensembles with per-trial parameters, one batch per worker process.
+
+Evaluated points are kept in a SimulationCache, keyed by model, parameters,
+sigma, trial count, seed, dt and T, so re-running or extending a fit reuses
+every ensemble already simulated.
+
+Usage:
+    python -m analysis.fitting --model 2 --candidates 64 --iterations 3 --workers 4 --seed 0 --out fit.json
+"""
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from simulation.config import load_fhn_params, load_lif_params, load_settings
+from simulation.cache import simulation_key
+from simulation.rng import TrialStreams
+from analysis.parameter_sweep import MODEL_NAMES
+from analysis.reference import load_reference
+
+# Search bounds (low, high) of every fitted parameter
+FHN_SPACE = {
+    "sigma": (0.005, 0.3),
+    "I_ext": (0.1, 0.5),
+    "a": (0.5, 0.9),
+    "b": (0.5, 0.95),
+    "tau": (5.0, 25.0),
+}
+LIF_SPACE = {
+    "sigma": (0.5, 20.0),
+    "I_ext": (0.5, 2.5),
+    "R": (5.0, 15.0),
+    "tau": (5.0, 25.0),
+    "t_ref": (0.0, 10.0),
+}
+
+# Trials per successive-halving round, and the fraction kept after each round
+ROUNDS = (8, 32, 100)
+KEEP = 0.25
+
+CV_WEIGHT = 1.0
+
+# Candidates x trials advanced together in one batched ensemble, and the noise
+# block length (fixed, so a candidate's noise does not depend on its batch)
+MAX_BATCH_TRIALS = 4096
+CHUNK_SIZE = 1000
+
+
+def search_space(ch):
+    """Default bounds for a simulation type (2/3: FHN, 4: LIF)."""
+    if ch in (2, 3):
+        return dict(FHN_SPACE)
+    if ch == 4:
+        return dict(LIF_SPACE)
+    raise ValueError(f"Only the noisy models (ch 2, 3, 4) can be fitted, got {ch!r}")
+
+
+def sample_points(space, n, rng, center=None, scale=1.0):
+    """
+    n points drawn uniformly from the box, or from a box of relative size
+    scale around center (clipped to the bounds).
+
+    Returns:
+        list: One {name: value} dict per point.
+    """
+    names = list(space)
+    low = np.array([space[k][0] for k in names], dtype=np.float64)
+    high = np.array([space[k][1] for k in names], dtype=np.float64)
+    if center is not None:
+        c = np.array([center[k] for k in names], dtype=np.float64)
+        half = (high - low)*scale/2
+        low, high = np.maximum(low, c - half), np.minimum(high, c + half)
+    values = low + (high - low)*rng.random((n, len(names)))
+    return [dict(zip(names, (float(x) for x in row))) for row in values]
+
+
+class _CommonNoise:
+    """
+    Random source for a batch of n_groups candidates x n_trials trials: every
+    candidate gets the same (n_trials, chunk) standard normal block, drawn from
+    the per-trial streams of simulation.rng, so trial k of every candidate sees
+    the noise of trial k of an ensemble seeded with seed, whichever candidates
+    share its batch.
+    """
+
+    def __init__(self, seed, n_trials, n_groups):
+        self.streams = TrialStreams(seed, n_trials)
+        self.n_groups = n_groups
+
+    def normal(self, loc, scale, size):
+        rows, cols = size
+        block = self.streams.normal(loc, scale, size=(rows // self.n_groups, cols))
+        return np.tile(block, (self.n_groups, 1))
+
+
+def _candidate(point, base):
+    # The full parameter tuple of a candidate: its fitted values over the
+    # config fields it does not fit. replace() validates the candidate (e.g.
+    # positive R and tau), so an invalid point fails before any simulation.
+    return base.replace(**{k: v for k, v in point.items() if k not in ("sigma", "t_ref")}).as_tuple()
+
+
+def _simulate(ch, points, n_trials, seed, dt, T, base, settings):
+    """
+    Spike trains of several candidates, all trials of all candidates advanced
+    together as one batched ensemble with per-trial parameters.
+
+    base (FHNParams / LIFParams) and settings (SimSettings) are resolved by the
+    caller: config overrides are process-local, so a pool worker must not read
+    the config itself.
+
+    Returns:
+        list: For each point, one ndarray of spike indices per trial.
+    """
+    import simulation
+
+    n = len(points)
+    rng = _CommonNoise(seed, n_trials, n)
+
+    def per_trial(name, default):
+        return np.repeat([p.get(name, default) for p in points], n_trials).astype(np.float64)
+
+    # (I_ext, R, V_r, tau) or (I_ext, a, b, tau), one value per trial
+    params = tuple(np.repeat(column, n_trials).astype(np.float64)
+                   for column in zip(*(_candidate(p, base) for p in points)))
+    if ch == 4:
+        trials = simulation.batched_additive_noise_lif(per_trial("sigma", 0.0), n*n_trials, v_th=settings.v_th_lif,
+                                                       t_ref=per_trial("t_ref", settings.t_ref), dt=dt, T=T,
+                                                       chunk_size=CHUNK_SIZE, params=params, rng=rng)
+    else:
+        v0, w0 = settings.initial_conditions(ch)
+        batched = simulation.batched_additive_noise_fhn if ch == 2 else simulation.batched_multiplicative_noise
+        trials = batched(v0, w0, per_trial("sigma", 0.0), n*n_trials, v_th=settings.v_th_fhn, dt=dt, T=T,
+                         chunk_size=CHUNK_SIZE, params=params, rng=rng)
+    return [trials[i*n_trials:(i + 1)*n_trials] for i in range(n)]
+
+
+def _base_params(ch):
+    return load_lif_params() if ch == 4 else load_fhn_params()
+
+
+def evaluate(ch, points, n_trials, seed, dt, T, base=None, settings=None):
+    """
+    Simulates a batch of candidates and returns their ISIs (ms) and per-trial CVs.
+
+    base (the model parameters the candidates' unfitted fields come from) and
+    settings (SimSettings) default to the config of this process.
+
+    Returns:
+        list: For each point, a dict with isi_ms and cv arrays (see score for the loss).
+    """
+    from analysis.spike_store import SpikeStore
+    from analysis.spike_stats import spike_statistics
+
+    results = []
+    base = _base_params(ch) if base is None else base
+    settings = load_settings() if settings is None else settings
+    for trials in _simulate(ch, points, n_trials, seed, dt, T, base, settings):
+        store = SpikeStore.from_trials(trials)
+        stats = spike_statistics(store.spikes, store.offsets)
+        results.append({"isi_ms": stats["isi"]*dt, "cv": stats["cv"]})
+    return results
+
+
+def score(result, reference, cv_weight=CV_WEIGHT):
+    """
+    Loss of an evaluated candidate (inf when it produced no ISIs).
+
+    Args:
+        result (dict): An entry of evaluate_points.
+        reference (analysis.reference.Reference): The biological ISIs.
+        cv_weight (float): Weight of the relative CV error.
+
+    Returns:
+        dict: loss, ks, cv (mean per-trial CV, as in ensemble_stats).
+    """
+    isi_ms = np.asarray(result["isi_ms"])
+    cv = np.asarray(result["cv"])
+    cv = cv[~np.isnan(cv)]
+    if len(isi_ms) == 0 or len(cv) == 0:
+        return {"loss": np.inf, "ks": None, "cv": None}
+    bio_cv = reference.cv
+    ks = reference.ks(isi_ms)
+    cv = float(cv.mean())
+    return {"loss": ks + cv_weight*abs(cv - bio_cv)/bio_cv, "ks": ks, "cv": cv}
+
+
+def _point_key(ch, point, n_trials, seed, dt, T, base, settings):
+    # Everything _simulate reads: the full parameter tuple (config fields the
+    # search does not fit included), threshold, refractory period and start.
+    # The chunk size is left out, it does not change results (simulation.rng).
+    return simulation_key(kind="fit", ch=ch, point=point, params=_candidate(point, base), n_trials=n_trials,
+                          seed=seed, dt=dt, T=T,
+                          v_th=settings.v_th_lif if ch == 4 else settings.v_th_fhn,
+                          t_ref=point.get("t_ref", settings.t_ref) if ch == 4 else None,
+                          initial_conditions=settings.initial_conditions(ch))
+
+
+def _evaluate_task(args):
+    return evaluate(*args)
+
+
+def _batches(items, n_batches, max_size):
+    n_batches = max(n_batches, -(-len(items) // max_size))
+    return [items[k::n_batches] for k in range(n_batches) if items[k::n_batches]]
+
+
+def evaluate_points(ch, points, n_trials, seed, dt, T, cache=None, max_workers=None):
+    """
+    Evaluates candidates in batches, in parallel across processes, reusing
+    cached results. A candidate's result does not depend on the batch it ran
+    in, so cached and fresh results are interchangeable.
+
+    Args:
+        seed (int): Seed shared by all candidates (common random numbers).
+        cache (SimulationCache): Optional store of evaluated points.
+        max_workers (int): Process count (None: all cores, 1: in-process).
+
+    Returns:
+        list: One evaluate() result per point, in order.
+    """
+    # Resolved once, here: the keys and the workers' simulations must see the
+    # same model, and workers do not inherit this process's config overrides
+    base = _base_params(ch)
+    settings = load_settings()
+    results = [None]*len(points)
+    keys = [_point_key(ch, p, n_trials, seed, dt, T, base, settings) for p in points]
+    if cache is not None:
+        for i, key in enumerate(keys):
+            hit = cache.get(key)
+            if hit is not None:
+                results[i] = {name: np.asarray(arr) for name, arr in hit[0].items()}
+
+    # Uncached candidates are batched: one batched ensemble per worker,
+    # capped at MAX_BATCH_TRIALS trials
+    todo = [i for i, r in enumerate(results) if r is None]
+    workers = 1 if max_workers == 1 else (max_workers or os.cpu_count() or 1)
+    groups = _batches(todo, min(workers, len(todo)), max(1, MAX_BATCH_TRIALS // n_trials))
+    tasks = [(ch, [points[i] for i in group], n_trials, seed, dt, T, base, settings) for group in groups]
+    if len(tasks) <= 1:
+        computed = [_evaluate_task(t) for t in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            computed = list(pool.map(_evaluate_task, tasks))
+
+    for i, result in zip((i for group in groups for i in group), (r for batch in computed for r in batch)):
+        results[i] = result
+        if cache is not None:
+            cache.put(keys[i], result, {"ch": ch, "point": points[i], "n_trials": n_trials, "seed": seed, "dt": dt, "T": T})
+    return results
+
+
+def fit(ch, n_candidates=64, iterations=3, rounds=ROUNDS, keep=KEEP, space=None, cv_weight=CV_WEIGHT,
+        seed=None, dt=None, T=None, cache=None, max_workers=None, verbose=True):
+    """
+    Fits a noisy model to the biological ISI distribution.
+
+    Args:
+        ch (int): 2 (additive FHN), 3 (multiplicative FHN) or 4 (LIF).
+        n_candidates (int): Candidates drawn per iteration.
+        iterations (int): Search iterations; after the first, candidates are
+            drawn around the best point in a box halved every iteration.
+        rounds (sequence): Trials per successive-halving round.
+        keep (float): Fraction of candidates kept after each round.
+        space (dict): {name: (low, high)} bounds (default: search_space(ch)).
+        cv_weight (float): Weight of the relative CV error in the loss.
+        seed (int): Root seed of the candidate draws and the simulations.
+        dt, T: Time grid of the simulations (default: load_settings()).
+        cache (SimulationCache): Optional store of evaluated points.
+        max_workers (int): Process count (None: all cores, 1: in-process).
+
+    Returns:
+        dict: model, ch, best (point with its sigma), loss, ks, cv, bio_cv,
+            n_trials of the final score and history (every scored candidate).
+    """
+    space = search_space(ch) if space is None else space
+    settings = load_settings()
+    dt = settings.dt if dt is None else dt
+    T = settings.T if T is None else T
+    reference = load_reference()
+    root = np.random.SeedSequence(seed)
+    draw_rng = np.random.default_rng(root.spawn(1)[0])
+    # One simulation seed per round: every candidate of a round sees the same noise
+    sim_seeds = [int(s.generate_state(1)[0]) for s in root.spawn(len(rounds))]
+
+    history = []
+    best = None
+    for it in range(iterations):
+        if best is None:
+            candidates = sample_points(space, n_candidates, draw_rng)
+        else:
+            candidates = sample_points(space, n_candidates - 1, draw_rng, center=best["point"], scale=0.5**it)
+            candidates.append(best["point"])
+
+        for r, n_trials in enumerate(rounds):
+            results = evaluate_points(ch, candidates, n_trials, sim_seeds[r], dt, T, cache, max_workers)
+            scored = [dict(point=p, n_trials=n_trials, iteration=it, **score(res, reference, cv_weight))
+                      for p, res in zip(candidates, results)]
+            history.extend(scored)
+            scored.sort(key=lambda s: s["loss"])
+            if verbose:
+                print(f"  iteration {it + 1}, {n_trials:>4} trials: {len(candidates):>3} candidates, "
+                      f"best loss {scored[0]['loss']:.4f}")
+            if r == len(rounds) - 1:
+                if best is None or scored[0]["loss"] <= best["loss"]:
+                    best = scored[0]
+                break
+            # Early stopping: only the best fraction gets more trials
+            survivors = [s for s in scored[:max(1, int(np.ceil(len(scored)*keep)))] if np.isfinite(s["loss"])]
+            candidates = [s["point"] for s in survivors] or [scored[0]["point"]]
+
+    return {
+        "model": MODEL_NAMES[ch], "ch": ch, "best": best["point"], "loss": best["loss"], "ks": best["ks"],
+        "cv": best["cv"], "bio_cv": reference.cv, "n_trials": best["n_trials"], "dt": dt, "T": T, "seed": seed,
+        "history": history,
+    }
+
+
+def config_sections(fit_result):
+    """
+    The fitted values in the layout of config/*.json: the model section (with
+    the unfitted fields from the current config), plus sigma (and t_ref for
+    LIF) as simulation settings to pass on the command line.
+    """
+    point = dict(fit_result["best"])
+    sigma = point.pop("sigma")
+    if fit_result["ch"] == 4:
+        t_ref = point.pop("t_ref", None)
+        section = {"lif_parameters": dict(zip(("I_ext", "R", "V_r", "tau"), load_lif_params().replace(**point).as_tuple()))}
+        settings = {} if t_ref is None else {"t_ref": t_ref}
+    else:
+        section = {"fhn_parameters": dict(zip(("I_ext", "a", "b", "tau"), load_fhn_params().replace(**point).as_tuple()))}
+        settings = {}
+    return {**section, "sigma": sigma, "simulation_settings": settings}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", type=int, default=2, choices=[2, 3, 4], help="2/3: additive/multiplicative FHN, 4: LIF")
+    parser.add_argument("--candidates", type=int, default=64)
+    parser.add_argument("--iterations", type=int, default=3)
+    parser.add_argument("--rounds", type=int, nargs="+", default=list(ROUNDS), help="trials per halving round")
+    parser.add_argument("--keep", type=float, default=KEEP)
+    parser.add_argument("--cv-weight", type=float, default=CV_WEIGHT)
+    parser.add_argument("--T", type=float, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--no-cache", dest="cache", action="store_false")
+    parser.add_argument("--out", default="fit.json")
+    args = parser.parse_args(argv)
+
+    from simulation.cache import SimulationCache
+
+    print(f"Fitting {MODEL_NAMES[args.model]} to the biological ISIs...")
+    result = fit(args.model, args.candidates, args.iterations, args.rounds, args.keep, cv_weight=args.cv_weight,
+                 seed=args.seed, T=args.T, cache=SimulationCache() if args.cache else None, max_workers=args.workers)
+    result["config"] = config_sections(result)
+    with open(args.out, "w") as f:
+        json.dump(result, f, indent=2, default=float)
+    best = ", ".join(f"{k}={v:.4g}" for k, v in result["best"].items())
+    print(f"Best: {best}")
+    if np.isfinite(result["loss"]):
+        print(f"loss {result['loss']:.4f}, KS {result['ks']:.3f}, CV {result['cv']:.3f} (biology {result['bio_cv']:.3f})")
+    else:
+        print("No candidate produced ISIs; widen the search space or increase T.")
+    print(f"Result written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
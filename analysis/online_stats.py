@@ -0,0 +1,249 @@
+"""
+Online ensemble statistics and ensembles that stop when they have converged.
+
+OnlineStats takes finished trials one at a time (or a batch at a time) and
+keeps only running sums:
+
+    spike counts        moments up to the 4th -> mean count, Fano factor
+    per-trial CVs       moments -> mean CV (the cv of trials_stats)
+    pooled ISIs         moments -> mean ISI, pooled CV
+    ISI histogram       counts on fixed bins (plus an overflow count)
+
+Moments are kept as centred sums (count, mean, M2, M3, M4). A batch is
+centred on its own mean and combined with the pairwise update of Chan et
+al. / Pebay, the multi-value form of Welford's algorithm, so there is no
+catastrophic cancellation however many trials are added. Two accumulators
+merge exactly the same way, so workers accumulate partials that are merged
+into the ensemble total.
+
+Confidence intervals are asymptotic normal intervals: for the mean CV the
+standard error of a mean, for the Fano factor F = var/mean the delta method
+    Var(F) ~ [(mu4 - var^2)/mean^2 - 2 var mu3/mean^3 + var^3/mean^4]/n.
+With ~100 trials their coverage is a few percent below nominal (about 92%
+for a 95% Fano interval), which is ample for deciding when to stop.
+
+ensemble_stats.run_adaptive simulates trials in batches until both intervals
+are narrower than the requested widths or a trial / time budget runs out.
+Each batch is sized from the current widths (they shrink as 1/sqrt(n)), so a
+low-variance regime stops after a few dozen trials and a noisy one gets the
+trials it needs.
+
+Usage:
+    python -m analysis.online_stats --ch 2 --sigma 0.05 --cv-width 0.02 --fano-width 0.2 --seed 42
+    python -m analysis.online_stats --ch 4 --sigma 0.5 --cv-width 0.01 --max-trials 5000 --workers 4
+"""
+import argparse
+import math
+from statistics import NormalDist
+import numpy as np
+from analysis.spike_stats import isi, cv
+from simulation.config import load_settings
+
+CONFIDENCE = 0.95
+
+# ISI histogram bins (ms)
+HIST_BIN_MS = 1.0
+HIST_MAX_MS = 1000.0
+
+
+class Moments:
+    """
+    Count, mean and centred power sums M2, M3, M4 of a stream of values,
+    updated and merged without cancellation.
+    """
+
+    def __init__(self, n=0, mean=0.0, M2=0.0, M3=0.0, M4=0.0):
+        self.n, self.mean, self.M2, self.M3, self.M4 = n, mean, M2, M3, M4
+
+    @classmethod
+    def of(cls, values):
+        """Moments of an array of values (centred on its own mean)."""
+        x = np.asarray(values, dtype=np.float64)
+        if len(x) == 0:
+            return cls()
+        mean = x.mean()
+        d = x - mean
+        d2 = d*d
+        return cls(len(x), float(mean), float(d2.sum()), float((d2*d).sum()), float((d2*d2).sum()))
+
+    def update(self, values):
+        """Adds an array of values."""
+        return self.merge(Moments.of(values))
+
+    def merge(self, other):
+        """Adds the values summarized by another Moments (in place; returns self)."""
+        na, nb = self.n, other.n
+        if nb == 0:
+            return self
+        if na == 0:
+            self.n, self.mean, self.M2, self.M3, self.M4 = other.n, other.mean, other.M2, other.M3, other.M4
+            return self
+        n = na + nb
+        delta = other.mean - self.mean
+        d_n = delta/n
+        M4 = (self.M4 + other.M4 + delta*d_n**3*na*nb*(na*na - na*nb + nb*nb)
+              + 6*d_n*d_n*(na*na*other.M2 + nb*nb*self.M2) + 4*d_n*(na*other.M3 - nb*self.M3))
+        M3 = (self.M3 + other.M3 + delta*d_n*d_n*na*nb*(na - nb)
+              + 3*d_n*(na*other.M2 - nb*self.M2))
+        self.M2 = self.M2 + other.M2 + delta*d_n*na*nb
+        self.M3, self.M4 = M3, M4
+        self.mean = self.mean + d_n*nb
+        self.n = n
+        return self
+
+    @property
+    def var(self):
+        """Population variance (np.var's default), NaN without values."""
+        return self.M2/self.n if self.n else math.nan
+
+    def sem(self):
+        """Standard error of the mean (sample variance), NaN with fewer than two values."""
+        return math.sqrt(self.M2/(self.n - 1)/self.n) if self.n > 1 else math.nan
+
+
+def _z(confidence):
+    return NormalDist().inv_cdf(0.5 + confidence/2)
+
+
+class OnlineStats:
+    """
+    Running ensemble statistics (see the module docstring).
+
+    Args:
+        dt (float): Timestep (ms) of the spike indices (default: SimSettings.dt).
+        bin_ms (float), max_ms (float): ISI histogram bin width and range;
+            longer ISIs go to overflow.
+    """
+
+    def __init__(self, dt=None, bin_ms=HIST_BIN_MS, max_ms=HIST_MAX_MS):
+        self.dt = load_settings().dt if dt is None else dt
+        self.counts = Moments()
+        self.trial_cv = Moments()
+        self.isi = Moments()
+        self.edges = np.arange(0.0, max_ms + bin_ms/2, bin_ms)
+        self.histogram = np.zeros(len(self.edges) - 1, dtype=np.int64)
+        self.overflow = 0
+
+    @property
+    def n_trials(self):
+        return self.counts.n
+
+    def add_trial(self, spike_steps):
+        """Adds one finished trial (its spike timesteps); returns self."""
+        return self.add_trials([spike_steps])
+
+    def add_trials(self, trials):
+        """Adds finished trials (one array of spike timesteps each); returns self."""
+        trials = [np.asarray(t, dtype=np.int64) for t in trials]
+        if not trials:
+            return self
+        offsets = np.concatenate([[0], np.cumsum([len(t) for t in trials])])
+        spikes = np.concatenate(trials)
+        isi_values, isi_offsets = isi(spikes, offsets)
+        trial_cv = cv(isi_values, isi_offsets)
+        isi_ms = isi_values*self.dt
+
+        self.counts.update(np.diff(offsets))
+        self.trial_cv.update(trial_cv[~np.isnan(trial_cv)])
+        self.isi.update(isi_ms)
+        # np.histogram closes its last bin, so an ISI equal to the top edge
+        # would also land in histogram[-1]: bin only those below it
+        inside = isi_ms < self.edges[-1]
+        self.histogram += np.histogram(isi_ms[inside], self.edges)[0]
+        self.overflow += int(np.count_nonzero(~inside))
+        return self
+
+    def merge(self, other):
+        """Adds another accumulator's trials (in place; returns self)."""
+        if not np.array_equal(self.edges, other.edges):
+            raise ValueError("cannot merge OnlineStats with different histogram bins")
+        self.counts.merge(other.counts)
+        self.trial_cv.merge(other.trial_cv)
+        self.isi.merge(other.isi)
+        self.histogram += other.histogram
+        self.overflow += other.overflow
+        return self
+
+    @property
+    def cv(self):
+        """Mean of the per-trial ISI CVs (None when no trial has an ISI)."""
+        return self.trial_cv.mean if self.trial_cv.n else None
+
+    @property
+    def fano(self):
+        """Fano factor of the spike counts (None without spikes)."""
+        return self.counts.var/self.counts.mean if self.counts.n and self.counts.mean > 0 else None
+
+    def cv_ci(self, confidence=CONFIDENCE):
+        """(low, high) interval of the mean CV, or None with fewer than two defined CVs."""
+        se = self.trial_cv.sem()
+        if math.isnan(se):
+            return None
+        half = _z(confidence)*se
+        return self.cv - half, self.cv + half
+
+    def fano_ci(self, confidence=CONFIDENCE):
+        """(low, high) delta-method interval of the Fano factor, or None while undefined."""
+        m = self.counts
+        if m.n < 2 or m.mean <= 0:
+            return None
+        var, mu3, mu4 = m.M2/m.n, m.M3/m.n, m.M4/m.n
+        mean = m.mean
+        spread = (mu4 - var*var)/mean**2 - 2*var*mu3/mean**3 + var**3/mean**4
+        half = _z(confidence)*math.sqrt(max(spread, 0.0)/m.n)
+        return self.fano - half, self.fano + half
+
+    def widths(self, confidence=CONFIDENCE):
+        """{"cv": width, "fano": width} of the intervals (None while undefined)."""
+        return {name: None if ci is None else ci[1] - ci[0]
+                for name, ci in (("cv", self.cv_ci(confidence)), ("fano", self.fano_ci(confidence)))}
+
+    def summary(self, confidence=CONFIDENCE):
+        """Plain dict of the statistics and their intervals."""
+        return {
+            "n_trials": self.n_trials,
+            "mean_spike_count": self.counts.mean if self.counts.n else None,
+            "cv": self.cv,
+            "cv_ci": self.cv_ci(confidence),
+            "fano_factor": self.fano,
+            "fano_ci": self.fano_ci(confidence),
+            "n_isi": self.isi.n,
+            "mean_isi_ms": self.isi.mean if self.isi.n else None,
+            "pooled_cv": math.sqrt(self.isi.var)/self.isi.mean if self.isi.n and self.isi.mean > 0 else None,
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ch", type=int, required=True, choices=[1, 2, 3, 4])
+    parser.add_argument("--sigma", type=float, default=0.0)
+    parser.add_argument("--cv-width", type=float, default=None, help="target width of the CV interval")
+    parser.add_argument("--fano-width", type=float, default=None, help="target width of the Fano interval")
+    parser.add_argument("--confidence", type=float, default=CONFIDENCE)
+    parser.add_argument("--min-trials", type=int, default=20)
+    parser.add_argument("--max-trials", type=int, default=2000)
+    parser.add_argument("--max-seconds", type=float, default=None)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    from analysis.ensemble_stats import ensemble_stats
+
+    stats = ensemble_stats().run_adaptive(args.ch, args.sigma, cv_width=args.cv_width, fano_width=args.fano_width,
+                                          confidence=args.confidence, min_trials=args.min_trials,
+                                          max_trials=args.max_trials, max_seconds=args.max_seconds,
+                                          seed=args.seed, max_workers=args.workers)
+    summary = stats.summary(args.confidence)
+    print(f"Stopped after {summary['n_trials']} trials ({stats.stop_reason})")
+    for name, ci in (("cv", "cv_ci"), ("fano_factor", "fano_ci")):
+        value, interval = summary[name], summary[ci]
+        text = "undefined" if value is None else f"{value:.4f}"
+        if interval is not None:
+            text += f"  [{interval[0]:.4f}, {interval[1]:.4f}]"
+        print(f"  {name:12s} {text}")
+    if summary["mean_isi_ms"] is not None:
+        print(f"  mean ISI     {summary['mean_isi_ms']:.2f} ms over {summary['n_isi']} ISIs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+"""
+Parallel parameter sweeps over noise intensity, input current, time scale and model.
+
+Every cell of the grid is an independent ensemble run. Cells are fanned out
+across a concurrent.futures.ProcessPoolExecutor, and each cell receives its own
+child np.random.SeedSequence, so a sweep is reproducible from a single seed no
+matter how many workers execute it or in which order the cells finish.
+
+Usage:
+    python -m analysis.parameter_sweep --sigma 0.01 0.03 0.05 --I_ext 0.25 0.265 \\
+        --models 2 3 --n-trials 100 --seed 42 --out sweep.csv
+
+With --checkpoint DIR, finished cells and the state of running ones are
+saved as the sweep goes; rerunning the same command resumes it.
+--excitable-only drops FHN cells outside the excitable regime up front.
+With --cv-width / --fano-width every cell stops once its intervals are that
+narrow, and --n-trials becomes the per-cell budget (analysis.online_stats).
+"""
+import argparse
+import csv
+import dataclasses
+import itertools
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from simulation.config import load_fhn_params, load_lif_params, load_settings
+from analysis.ensemble_stats import ensemble_stats
+from analysis.reference import load_reference
+
+MODEL_NAMES = {1: "Deterministic FHN", 2: "Additive FHN", 3: "Multiplicative FHN", 4: "LIF"}
+
+COLUMNS = ["model", "ch", "sigma", "I_ext", "tau", "n_trials", "mean_spike_count",
+           "cv", "fano_factor", "mean_isi_ms", "ks_distance"]
+
+
+def biological_isi():
+    """
+    The biological ISI reference (ms), with the same < 200 ms active-firing
+    filter as the comparison in main.py. Loaded once per process by
+    analysis.reference.
+    """
+    return load_reference().isi_ms
+
+
+def sweep_grid(sigma, I_ext=None, tau=None, models=(2,), excitable_only=False):
+    """
+    Builds the Cartesian product of the requested parameter values.
+
+    I_ext and tau default to None, meaning "use the value from the model's JSON config".
+    With excitable_only, FHN cells whose parameters are not in the excitable
+    regime (analysis.stability) are dropped before any trial is simulated.
+
+    Returns:
+        list: One dict per cell with keys ch, sigma, I_ext, tau.
+    """
+    I_ext = [None] if I_ext is None else I_ext
+    tau = [None] if tau is None else tau
+    cells = [{"ch": ch, "sigma": s, "I_ext": i, "tau": t}
+             for ch, s, i, t in itertools.product(models, sigma, I_ext, tau)]
+    if excitable_only:
+        from analysis.stability import excitable
+
+        fhn = [cell for cell in cells if cell["ch"] != 4]
+        if fhn:
+            I, a, b, t = np.array([cell_params(cell) for cell in fhn]).T
+            keep = {id(cell) for cell, ok in zip(fhn, excitable(a, b, t, I)) if ok}
+            cells = [cell for cell in cells if cell["ch"] == 4 or id(cell) in keep]
+    return cells
+
+
+def cell_params(cell):
+    """
+    Returns the model parameter tuple for a grid cell, starting from the JSON
+    config and replacing I_ext / tau where the cell sets them.
+    """
+    base = load_lif_params() if cell["ch"] == 4 else load_fhn_params()
+    changes = {name: cell[name] for name in ("I_ext", "tau") if cell[name] is not None}
+    return base.replace(**changes).as_tuple()
+
+
+def run_cell(cell, seed_seq, n_trials, checkpoint=None, widths=None, settings=None, params=None):
+    """
+    Runs one ensemble for a grid cell and summarizes it as a table row.
+
+    Args:
+        cell (dict): Grid cell from sweep_grid.
+        seed_seq (np.random.SeedSequence): Seed of this cell; its trials draw from
+            child streams of it (simulation.rng).
+        n_trials (int): Trials in the ensemble (the trial budget with widths).
+        checkpoint (str or Path): Optional ensemble checkpoint directory (analysis.checkpoint).
+        widths (dict): Optional cv_width / fano_width: stop the ensemble once
+            its CV / Fano intervals are that narrow (ensemble_stats.run_adaptive).
+            The KS distance is then taken on the 1 ms ISI histogram.
+        settings (SimSettings): dt, T, thresholds and refractory period
+            (default: simulation.config.load_settings()).
+        params (tuple): Model parameters of the cell (default: cell_params(cell)).
+            run_sweep resolves settings and params in the parent, as config
+            overrides are process-local.
+
+    Returns:
+        dict: Row with the columns listed in COLUMNS.
+    """
+    params = cell_params(cell) if params is None else params
+    settings = load_settings() if settings is None else settings
+    if widths:
+        stats = ensemble_stats().run_adaptive(cell["ch"], cell["sigma"], params=params, seed=seed_seq,
+                                              max_trials=n_trials, settings=settings, **widths)
+        n_trials = stats.n_trials
+        mean_count, cv, fano_factor = stats.counts.mean, stats.cv, stats.fano
+        # ISIs at their bin centres, the only ISI values an OnlineStats keeps
+        isi_ms = np.repeat((stats.edges[:-1] + stats.edges[1:])/2, stats.histogram)
+        mean_isi_ms = float(stats.isi.mean) if stats.isi.n else None
+    else:
+        stats = ensemble_stats()
+        store = stats.run_ensemble(cell["ch"], cell["sigma"], n_trials, params=params, rng=seed_seq, verbose=False,
+                                   checkpoint=checkpoint, settings=settings)
+        counts, _, all_isi, cv, fano_factor = stats.store_stats(store)
+        mean_count = np.mean(list(counts.values()))
+        isi_ms = np.asarray(all_isi) * settings.dt
+        mean_isi_ms = float(np.mean(isi_ms)) if len(isi_ms) > 0 else None
+
+    ks_distance = load_reference().ks(isi_ms) if len(isi_ms) > 0 else None
+
+    return {
+        "model": MODEL_NAMES[cell["ch"]],
+        "ch": cell["ch"],
+        "sigma": cell["sigma"],
+        "I_ext": params[0],
+        "tau": params[3],
+        "n_trials": n_trials,
+        "mean_spike_count": float(mean_count),
+        "cv": None if cv is None else float(cv),
+        "fano_factor": None if fano_factor is None else float(fano_factor),
+        "mean_isi_ms": mean_isi_ms,
+        "ks_distance": ks_distance,
+    }
+
+
+def run_sweep(cells, n_trials=100, seed=None, max_workers=None, checkpoint=None, cv_width=None, fano_width=None):
+    """
+    Runs every grid cell, in parallel across processes.
+
+    Args:
+        cells (list): Grid cells from sweep_grid.
+        n_trials (int): Trials per cell.
+        seed (int): Root seed; each cell gets SeedSequence(seed).spawn(...)[k].
+        max_workers (int): Process count (default: all cores). 1 runs in-process.
+        checkpoint (str or Path): Optional checkpoint directory (needs a seed).
+            Finished cells are appended to it as they complete, running cells
+            checkpoint their ensembles, and a rerun with the same directory
+            only simulates what is left (analysis.checkpoint).
+        cv_width, fano_width (float): Optional target widths of the 95%
+            intervals of CV / Fano factor. Each cell then stops as soon as it
+            reaches them, with n_trials as its budget, so trials go to the
+            cells with high variance. Not combinable with checkpoint.
+
+    Returns:
+        list: One row dict per cell, in grid order.
+    """
+    widths = {name: value for name, value in (("cv_width", cv_width), ("fano_width", fano_width))
+              if value is not None}
+    children = np.random.SeedSequence(seed).spawn(len(cells))
+    # Resolved here: workers do not see this process's config overrides
+    settings = load_settings()
+    params = [cell_params(cell) for cell in cells]
+    if checkpoint is not None:
+        if widths:
+            raise ValueError("adaptive (cv_width / fano_width) sweeps cannot be checkpointed")
+        return _run_sweep_checkpointed(cells, children, n_trials, seed, max_workers, checkpoint, settings, params)
+
+    if max_workers == 1:
+        return [run_cell(cell, child, n_trials, widths=widths, settings=settings, params=p)
+                for cell, child, p in zip(cells, children, params)]
+
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(run_cell, cells, children, itertools.repeat(n_trials), itertools.repeat(None),
+                             itertools.repeat(widths), itertools.repeat(settings), params))
+
+
+def _run_sweep_checkpointed(cells, children, n_trials, seed, max_workers, directory, settings, params):
+    from analysis.checkpoint import open_manifest, completed_rows, append_row
+
+    if seed is None:
+        raise ValueError("checkpointed sweeps need a seed")
+    directory = open_manifest(directory, {"cells": cells, "n_trials": n_trials, "seed": seed,
+                                          "settings": dataclasses.asdict(settings), "params": params})
+    rows = completed_rows(directory)
+    todo = [k for k in range(len(cells)) if k not in rows]
+    if rows:
+        print(f"Resuming: {len(rows)} of {len(cells)} cells already done")
+
+    def task(k):
+        return cells[k], children[k], n_trials, directory / f"cell_{k:05d}", None, settings, params[k]
+
+    if max_workers == 1:
+        for k in todo:
+            rows[k] = run_cell(*task(k))
+            append_row(directory, k, rows[k])
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            futures = {pool.submit(run_cell, *task(k)): k for k in todo}
+            # Rows are saved as soon as their cell finishes, not in grid order
+            for future in as_completed(futures):
+                rows[futures[future]] = future.result()
+                append_row(directory, futures[future], rows[futures[future]])
+    return [rows[k] for k in range(len(cells))]
+
+
+def write_table(rows, path):
+    """
+    Writes sweep rows as a tidy CSV table (one row per grid cell).
+    """
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sigma", type=float, nargs="+", required=True)
+    parser.add_argument("--I_ext", type=float, nargs="+", default=None)
+    parser.add_argument("--tau", type=float, nargs="+", default=None)
+    parser.add_argument("--models", type=int, nargs="+", default=[2], choices=[1, 2, 3, 4])
+    parser.add_argument("--n-trials", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--out", default="sweep.csv")
+    parser.add_argument("--checkpoint", default=None, help="checkpoint directory; rerun to resume (needs --seed)")
+    parser.add_argument("--excitable-only", action="store_true",
+                        help="skip FHN cells outside the excitable regime (analysis.stability)")
+    parser.add_argument("--cv-width", type=float, default=None,
+                        help="stop each cell once its CV interval is this narrow (--n-trials is the budget)")
+    parser.add_argument("--fano-width", type=float, default=None,
+                        help="stop each cell once its Fano interval is this narrow")
+    args = parser.parse_args(argv)
+
+    cells = sweep_grid(args.sigma, args.I_ext, args.tau, args.models, args.excitable_only)
+    print(f"Running {len(cells)} grid cells x {args.n_trials} trials...")
+    rows = run_sweep(cells, args.n_trials, args.seed, args.workers, args.checkpoint, args.cv_width, args.fano_width)
+    write_table(rows, args.out)
+    print(f"Sweep table written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,426 @@
+"""
+Escape rates and first-passage times at small noise, by adaptive multilevel
+splitting (AMS).
+
+At small sigma the excitable FHN (and a subthreshold LIF) sits near its rest
+state for a very long time before noise pushes it over threshold, so plain
+ensembles of length T see no spikes at all. Here the spike is treated as a
+rare transition from the rest basin A to the threshold B, with the reaction
+coordinate
+
+    xi = (v - v_rest) / (v_th - v_rest)
+
+the normalized distance from the stable fixed point (FHN.get_equilibrium,
+or V_r + R*I_ext for the LIF) toward the spike threshold: xi = 0 at rest,
+xi = 1 on the threshold.
+
+The escape (firing) rate is estimated as flux x probability:
+
+1. Flux. The basin A is xi <= 0. The first interface lambda_0 sits
+   INTERFACE_SD standard deviations of the stationary xi fluctuations above
+   rest, taken from the linearization at the fixed point, and at most
+   MAX_INTERFACE. A batch of unbiased replicas relaxes at rest (the LIF with
+   its reset and refractory period). Phi is the rate at which they cross
+   lambda_0 coming from A, and the crossing states are stored.
+2. Splitting. N replicas start from the stored crossing states and run until
+   they fall back into A or reach B. At every iteration the k replicas with
+   the lowest maximum of xi are killed. Each is replaced by a copy of a
+   surviving replica, taken at the state where that replica first crossed the
+   killed level, and continued with fresh noise. The levels are a grid of
+   n_levels steps between lambda_0 and 1, and all replicas tied at the killed
+   level are killed. This keeps the estimator unbiased (Brehier et al. 2016).
+   Then
+
+       p = prod_j (1 - K_j / N) * (fraction of replicas that reached B)
+
+   estimates P(B before A | crossing of lambda_0).
+
+Every spike is preceded by exactly one last crossing of lambda_0 coming from
+A, so rate = Phi * p is the stationary firing rate and 1/rate the mean ISI.
+When 1/rate is far longer than the relaxation to rest, escapes are Poisson:
+first-passage times from rest are exponential,
+P(tau <= t) = 1 - exp(-rate t).
+
+Variance. The estimate is the mean of n_runs fully independent runs. Each
+run has its own group of flux replicas (so its own Phi and crossing states)
+and its own AMS replicas. The spread of the per-run rates gives the variance
+and standard error of the rate, including the error of Phi and of the
+finite sample of starting states. The AMS runs are advanced together: their
+killed replicas are re-simulated in one batch.
+
+Usage:
+    python -m analysis.rare_events --ch 2 --sigma 0.004
+    python -m analysis.rare_events --ch 4 --sigma 0.5 --I-ext 0.5 --runs 20
+"""
+import argparse
+import sys
+import numpy as np
+from Models.FHN import FHN
+from Models.LIF import LIF
+from simulation.config import load_settings
+from simulation.path_calling import path_calling_fhn, path_calling_lif
+from simulation.rng import make_rng
+
+# Splitting defaults: replicas per run, killed per iteration, runs, level grid
+N_REPLICAS = 200
+KILL = 20
+N_RUNS = 10
+N_LEVELS = 200
+
+# Flux run: replicas, relaxation before measuring (ms) and measured time (ms)
+FLUX_REPLICAS = 200
+FLUX_BURN_IN = 100.0
+FLUX_TIME = 500.0
+
+# The interface lambda_0 sits this many stationary standard deviations of xi
+# above rest (about its 90th percentile); the basin A is xi <= 0 ...
+INTERFACE_SD = 1.28
+# ... but at most halfway to the threshold (at large noise spikes are not rare)
+MAX_INTERFACE = 0.5
+
+
+class _Dynamics:
+    """Vectorized one-step integrators of the noisy models (as simulation.batched) and xi."""
+
+    def __init__(self, ch, sigma, dt, params=None):
+        settings = load_settings()
+        self.ch, self.sigma, self.dt = ch, sigma, dt
+        if ch in (2, 3):
+            I_ext, a, b, tau = path_calling_fhn() if params is None else params
+            self.neuron = FHN(a, b, tau, I_ext)
+            self.rest = self.neuron.get_equilibrium()
+            _, J_e = self.neuron.jacobian()
+            if np.any(np.real(np.linalg.eigvals(J_e)) >= 0):
+                raise ValueError("The FHN rest state is unstable (limit cycle): spikes are not rare events")
+            self.v_th = settings.v_th_fhn
+        elif ch == 4:
+            I_ext, R, V_r, tau = path_calling_lif() if params is None else params
+            self.neuron = LIF(I_ext, R, V_r, tau)
+            # w is the refractory time left (0 at rest)
+            self.rest = (V_r + R*I_ext, 0.0)
+            self.v_th = settings.v_th_lif
+            self.t_ref = settings.t_ref
+        else:
+            raise ValueError(f"Rare-event estimates need a noisy model (ch 2, 3 or 4), got ch={ch}")
+        if self.rest[0] >= self.v_th:
+            raise ValueError(f"The rest state v={self.rest[0]:.4g} is above the threshold {self.v_th}: "
+                             "the model fires deterministically")
+
+    def xi_sd(self):
+        """
+        Standard deviation of xi in the stationary fluctuations around rest, from
+        the linearized dynamics: Sigma solves J Sigma + Sigma J^T + D = 0.
+        """
+        if self.ch == 4:
+            var = self.sigma**2*self.neuron.tau/2
+        else:
+            _, J = self.neuron.jacobian()
+            # Noise enters w only: sigma (additive) or sigma*w (multiplicative)
+            amplitude = self.sigma if self.ch == 2 else self.sigma*self.rest[1]
+            D = np.array([[0.0, 0.0], [0.0, amplitude**2]])
+            eye = np.eye(2)
+            var = np.linalg.solve(np.kron(eye, J) + np.kron(J, eye), -D.ravel())[0]
+        return float(np.sqrt(var))/(self.v_th - self.rest[0])
+
+    def coordinate(self, v):
+        return (v - self.rest[0])/(self.v_th - self.rest[0])
+
+    def reset(self, v, w):
+        """The LIF threshold reset and refractory clamp after a step (FHN: no-op)."""
+        if self.ch == 4:
+            spiked = v >= self.v_th
+            v = np.where(spiked, self.neuron.V_r, v)
+            w = np.where(spiked, self.t_ref, w)
+        return v, w
+
+    def step(self, v, w, z):
+        dt, sigma = self.dt, self.sigma
+        dB = np.sqrt(dt)*z
+        if self.ch == 4:
+            refractory = w > 0
+            v_new = v + self.neuron.leaky_integrate_and_fire_model(v)*dt + sigma*dB
+            return np.where(refractory, self.neuron.V_r, v_new), np.where(refractory, w - dt, w)
+        f, g = self.neuron.f, self.neuron.g
+        if self.ch == 2:
+            return v + f(v, w)*dt, w + g(v, w)*dt + sigma*dB
+        f0, g0 = f(v, w), g(v, w)
+        v_predictor = v + f0*dt
+        w_predictor = w + g0*dt + sigma*dB*w
+        return (v + (1/2)*(f0 + f(v_predictor, w_predictor))*dt,
+                w + (1/2)*(g0 + g(v_predictor, w_predictor))*dt + (1/2)*sigma*(w + w_predictor)*dB)
+
+
+def _flux(model, rng, n_groups, n_replicas, burn_in, duration):
+    """
+    Unbiased replicas at rest, in n_groups independent groups: the flux of
+    crossings of the interface coming from the basin in every group, and the
+    crossing states of every group.
+    """
+    v = np.full(n_replicas, model.rest[0])
+    w = np.full(n_replicas, model.rest[1])
+    n_burn = int(burn_in/model.dt)
+    n_steps = int(duration/model.dt)
+
+    basin, interface = 0.0, min(INTERFACE_SD*model.xi_sd(), MAX_INTERFACE)
+    for _ in range(n_burn):
+        v, w = model.reset(*model.step(v, w, rng.normal(0, 1, n_replicas)))
+
+    armed = model.coordinate(v) <= basin
+    crossings = ([], [], [])
+    for _ in range(n_steps):
+        v, w = model.step(v, w, rng.normal(0, 1, n_replicas))
+        xi = model.coordinate(v)
+        crossed = armed & (xi >= interface)
+        if crossed.any():
+            for store, values in zip(crossings, (np.flatnonzero(crossed), v[crossed], w[crossed])):
+                store.append(values)
+        armed = (armed & ~crossed) | (xi <= basin)
+        v, w = model.reset(v, w)
+
+    replica, v_cross, w_cross = (np.concatenate(c) if c else np.array([]) for c in crossings)
+    group = replica.astype(np.int64) % n_groups
+    sizes = np.bincount(np.arange(n_replicas) % n_groups, minlength=n_groups)
+    counts = np.bincount(group, minlength=n_groups)
+    if counts.min() == 0:
+        raise ValueError("A flux group saw no interface crossings; increase the flux time or replicas")
+    starts = [(v_cross[group == g], w_cross[group == g]) for g in range(n_groups)]
+    return basin, interface, counts/(sizes*n_steps*model.dt), starts
+
+
+class _Replicas:
+    """
+    The replicas of n_runs AMS runs of N each (row r*N + i is replica i of
+    run r). rec_* hold, for every level, the state at which the replica first
+    reached it; that is where clones branch off.
+    """
+
+    def __init__(self, model, n_runs, N, n_levels, basin, interface, v0, w0, max_steps):
+        self.model, self.n_levels = model, n_levels
+        self.basin, self.interface, self.max_steps = basin, interface, max_steps
+        self.v, self.w = v0.copy(), w0.copy()
+        self.t = np.zeros(len(v0), dtype=np.int64)
+        self.score = self.level(model.coordinate(v0))
+        self.rec_v = np.empty((len(v0), n_levels + 1))
+        self.rec_w = np.empty((len(v0), n_levels + 1))
+        self.rec_t = np.zeros((len(v0), n_levels + 1), dtype=np.int64)
+        rows = np.arange(len(v0))
+        for r in rows:
+            self.rec_v[r, :self.score[r] + 1] = v0[r]
+            self.rec_w[r, :self.score[r] + 1] = w0[r]
+
+    def level(self, xi):
+        x = (xi - self.interface)/(1 - self.interface)*self.n_levels
+        return np.clip(np.floor(x), 0, self.n_levels).astype(np.int64)
+
+    def advance(self, rows, rng):
+        """Simulates replicas rows until they fall back into A, reach B or time out."""
+        model = self.model
+        v, w, t = self.v[rows], self.w[rows], self.t[rows]
+        score = self.score[rows]
+        active = np.arange(len(rows))
+        while len(active):
+            va, wa = model.step(v[active], w[active], rng.normal(0, 1, len(active)))
+            v[active], w[active] = va, wa
+            t[active] += 1
+            xi = model.coordinate(va)
+            lev = self.level(xi)
+            for j in np.flatnonzero(lev > score[active]):
+                i = active[j]
+                new = slice(score[i] + 1, lev[j] + 1)
+                self.rec_v[rows[i], new] = va[j]
+                self.rec_w[rows[i], new] = wa[j]
+                self.rec_t[rows[i], new] = t[i]
+                score[i] = lev[j]
+            done = (xi <= self.basin) | (lev >= self.n_levels) | (t[active] >= self.max_steps)
+            active = active[~done]
+        self.v[rows], self.w[rows], self.t[rows], self.score[rows] = v, w, t, score
+
+    def branch(self, killed, source, z):
+        """Restarts the killed rows as copies of source, from where source first passed level z + 1."""
+        # The branch state may sit several levels above z + 1 (one step can
+        # jump levels); the clone inherits the source's records up to its own
+        # score, so its later clones never start below the level they claim
+        score = self.level(self.model.coordinate(self.rec_v[source, z + 1]))
+        keep = np.arange(self.n_levels + 1) <= score[:, None]
+        for rec in (self.rec_v, self.rec_w, self.rec_t):
+            rec[killed] = np.where(keep, rec[source], rec[killed])
+        self.v[killed] = self.rec_v[source, z + 1]
+        self.w[killed] = self.rec_w[source, z + 1]
+        self.t[killed] = self.rec_t[source, z + 1]
+        self.score[killed] = score
+
+
+def _splitting(model, rng, starts, basin, interface, n_runs, N, k, n_levels, max_time):
+    """
+    n_runs independent AMS estimates of P(B before A) from the interface;
+    run r starts from the crossing states starts[r].
+
+    Returns:
+        tuple: (p per run, iterations per run, mean time (ms) from the
+            interface to the threshold of the replicas that reached it).
+    """
+    v0 = np.empty(n_runs*N)
+    w0 = np.empty(n_runs*N)
+    for r, (v_start, w_start) in enumerate(starts):
+        pick = rng.integers(len(v_start), size=N)
+        v0[r*N:(r + 1)*N], w0[r*N:(r + 1)*N] = v_start[pick], w_start[pick]
+    replicas = _Replicas(model, n_runs, N, n_levels, basin, interface, v0, w0, int(max_time/model.dt))
+    replicas.advance(np.arange(n_runs*N), rng)
+
+    weight = np.ones(n_runs)
+    iterations = np.zeros(n_runs, dtype=np.int64)
+    running = np.ones(n_runs, dtype=bool)
+    while running.any():
+        killed_all, source_all, levels = [], [], []
+        for r in np.flatnonzero(running):
+            rows = np.arange(r*N, (r + 1)*N)
+            score = replicas.score[rows]
+            z = np.partition(score, k - 1)[k - 1]
+            if z >= n_levels:
+                running[r] = False
+                continue
+            killed, survivors = rows[score <= z], rows[score > z]
+            if len(survivors) == 0:
+                # Every replica fell back into A: the run estimates p = 0
+                weight[r] = 0.0
+                running[r] = False
+                continue
+            weight[r] *= 1 - len(killed)/N
+            iterations[r] += 1
+            killed_all.append(killed)
+            source_all.append(survivors[rng.integers(len(survivors), size=len(killed))])
+            levels.append(z)
+        for killed, source, z in zip(killed_all, source_all, levels):
+            replicas.branch(killed, source, z)
+        if killed_all:
+            replicas.advance(np.concatenate(killed_all), rng)
+
+    reached = (replicas.score >= n_levels).reshape(n_runs, N)
+    p = weight*reached.mean(axis=1)
+    times = replicas.t[reached.ravel()]
+    return p, iterations, float(times.mean()*model.dt) if len(times) else None
+
+
+def escape_rate(ch, sigma, n_replicas=N_REPLICAS, kill=KILL, n_runs=N_RUNS, n_levels=N_LEVELS,
+                flux_replicas=FLUX_REPLICAS, flux_time=FLUX_TIME, params=None, seed=None, dt=None, T=None):
+    """
+    Escape rate from rest, mean ISI and first-passage statistics of a noisy
+    model, by flux x adaptive multilevel splitting (see the module docstring).
+
+    Args:
+        ch (int): The simulation type (2: Additive FHN, 3: Multiplicative FHN, 4: LIF).
+        sigma (float): Noise intensity.
+        n_replicas (int): Replicas N per AMS run.
+        kill (int): Replicas k killed per iteration (ties at the level are killed too).
+        n_runs (int): Independent runs (for the variance estimate); each has
+            its own group of flux replicas and its own AMS replicas.
+        n_levels (int): Levels of the xi grid between the interface and the threshold.
+        flux_replicas (int): Replicas of the flux run, shared out among the runs.
+        flux_time (float): Measured time (ms) of each flux replica.
+        params (tuple): Optional model parameters, as for the batched integrators.
+        seed: Random source (see simulation.rng); a seed makes the estimate reproducible.
+        dt (float): Time step (default: simulation settings).
+        T (float): Horizon (ms) for the spike probability and expected spike
+            count (default: simulation settings).
+
+    Returns:
+        dict: rate (spikes per ms) and rate_hz, with rate_se, rate_var and
+            the per-run estimates rate_runs; mean_isi_ms (= mean first-passage
+            time, 1/rate) with mean_isi_se; probability (p), probability_se,
+            probability_var and the per-run estimates probability_runs; flux, flux_crossings, basin and
+            interface (xi levels); iterations per run; reactive_time_ms (mean
+            time from the interface to the threshold); spike_probability
+            (P(at least one spike in T)) and expected_spikes in T.
+
+    Raises:
+        ValueError: The model has no stable rest state below threshold, or sigma is not positive.
+    """
+    if not sigma > 0:
+        raise ValueError(f"sigma must be positive, got {sigma}")
+    settings = load_settings()
+    dt = settings.dt if dt is None else dt
+    T = settings.T if T is None else T
+    kill = max(1, min(int(kill), n_replicas - 1))
+
+    if flux_replicas < n_runs:
+        raise ValueError(f"Need at least one flux replica per run ({n_runs}), got {flux_replicas}")
+    model = _Dynamics(ch, sigma, dt, params)
+    rng = make_rng(seed)
+
+    basin, interface, flux_runs, starts = _flux(model, rng, n_runs, flux_replicas, FLUX_BURN_IN, flux_time)
+    p_runs, iterations, reactive_time = _splitting(model, rng, starts, basin, interface,
+                                                   n_runs, n_replicas, kill, n_levels, max_time=T)
+
+    def mean_se_var(x):
+        var = float(x.var(ddof=1)) if len(x) > 1 else float("nan")
+        return float(x.mean()), float(np.sqrt(var/len(x))), var
+
+    # Every run has its own flux group, so the runs are fully independent and
+    # their spread covers the errors of both factors
+    rate, rate_se, rate_var = mean_se_var(flux_runs*p_runs)
+    p, p_se, p_var = mean_se_var(p_runs)
+    return {
+        "ch": ch, "sigma": sigma, "dt": dt, "T": T,
+        "rate": rate,
+        "rate_hz": rate*1000.0,
+        "rate_se": rate_se,
+        "rate_var": rate_var,
+        "rate_runs": (flux_runs*p_runs).tolist(),
+        # Delta method: se(1/r) = se(r)/r^2
+        "mean_isi_ms": 1/rate if rate > 0 else float("inf"),
+        "mean_isi_se": rate_se/rate**2 if rate > 0 else float("nan"),
+        "probability": p,
+        "probability_se": p_se,
+        "probability_var": p_var,
+        "probability_runs": p_runs.tolist(),
+        "flux": float(flux_runs.mean()),
+        "flux_crossings": sum(len(v_start) for v_start, _ in starts),
+        "basin": float(basin),
+        "interface": float(interface),
+        "iterations": iterations.tolist(),
+        "reactive_time_ms": reactive_time,
+        "spike_probability": float(-np.expm1(-rate*T)),
+        "expected_spikes": rate*T,
+    }
+
+
+def first_passage_cdf(result, t):
+    """
+    P(first spike from rest <= t) of an escape_rate result, t in ms: the
+    exponential law of Poisson escapes, 1 - exp(-rate t).
+    """
+    return -np.expm1(-result["rate"]*np.asarray(t, dtype=np.float64))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ch", type=int, required=True, choices=[2, 3, 4],
+                        help="2: Additive FHN, 3: Multiplicative FHN, 4: LIF")
+    parser.add_argument("--sigma", type=float, required=True)
+    parser.add_argument("--replicas", type=int, default=N_REPLICAS, help="replicas per AMS run")
+    parser.add_argument("--kill", type=int, default=KILL, help="replicas killed per iteration")
+    parser.add_argument("--runs", type=int, default=N_RUNS, help="independent AMS runs")
+    parser.add_argument("--I-ext", dest="I_ext", type=float, default=None, help="override the input current")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    params = None
+    if args.I_ext is not None:
+        params = path_calling_lif() if args.ch == 4 else path_calling_fhn()
+        params = (args.I_ext, *params[1:])
+    try:
+        result = escape_rate(args.ch, args.sigma, args.replicas, args.kill, args.runs, params=params, seed=args.seed)
+    except ValueError as e:
+        parser.error(str(e))
+
+    print(f"P(threshold before rest | interface) = {result['probability']:.3e} "
+          f"+- {result['probability_se']:.1e}  ({args.runs} runs, var {result['probability_var']:.1e})")
+    print(f"Flux through the interface          = {result['flux']:.4g} /ms ({result['flux_crossings']} crossings)")
+    print(f"Escape rate                         = {result['rate_hz']:.4g} +- {result['rate_se']*1000:.2g} Hz")
+    print(f"Mean ISI / first-passage time       = {result['mean_isi_ms']:.4g} +- {result['mean_isi_se']:.2g} ms")
+    print(f"P(spike within T = {result['T']:g} ms)        = {result['spike_probability']:.3e}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
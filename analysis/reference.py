@@ -0,0 +1,195 @@
+"""
+Biological reference ISIs, loaded once and indexed for fast comparisons.
+
+The data live in allen_data/ next to the packages (paths never depend on the
+working directory), in one of two layouts:
+
+    biological_isi.npy     a single recorded cell (the default dataset)
+    <name>/                an indexed archive of several cells: isi.npy holds
+                           all ISIs (ms) cell after cell, offsets.npy the CSR
+                           boundaries, cells.json the cell names in order
+
+Arrays are memory-mapped. For every (cell, cutoff) a Reference is built once
+per process and kept: it holds the filtered ISIs, their sorted copy, the
+ECDF, CV and the histogram used by the comparison plot, so KS distances
+against many cells only sort the model sample, never the reference.
+
+Usage:
+    python -m analysis.reference info [archive]
+    python -m analysis.reference build allen_data/cells cellA=a.npy cellB=b.npy
+"""
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+import numpy as np
+
+DATA_DIR = Path(__file__).resolve().parent.parent / "allen_data"
+DEFAULT_DATASET = DATA_DIR / "biological_isi.npy"
+
+# "Active firing" filter of the comparison: ISIs below this many ms are kept
+DEFAULT_CUTOFF = 200.0
+
+# Histogram bins (ms) of the comparison plot
+HISTOGRAM_BINS = np.arange(0, 160, 4)
+
+
+class Reference:
+    """
+    The ISIs of one cell below a cutoff, with precomputed summary statistics.
+
+    Attributes:
+        isi_ms (ndarray): Filtered ISIs in recording order.
+        sorted_isi (ndarray): The same ISIs, ascending.
+        cv (float): std/mean of the ISIs.
+        histogram (ndarray): Densities over HISTOGRAM_BINS (as ax.hist(density=True)).
+    """
+
+    def __init__(self, isi_ms, cell=None, cutoff=DEFAULT_CUTOFF):
+        isi_ms = np.asarray(isi_ms, dtype=np.float64)
+        self.cell = cell
+        self.cutoff = cutoff
+        self.isi_ms = isi_ms if cutoff is None else isi_ms[isi_ms < cutoff]
+        self.sorted_isi = np.sort(self.isi_ms)
+        self.mean = float(self.isi_ms.mean()) if len(self.isi_ms) else float("nan")
+        self.cv = float(self.isi_ms.std()/self.mean) if len(self.isi_ms) else float("nan")
+        self.histogram, self.bins = np.histogram(self.isi_ms, bins=HISTOGRAM_BINS, density=True)
+        # ECDF of the reference at its own points (right-continuous)
+        self._ecdf_self = np.searchsorted(self.sorted_isi, self.sorted_isi, side="right")/len(self.sorted_isi)
+
+    def __len__(self):
+        return len(self.isi_ms)
+
+    def ecdf(self, t):
+        """Fraction of reference ISIs <= t."""
+        return np.searchsorted(self.sorted_isi, t, side="right")/len(self.sorted_isi)
+
+    def ks(self, sample):
+        """
+        Two-sample KS distance between sample and the reference (equal to
+        scipy.stats.ks_2samp(sample, isi_ms).statistic). Only the sample is sorted.
+        """
+        x = np.sort(np.asarray(sample, dtype=np.float64))
+        if len(x) == 0 or len(self.sorted_isi) == 0:
+            return None
+        # Both ECDFs only jump at data points: compare them at the sample's
+        # points and at the reference's points
+        at_x = np.abs(np.searchsorted(x, x, side="right")/len(x) - self.ecdf(x))
+        at_ref = np.abs(np.searchsorted(x, self.sorted_isi, side="right")/len(x) - self._ecdf_self)
+        return float(max(at_x.max(), at_ref.max()))
+
+    def __repr__(self):
+        return f"Reference(cell={self.cell!r}, cutoff={self.cutoff}, n={len(self)}, cv={self.cv:.3f})"
+
+
+class ReferenceDataset:
+    """
+    A memory-mapped set of recorded cells: a single .npy file (one cell, named
+    after the file) or an indexed archive directory.
+    """
+
+    def __init__(self, path=DEFAULT_DATASET):
+        self.path = Path(path)
+        if self.path.is_dir():
+            self.isi = np.load(self.path / "isi.npy", mmap_mode="r")
+            self.offsets = np.load(self.path / "offsets.npy")
+            with open(self.path / "cells.json") as f:
+                self.cells = json.load(f)["cells"]
+        else:
+            self.isi = np.load(self.path, mmap_mode="r")
+            self.offsets = np.array([0, len(self.isi)])
+            self.cells = [self.path.stem]
+        self._index = {name: k for k, name in enumerate(self.cells)}
+        self._references = {}
+
+    def raw(self, cell=None):
+        """Unfiltered ISIs of a cell (name or position; default the first), memory-mapped."""
+        k = 0 if cell is None else (cell if isinstance(cell, int) else self._index[cell])
+        return self.isi[self.offsets[k]:self.offsets[k+1]]
+
+    def reference(self, cell=None, cutoff=DEFAULT_CUTOFF):
+        """The Reference of a cell at a cutoff, built on first use and kept."""
+        name = self.cells[0] if cell is None else (self.cells[cell] if isinstance(cell, int) else cell)
+        key = (name, cutoff)
+        if key not in self._references:
+            self._references[key] = Reference(self.raw(name), name, cutoff)
+        return self._references[key]
+
+    def references(self, cutoff=DEFAULT_CUTOFF):
+        """References of every cell."""
+        return [self.reference(name, cutoff) for name in self.cells]
+
+    def ks_all(self, sample, cutoff=DEFAULT_CUTOFF):
+        """KS distance of sample to every cell, as {cell: distance}."""
+        return {ref.cell: ref.ks(sample) for ref in self.references(cutoff)}
+
+
+_datasets = {}  # resolved path -> (mtime_ns, ReferenceDataset)
+
+
+def open_dataset(path=None):
+    """
+    The ReferenceDataset at path (default allen_data/biological_isi.npy), opened
+    once per process and reopened only if the file or archive index changes.
+    """
+    path = Path(DEFAULT_DATASET if path is None else path).resolve()
+    stamp = os.stat(path / "offsets.npy" if path.is_dir() else path).st_mtime_ns
+    cached = _datasets.get(path)
+    if cached is None or cached[0] != stamp:
+        cached = (stamp, ReferenceDataset(path))
+        _datasets[path] = cached
+    return cached[1]
+
+
+def load_reference(cell=None, cutoff=DEFAULT_CUTOFF, path=None):
+    """The Reference of a cell (default: the biological ISI reference of the comparison)."""
+    return open_dataset(path).reference(cell, cutoff)
+
+
+def build_archive(cells, path):
+    """
+    Writes an indexed archive from {name: ISI array or .npy path}.
+
+    Returns:
+        Path: The archive directory.
+    """
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    arrays = [np.asarray(np.load(v) if isinstance(v, (str, Path)) else v, dtype=np.float64).ravel()
+              for v in cells.values()]
+    offsets = np.zeros(len(arrays) + 1, dtype=np.int64)
+    np.cumsum([len(a) for a in arrays], out=offsets[1:])
+    np.save(path / "isi.npy", np.concatenate(arrays) if arrays else np.array([]))
+    with open(path / "cells.json", "w") as f:
+        json.dump({"cells": list(cells)}, f, indent=2)
+    # Written last: open_dataset watches it to notice a rebuilt archive
+    np.save(path / "offsets.npy", offsets)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    p = commands.add_parser("info", help="cells, ISI counts and CVs of a dataset")
+    p.add_argument("path", nargs="?", default=None)
+    p.add_argument("--cutoff", type=float, default=DEFAULT_CUTOFF)
+    p = commands.add_parser("build", help="write an indexed archive from NAME=FILE.npy pairs")
+    p.add_argument("path")
+    p.add_argument("cells", nargs="+", metavar="NAME=FILE")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        cells = dict(item.split("=", 1) for item in args.cells)
+        print(f"Archive of {len(cells)} cells written to {build_archive(cells, args.path)}")
+        return 0
+
+    dataset = open_dataset(args.path)
+    print(f"{dataset.path}: {len(dataset.cells)} cell(s)")
+    for ref in dataset.references(args.cutoff):
+        print(f"  {ref.cell:<24}{len(dataset.raw(ref.cell)):>9} ISIs{len(ref):>9} < {args.cutoff:g} ms   CV {ref.cv:.3f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
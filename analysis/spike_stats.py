@@ -0,0 +1,212 @@
+"""
+Spike-train statistics over ragged spike arrays, without per-trial Python loops.
+
+Every function takes the CSR layout of analysis.spike_store.SpikeStore: one
+flat array of spike indices (timesteps), trial after trial and ascending
+within a trial, plus offsets, so that trial k is spikes[offsets[k]:offsets[k+1]].
+Per-trial quantities are computed with segment reductions (np.add.reduceat)
+over that layout; the only Python loops run over lags or window sizes.
+
+    isi            ISIs of every trial, in the same CSR layout
+    cv             std(ISI)/mean(ISI) per trial
+    cv2            mean of 2|I_{i+1} - I_i|/(I_{i+1} + I_i) per trial (Holt et al. 1996)
+    lv             3/(n-1) sum ((I_i - I_{i+1})/(I_i + I_{i+1}))^2 per trial (Shinomoto et al. 2003)
+    fano           Fano factor of spike counts for several counting windows
+    serial_corr    serial ISI correlation coefficients rho_1 .. rho_max_lag
+
+Trials that have too few spikes for a statistic get NaN in per-trial results.
+"""
+import numpy as np
+
+
+def segment_sum(values, offsets):
+    """
+    Sum of values[offsets[k]:offsets[k+1]] for every segment k (0 for empty segments).
+    """
+    values = np.asarray(values)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    out = np.zeros(len(offsets) - 1, dtype=np.result_type(values.dtype, np.float64))
+    starts = offsets[:-1]
+    nonempty = offsets[1:] > starts
+    if nonempty.any():
+        # reduceat sums from one start to the next, so only the starts of
+        # non-empty segments are passed (empty ones would repeat a value)
+        out[nonempty] = np.add.reduceat(values[:offsets[-1]], starts[nonempty])
+    return out
+
+
+def segment_ids(offsets):
+    """Segment number of every element of a CSR array."""
+    offsets = np.asarray(offsets, dtype=np.int64)
+    return np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+
+
+def _within(values, offsets, lag=1):
+    """
+    Pairs (values[i], values[i+lag]) that lie in the same segment, with the
+    CSR offsets of the pairs (segment k has max(n_k - lag, 0) of them).
+    """
+    counts = np.diff(offsets)
+    pair_counts = np.maximum(counts - lag, 0)
+    pair_offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(pair_counts, out=pair_offsets[1:])
+    # A pair starts at i when i+lag is still in the segment of i, i.e. at
+    # every element except the last `lag` ones of each segment
+    keep = np.ones(max(len(values) - lag, 0), dtype=bool)
+    ends = offsets[1:][counts > 0]
+    for j in range(1, lag + 1):
+        last = ends - j
+        keep[last[(last >= 0) & (last < len(keep))]] = False
+    first = np.flatnonzero(keep)
+    return values[first], values[first + lag], pair_offsets
+
+
+def isi(spikes, offsets):
+    """
+    Inter-spike intervals of every trial.
+
+    Returns:
+        tuple: (isi, isi_offsets) in CSR layout; trial k has max(n_k - 1, 0) ISIs.
+    """
+    spikes = np.asarray(spikes, dtype=np.int64)
+    earlier, later, isi_offsets = _within(spikes, np.asarray(offsets, dtype=np.int64))
+    return later - earlier, isi_offsets
+
+
+def _divide(num, den):
+    out = np.full(len(num), np.nan)
+    ok = den > 0
+    out[ok] = num[ok]/den[ok]
+    return out
+
+
+def cv(isi_values, isi_offsets):
+    """Coefficient of variation of the ISIs of every trial (NaN without ISIs)."""
+    isi_values = np.asarray(isi_values, dtype=np.float64)
+    n = np.diff(isi_offsets).astype(np.float64)
+    mean = _divide(segment_sum(isi_values, isi_offsets), n)
+    # Population variance (np.std's default), centred per segment
+    centred = isi_values - np.repeat(mean, np.diff(isi_offsets))
+    var = _divide(segment_sum(centred*centred, isi_offsets), n)
+    return _divide(np.sqrt(var), mean)
+
+
+def cv2(isi_values, isi_offsets):
+    """Mean CV2 of consecutive ISI pairs in every trial (NaN with fewer than two ISIs)."""
+    I0, I1, pair_offsets = _within(np.asarray(isi_values, dtype=np.float64), np.asarray(isi_offsets))
+    terms = 2*np.abs(I1 - I0)/(I1 + I0)
+    return _divide(segment_sum(terms, pair_offsets), np.diff(pair_offsets).astype(np.float64))
+
+
+def lv(isi_values, isi_offsets):
+    """Local variation LV of every trial (NaN with fewer than two ISIs)."""
+    I0, I1, pair_offsets = _within(np.asarray(isi_values, dtype=np.float64), np.asarray(isi_offsets))
+    terms = ((I0 - I1)/(I0 + I1))**2
+    return 3*_divide(segment_sum(terms, pair_offsets), np.diff(pair_offsets).astype(np.float64))
+
+
+def window_counts(spikes, offsets, window, n_steps):
+    """
+    Spike counts of every trial in consecutive windows of `window` timesteps.
+
+    Returns:
+        ndarray: (n_trials, n_steps // window) counts; a partial last window is dropped.
+    """
+    n_trials = len(offsets) - 1
+    n_windows = int(n_steps) // int(window)
+    spikes = np.asarray(spikes, dtype=np.int64)
+    bins = spikes//int(window)
+    flat = segment_ids(offsets)*n_windows + bins
+    inside = bins < n_windows
+    return np.bincount(flat[inside], minlength=n_trials*n_windows).reshape(n_trials, n_windows)
+
+
+def fano(spikes, offsets, windows, n_steps):
+    """
+    Fano factor of the spike counts for each counting window.
+
+    For every window position the count variance and mean are taken across
+    trials; F(window) is the ratio of their averages over positions. With a
+    single window spanning the whole run this is var(counts)/mean(counts).
+
+    Returns:
+        ndarray: One Fano factor per window (NaN when no spikes fall in the windows).
+    """
+    out = np.full(len(windows), np.nan)
+    for i, window in enumerate(windows):
+        counts = window_counts(spikes, offsets, window, n_steps)
+        if counts.size == 0:
+            continue
+        # Across-trial moments of every window position, from integer sums
+        n_trials = counts.shape[0]
+        mean = counts.sum(axis=0)/n_trials
+        var = (counts*counts).sum(axis=0)/n_trials - mean*mean
+        if mean.mean() > 0:
+            out[i] = var.mean()/mean.mean()
+    return out
+
+
+def serial_corr(isi_values, isi_offsets, max_lag=1):
+    """
+    Serial correlation coefficients rho_k of the ISIs for lags 1..max_lag.
+
+    Pairs (I_i, I_{i+k}) are taken within trials only and pooled over the
+    ensemble, around the pooled ISI mean and variance.
+
+    Returns:
+        ndarray: max_lag coefficients (NaN for lags without pairs).
+    """
+    isi_values = np.asarray(isi_values, dtype=np.float64)
+    isi_offsets = np.asarray(isi_offsets, dtype=np.int64)
+    out = np.full(max_lag, np.nan)
+    if len(isi_values) < 2:
+        return out
+    centred = isi_values - isi_values.mean()
+    var = np.mean(centred*centred)
+    if var == 0:
+        return out
+    for k in range(1, max_lag + 1):
+        x, y, _ = _within(centred, isi_offsets, lag=k)
+        if len(x):
+            out[k - 1] = np.mean(x*y)/var
+    return out
+
+
+def spike_statistics(spikes, offsets, windows=(), n_steps=None, max_lag=1):
+    """
+    All statistics of an ensemble in one pass over the CSR arrays.
+
+    Args:
+        spikes, offsets: CSR spike indices (e.g. SpikeStore.spikes / .offsets).
+        windows (sequence): Counting windows (timesteps) for the Fano factor.
+        n_steps (int): Timesteps per trial (default: last spike + 1).
+        max_lag (int): Largest lag of the serial ISI correlations.
+
+    Returns:
+        dict: counts, isi, isi_offsets, per-trial cv / cv2 / lv, their ensemble
+            means (cv_mean, cv2_mean, lv_mean; None when undefined), fano_count
+            (over whole trials), fano (one per window) and serial_corr.
+    """
+    spikes = np.asarray(spikes, dtype=np.int64)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    counts = np.diff(offsets)
+    if n_steps is None:
+        n_steps = int(spikes.max()) + 1 if len(spikes) else 1
+    isi_values, isi_offsets = isi(spikes, offsets)
+
+    result = {
+        "counts": counts,
+        "isi": isi_values,
+        "isi_offsets": isi_offsets,
+        "cv": cv(isi_values, isi_offsets),
+        "cv2": cv2(isi_values, isi_offsets),
+        "lv": lv(isi_values, isi_offsets),
+        "fano": fano(spikes, offsets, windows, n_steps),
+        "serial_corr": serial_corr(isi_values, isi_offsets, max_lag),
+    }
+    for name in ("cv", "cv2", "lv"):
+        defined = result[name][~np.isnan(result[name])]
+        result[f"{name}_mean"] = float(defined.mean()) if len(defined) else None
+    mean_count = counts.mean() if len(counts) else 0
+    result["fano_count"] = float(counts.var()/mean_count) if mean_count > 0 else None
+    return result
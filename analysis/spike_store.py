@@ -0,0 +1,109 @@
+import json
+from pathlib import Path
+import numpy as np
+
+
+class SpikeStore:
+    """
+    Columnar, CSR-style container for the spike times of an ensemble.
+
+    All spike indices (timesteps) live in one flat int64 array, trial after
+    trial; offsets[k]:offsets[k+1] is the slice belonging to trial k. Run
+    parameters (model, sigma, params, seed, dt, T, ...) travel along as a
+    metadata dict.
+
+    On disk a store is a directory holding spikes.npy, offsets.npy and
+    meta.json. Loading memory-maps the two arrays, so reopening a
+    million-spike ensemble costs an mmap rather than a re-simulation.
+    """
+
+    def __init__(self, spikes, offsets, meta=None):
+        self.spikes = spikes
+        self.offsets = offsets
+        self.meta = dict(meta or {})
+
+    @classmethod
+    def from_trials(cls, trials, meta=None):
+        """
+        Builds a store from a sequence of per-trial spike index arrays.
+        """
+        counts = np.array([len(t) for t in trials], dtype=np.int64)
+        offsets = np.zeros(len(trials) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        if len(trials) > 0:
+            spikes = np.concatenate([np.asarray(t, dtype=np.int64) for t in trials])
+        else:
+            spikes = np.array([], dtype=np.int64)
+        return cls(spikes, offsets, meta)
+
+    @property
+    def n_trials(self):
+        return len(self.offsets) - 1
+
+    def __len__(self):
+        return self.n_trials
+
+    def trial(self, k):
+        """Spike indices of trial k (0-based)."""
+        return self.spikes[self.offsets[k]:self.offsets[k+1]]
+
+    def __iter__(self):
+        for k in range(self.n_trials):
+            yield self.trial(k)
+
+    def counts(self):
+        """Number of spikes in every trial."""
+        return np.diff(self.offsets)
+
+    def isi(self):
+        """
+        All inter-spike intervals (in timesteps), trial after trial, without
+        differences across trial boundaries.
+        """
+        if len(self.spikes) < 2:
+            return np.array([], dtype=np.int64)
+        isi = np.diff(self.spikes)
+        # Drop the differences that straddle two trials (index offsets[k]-1 -> offsets[k])
+        boundaries = self.offsets[1:-1]
+        keep = np.ones(len(isi), dtype=bool)
+        keep[boundaries[(boundaries > 0) & (boundaries < len(self.spikes))] - 1] = False
+        return isi[keep]
+
+    def statistics(self, windows=(), max_lag=1):
+        """
+        ISI / CV / CV2 / LV / Fano / serial-correlation statistics of the store
+        (see analysis.spike_stats.spike_statistics). Counting windows are in
+        timesteps; the trial length comes from the dt and T metadata when present.
+        """
+        from analysis.spike_stats import spike_statistics
+
+        n_steps = int(self.meta["T"]/self.meta["dt"]) if "T" in self.meta and "dt" in self.meta else None
+        return spike_statistics(self.spikes, self.offsets, windows, n_steps, max_lag)
+
+    def save(self, path):
+        """
+        Writes the store to directory `path` (spikes.npy, offsets.npy, meta.json).
+        """
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        np.save(path / "spikes.npy", np.asarray(self.spikes, dtype=np.int64))
+        np.save(path / "offsets.npy", np.asarray(self.offsets, dtype=np.int64))
+        with open(path / "meta.json", "w") as f:
+            json.dump(self.meta, f, indent=2)
+        return path
+
+    @classmethod
+    def load(cls, path, mmap_mode="r"):
+        """
+        Reopens a saved store. The spike and offset arrays are memory-mapped
+        (read-only) unless mmap_mode is None.
+        """
+        path = Path(path)
+        spikes = np.load(path / "spikes.npy", mmap_mode=mmap_mode)
+        offsets = np.load(path / "offsets.npy", mmap_mode=mmap_mode)
+        with open(path / "meta.json") as f:
+            meta = json.load(f)
+        return cls(spikes, offsets, meta)
+
+    def __repr__(self):
+        return f"SpikeStore(n_trials={self.n_trials}, n_spikes={len(self.spikes)}, meta={self.meta})"
@@ -0,0 +1,261 @@
+"""
+Batched stability analysis of the FHN model over parameter grids.
+
+Every grid point of broadcastable arrays a, b, tau, I_ext gets all its
+equilibria, the eigenvalues of the Jacobian at each of them, their type and
+the dynamical regime of the point, in closed form and with array operations
+only (no per-point root finder or eigenvalue call). Points are processed in
+chunks, so a 10^6-point scan runs in about a second in bounded memory, and
+excitable regimes can be picked before any Monte Carlo time is spent.
+
+Equilibria solve the depressed cubic of Models.FHN.fhn_equilibria,
+    v^3 + p v + q = 0,  p = 3(1/b - 1),  q = 3(a/b - I_ext),  w = (v + a)/b
+and the Jacobian [[1 - v^2, -1], [1/tau, -b/tau]] has
+    trace T = 1 - v^2 - b/tau,  determinant D = (1 - b(1 - v^2))/tau
+so its eigenvalues are (T +- sqrt(T^2 - 4D))/2.
+
+Regimes (REGIMES, codes in that order):
+    excitable     a single equilibrium, stable: the noise-driven rest state
+    oscillatory   no stable equilibrium: a limit cycle, spikes without noise
+    bistable      three equilibria, two of them stable
+    mixed         three equilibria, one of them stable
+
+Bifurcation boundaries come from continuation along the equilibrium branch,
+which is parametrized by v itself, I_ext(v) = v^3/3 - v + (v + a)/b, so it
+is exact rather than a predictor-corrector walk: Hopf points sit where T = 0
+(v = +-sqrt(1 - b/tau), with D > 0 there iff b^2 < tau), saddle-node folds
+where D = 0 (v = +-sqrt(1 - 1/b), for b > 1). With array a, b or tau,
+bifurcation_currents traces the two-parameter curves in the (a, b or tau,
+I_ext) plane.
+
+Usage:
+    python -m analysis.stability --I_ext 0 1.6 2000 --b 0.1 1.5 500
+    python -m analysis.stability --I_ext 0.2 0.4 100 --a 0.5 1 100 --tau 5 20 100 --out map.npz
+
+Each parameter takes one value or "start stop num" (a linspace axis);
+unset ones come from the FHN config. Without a grid the Hopf and fold
+currents of the configured (a, b, tau) are printed.
+"""
+import argparse
+import time
+import numpy as np
+
+REGIMES = ("excitable", "oscillatory", "bistable", "mixed")
+KINDS = ("none", "stable node", "stable focus", "unstable node", "unstable focus", "saddle")
+
+# Grid points per chunk: bounds the temporaries to a few tens of MB
+CHUNK = 2**17
+
+
+def _equilibria(a, b, I_ext):
+    # Flat arrays in, (n, 3) v of the equilibria out (sorted, NaN-padded)
+    n = a.shape[0]
+    v = np.full((n, 3), np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        p = 3*(1/b - 1)
+        q = 3*(a/b - I_ext)
+        disc = (q/2)**2 + (p/3)**3
+
+    # Vertical w-nullcline v = -a: exactly one equilibrium
+    vertical = b == 0
+    v[vertical, 0] = -a[vertical]
+
+    one = ~vertical & ((disc > 0) | (p == 0))
+    s = np.sqrt(np.maximum(disc[one], 0))
+    v[one, 0] = np.cbrt(-q[one]/2 + s) + np.cbrt(-q[one]/2 - s)
+
+    three = ~vertical & ~one
+    r = 2*np.sqrt(-p[three]/3)
+    phi = np.arccos(np.clip(3*q[three]/(p[three]*r), -1, 1))
+    # k = 2, 1, 0 gives the roots in ascending order
+    for col, k in enumerate((2, 1, 0)):
+        v[three, col] = r*np.cos(phi/3 - 2*np.pi*k/3)
+
+    # One Newton step on the cubic polishes the rounding of the closed form
+    cubic = ~vertical
+    vc, pc, qc = v[cubic], p[cubic, None], q[cubic, None]
+    slope = 3*vc*vc + pc
+    with np.errstate(divide="ignore", invalid="ignore"):
+        step = np.where(slope != 0, (vc*vc*vc + pc*vc + qc)/slope, 0)
+    v[cubic] = vc - np.nan_to_num(step)
+    return v
+
+
+def _classify(T, D):
+    # Equilibrium type codes (KINDS) from trace and determinant; NaN -> "none"
+    disc = T*T - 4*D
+    kind = np.where(T < 0, np.where(disc < 0, 2, 1), np.where(disc < 0, 4, 3))
+    kind = np.where(D < 0, 5, kind)
+    return np.where(np.isnan(T) | np.isnan(D), 0, kind).astype(np.int8)
+
+
+def _broadcast(a, b, tau, I_ext):
+    a, b, tau, I_ext = np.broadcast_arrays(*(np.asarray(x, dtype=float) for x in (a, b, tau, I_ext)))
+    if np.any(tau <= 0):
+        raise ValueError("tau must be positive")
+    return a, b, tau, I_ext
+
+
+def stability_map(a, b, tau, I_ext, eigenvalues=True, chunk=CHUNK):
+    """
+    Equilibria, eigenvalues and regimes of the FHN model at every point of a
+    parameter grid.
+
+    Args:
+        a, b, tau, I_ext (float or array-like): Model parameters; broadcast
+            against each other to the grid shape S.
+        eigenvalues (bool): Also return the eigenvalues (complex, 16 bytes per
+            entry of S x 3 x 2); False keeps large scans lean.
+        chunk (int): Grid points evaluated at once.
+
+    Returns:
+        dict:
+            v, w            (S, 3) equilibria, sorted by v, NaN-padded
+            n_equilibria    (S,) number of equilibria (1 or 3)
+            eigenvalues     (S, 3, 2) Jacobian eigenvalues (if requested)
+            kind            (S, 3) equilibrium types, codes into KINDS
+            n_stable        (S,) number of stable equilibria
+            regime          (S,) regime codes into REGIMES
+
+    Raises:
+        ValueError: A tau is not positive.
+    """
+    a, b, tau, I_ext = _broadcast(a, b, tau, I_ext)
+    shape = a.shape
+    a, b, tau, I_ext = (x.ravel() for x in (a, b, tau, I_ext))
+    n = a.size
+
+    v = np.empty((n, 3))
+    kind = np.empty((n, 3), dtype=np.int8)
+    lam = np.empty((n, 3, 2), dtype=complex) if eigenvalues else None
+    for start in range(0, n, max(1, int(chunk))):
+        part = slice(start, start + chunk)
+        bc, tc = b[part, None], tau[part, None]
+        vc = _equilibria(a[part], b[part], I_ext[part])
+        T = 1 - vc*vc - bc/tc
+        D = (1 - bc*(1 - vc*vc))/tc
+        v[part] = vc
+        kind[part] = _classify(T, D)
+        if eigenvalues:
+            root = np.sqrt((T*T - 4*D).astype(complex))
+            lam[part, :, 0] = (T + root)/2
+            lam[part, :, 1] = (T - root)/2
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        w = np.where(b[:, None] == 0, v - v*v*v/3 + I_ext[:, None], (v + a[:, None])/b[:, None])
+    n_equilibria = np.count_nonzero(~np.isnan(v), axis=1).astype(np.int8)
+    n_stable = np.count_nonzero((kind == 1) | (kind == 2), axis=1).astype(np.int8)
+    regime = np.select([n_stable == 0, n_stable >= 2, n_equilibria == 1], [1, 2, 0], default=3).astype(np.int8)
+
+    result = {
+        "v": v.reshape(shape + (3,)),
+        "w": w.reshape(shape + (3,)),
+        "n_equilibria": n_equilibria.reshape(shape),
+        "kind": kind.reshape(shape + (3,)),
+        "n_stable": n_stable.reshape(shape),
+        "regime": regime.reshape(shape),
+    }
+    if eigenvalues:
+        result["eigenvalues"] = lam.reshape(shape + (3, 2))
+    return result
+
+
+def excitable(a, b, tau, I_ext, chunk=CHUNK):
+    """Boolean mask of the grid points in the excitable regime (see stability_map)."""
+    return stability_map(a, b, tau, I_ext, eigenvalues=False, chunk=chunk)["regime"] == 0
+
+
+def branch_current(v, a, b):
+    """I_ext at which v is an equilibrium potential (the continuation parameter of the branch)."""
+    return v*v*v/3 - v + (v + a)/b
+
+
+def bifurcation_currents(a, b, tau):
+    """
+    Hopf and saddle-node (fold) currents of the FHN model, by continuation
+    along the equilibrium branch I_ext(v) (exact, see the module docstring).
+
+    Args:
+        a, b, tau (float or array-like): Parameters, broadcast to a shape S.
+            An array along one of them traces two-parameter bifurcation curves.
+
+    Returns:
+        dict: hopf and fold, each (S, 2) with the lower and upper current of
+            the pair (NaN where the bifurcation does not exist), and v_hopf,
+            v_fold, the positive potential of the pair (the lower current sits
+            at -v for b > 0).
+    """
+    a, b, tau, _ = _broadcast(a, b, tau, 0.0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Hopf: T = 0 with D > 0 there, i.e. b < tau and b^2 < tau
+        v_hopf = np.where((b < tau) & (b*b < tau) & (b != 0), np.sqrt(np.abs(1 - b/tau)), np.nan)
+        # Fold: D = 0, which needs b > 1
+        v_fold = np.where(b > 1, np.sqrt(np.abs(1 - 1/b)), np.nan)
+
+        def pair(vp):
+            lo, hi = branch_current(-vp, a, b), branch_current(vp, a, b)
+            return np.stack([np.fmin(lo, hi), np.fmax(lo, hi)], axis=-1)
+
+        return {"hopf": pair(v_hopf), "fold": pair(v_fold), "v_hopf": v_hopf, "v_fold": v_fold}
+
+
+def _axis(values, name):
+    if values is None:
+        return None
+    if len(values) == 1:
+        return np.array(values[0])
+    if len(values) == 3:
+        return np.linspace(values[0], values[1], int(values[2]))
+    raise SystemExit(f"--{name} takes one value or 'start stop num'")
+
+
+def scan(a=None, b=None, tau=None, I_ext=None, eigenvalues=False, chunk=CHUNK):
+    """
+    stability_map over the open grid of 1-D axes (outer product, axis order
+    a, b, tau, I_ext). Unset parameters come from the FHN config.
+
+    Returns:
+        dict: stability_map's arrays plus a, b, tau, I_ext as broadcastable axes.
+    """
+    from simulation.config import load_fhn_params
+
+    base = load_fhn_params()
+    axes = [np.atleast_1d(np.asarray(getattr(base, name) if x is None else x, dtype=float))
+            for name, x in zip(("a", "b", "tau", "I_ext"), (a, b, tau, I_ext))]
+    grid = np.ix_(*axes)
+    result = stability_map(*grid, eigenvalues=eigenvalues, chunk=chunk)
+    result.update(zip(("a", "b", "tau", "I_ext"), grid))
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    for name in ("a", "b", "tau", "I_ext"):
+        parser.add_argument(f"--{name}", type=float, nargs="+", default=None,
+                            help="value, or 'start stop num'")
+    parser.add_argument("--out", default=None, help="save the map (.npz)")
+    args = parser.parse_args(argv)
+
+    axes = {name: _axis(getattr(args, name), name) for name in ("a", "b", "tau", "I_ext")}
+    start = time.perf_counter()
+    result = scan(**axes)
+    elapsed = time.perf_counter() - start
+    regime = result["regime"]
+    print(f"{regime.size} grid points in {elapsed:.2f} s")
+    for code, name in enumerate(REGIMES):
+        print(f"  {name:12s} {np.count_nonzero(regime == code)/regime.size:7.2%}")
+
+    a, b, tau = (np.squeeze(result[name]) for name in ("a", "b", "tau"))
+    if a.ndim == b.ndim == tau.ndim == 0:
+        curves = bifurcation_currents(a, b, tau)
+        for name in ("hopf", "fold"):
+            lo, hi = curves[name]
+            print(f"  {name:5s} I_ext: " + ("none" if np.isnan(lo) else f"{lo:.6g}, {hi:.6g}"))
+
+    if args.out:
+        np.savez(args.out, **{k: np.asarray(x) for k, x in result.items()})
+        print(f"Map written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
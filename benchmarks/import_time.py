@@ -0,0 +1,76 @@
+"""
+Import-time check for the simulation, analysis and visualization packages.
+
+Every case runs in a fresh interpreter. The import cost is taken from
+`python -X importtime` (cumulative microseconds of the top-level modules),
+and a second run lists which heavy dependencies ended up in sys.modules.
+A case fails when it loads a module it must not need, e.g. computing spike
+statistics must never import SymPy or matplotlib, or when it is slower than
+--max-ms (off by default, since timings are machine-specific).
+
+Usage:
+    python -m benchmarks.import_time [--max-ms 300] [--repeats 3]
+"""
+import argparse
+import subprocess
+import sys
+
+HEAVY = ("sympy", "matplotlib", "scipy", "numba")
+
+# name -> (statement, modules it must not load)
+CASES = {
+    "import simulation": ("import simulation", HEAVY),
+    "import analysis": ("import analysis", HEAVY),
+    "import visualization": ("import visualization", HEAVY),
+    "import Models.FHN": ("import Models.FHN", HEAVY),
+    "spike statistics": ("import analysis; analysis.ensemble_stats().trials_stats(2, 0.05, 2, verbose=False)",
+                         ("sympy", "matplotlib", "numba")),
+    "single trajectory": ("import simulation; simulation.additive_noise_fhn(-1.00125, -0.4, 0.05, T=10)", HEAVY),
+}
+
+
+def import_time_ms(statement):
+    """
+    Cumulative import time of the top-level imports of statement, in ms.
+    """
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", statement],
+                          capture_output=True, text=True, check=True)
+    total = 0
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not name.startswith("  "):  # top level: exactly one leading space
+            total += int(cumulative)
+    return total / 1000
+
+
+def loaded_modules(statement, candidates):
+    """
+    The candidates found in sys.modules after running statement.
+    """
+    probe = f"{statement}\nimport sys\nprint(' '.join(m for m in {tuple(candidates)!r} if m in sys.modules))"
+    proc = subprocess.run([sys.executable, "-c", probe], capture_output=True, text=True, check=True)
+    return proc.stdout.split()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--max-ms", type=float, default=None, help="fail when an import takes longer")
+    parser.add_argument("--repeats", type=int, default=3, help="best of N fresh interpreters")
+    args = parser.parse_args(argv)
+
+    failures = 0
+    print(f"{'case':<22}{'import ms':>10}  unexpected modules")
+    for name, (statement, forbidden) in CASES.items():
+        ms = min(import_time_ms(statement) for _ in range(args.repeats))
+        unexpected = loaded_modules(statement, forbidden)
+        too_slow = args.max_ms is not None and ms > args.max_ms
+        failures += bool(unexpected) or too_slow
+        print(f"{name:<22}{ms:>10.1f}  {' '.join(unexpected) or '-'}{'  (over budget)' if too_slow else ''}")
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+"""
+Convergence benchmark for the integrators in simulation.integrators.
+
+For the multiplicative-noise FHN, every scheme is run on the same set of
+seeds and compared against the fixed-dt Heun reference (dt = 0.01) on the
+ensemble CV and mean ISI, together with the number of steps it needed.
+For the deterministic FHN, Euler and rk45 are compared on the first spike
+time against a tight-tolerance rk45 solution. The last row is the
+continuous-time mean ISI and CV of the Fokker-Planck solver
+(simulation.fokker_planck), the limit all schemes converge to.
+
+Usage:
+    python -m benchmarks.integrator_convergence [--trials N] [--sigma S] [--backend numba]
+"""
+import argparse
+import time
+import numpy as np
+from simulation.integrators import integrate
+
+REFERENCE = ("heun", {"dt": 0.01})
+
+STOCHASTIC_CASES = [
+    ("heun", {"dt": 0.02}),
+    ("heun", {"dt": 0.05}),
+    ("milstein", {"dt": 0.01}),
+    ("milstein", {"dt": 0.02}),
+    ("milstein", {"dt": 0.05}),
+    ("adaptive_milstein", {"rtol": 3e-2, "atol": 1e-3}),
+    ("adaptive_milstein", {"rtol": 1e-2}),
+    ("adaptive_milstein", {"rtol": 3e-3}),
+]
+
+
+def ensemble(name, options, sigma, trials, backend):
+    if name != "adaptive_milstein":
+        options = dict(options, backend=backend)
+    cvs, isi, steps = [], [], 0
+    start = time.perf_counter()
+    for seed in range(trials):
+        traj = integrate(name, -1.00125, -0.4, sigma=sigma, rng=np.random.default_rng(seed), **options)
+        d = np.diff(traj.spikes)
+        if len(d) > 0:
+            cvs.append(np.std(d)/np.mean(d))
+            isi.extend(d)
+        steps += traj.n_steps
+    elapsed = time.perf_counter() - start
+    return np.mean(cvs), np.mean(isi), steps/trials, elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--trials", type=int, default=50)
+    parser.add_argument("--sigma", type=float, default=0.1)
+    parser.add_argument("--backend", default="python", choices=["python", "numba"])
+    args = parser.parse_args(argv)
+
+    print("Deterministic FHN, first spike time (ms):")
+    fine = integrate("rk45", -1.00125, -0.46, rtol=1e-11, atol=1e-13)
+    for name, options in [("euler", {"dt": 0.01}), ("rk45", {"rtol": 1e-4, "atol": 1e-7}), ("rk45", {})]:
+        traj = integrate(name, -1.00125, -0.46, **options)
+        print(f"  {name:<10}{str(options):<32} spike {traj.spikes[0]:.5f}  "
+              f"error {abs(traj.spikes[0] - fine.spikes[0]):.2e}  steps {traj.n_steps}")
+
+    print(f"\nMultiplicative FHN, sigma = {args.sigma}, {args.trials} trials (same seeds for every scheme):")
+    ref_cv, ref_isi, ref_steps, ref_time = ensemble(*REFERENCE, args.sigma, args.trials, args.backend)
+    print(f"  {'scheme':<20}{'options':<32}{'CV':>7}{'dCV':>8}{'ISI ms':>9}{'dISI':>8}{'steps':>9}{'of ref':>8}{'time':>8}")
+    print(f"  {REFERENCE[0]:<20}{str(REFERENCE[1]):<32}{ref_cv:>7.3f}{'-':>8}{ref_isi:>9.2f}{'-':>8}{ref_steps:>9.0f}{'100%':>8}{ref_time:>7.1f}s")
+    for name, options in STOCHASTIC_CASES:
+        cv, isi, steps, elapsed = ensemble(name, options, args.sigma, args.trials, args.backend)
+        print(f"  {name:<20}{str(options):<32}{cv:>7.3f}{cv - ref_cv:>+8.3f}{isi:>9.2f}{isi - ref_isi:>+8.2f}"
+              f"{steps:>9.0f}{steps/ref_steps:>8.1%}{elapsed:>7.1f}s")
+
+    # The continuous-time limit every scheme converges to (CV of the pooled ISIs)
+    from simulation.fokker_planck import FokkerPlanck
+    start = time.perf_counter()
+    fp_isi, fp_cv = FokkerPlanck(3, args.sigma).isi_moments()
+    print(f"  {'fokker_planck':<20}{'(no trajectories)':<32}{fp_cv:>7.3f}{'':>8}{fp_isi:>9.2f}{'':>8}{'-':>9}{'':>8}"
+          f"{time.perf_counter() - start:>7.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Parity check and speedup report for the compiled integration kernels.
+
+Runs every simulator with backend="python" and backend="numba" from the same
+fixed seed, checks that the trajectories and spike times are bit-for-bit
+identical, and reports
+the per-trajectory cost of each backend.
+
+Usage:
+    python -m benchmarks.kernel_parity [--repeats N]
+"""
+import argparse
+import sys
+import time
+import numpy as np
+import simulation
+from simulation.kernels import NUMBA_AVAILABLE
+
+SEED = 1234
+V_TH_FHN = -0.55
+
+CASES = {
+    "deterministic (Euler)": lambda backend: simulation.deterministic(-1.00125, -0.46, backend=backend),
+    "additive_noise_fhn (Euler-Maruyama)": lambda backend: simulation.additive_noise_fhn(-1.00125, -0.4, 0.05, backend=backend, rng=SEED),
+    "multiplicative_noise (Heun/SRK)": lambda backend: simulation.multiplicative_noise(-1.00125, -0.4, 0.1, backend=backend, rng=SEED),
+    "additive_noise_lif (threshold-reset-refractory)": lambda backend: simulation.additive_noise_lif(1.0, backend=backend, rng=SEED),
+}
+
+
+def _spike_steps(result):
+    # The LIF simulator returns (v, spike_times); the FHN ones return the trace.
+    if len(result) == 2:
+        return np.asarray(result[1])
+    v = result[0]
+    return np.flatnonzero((v[:-1] < V_TH_FHN) & (v[1:] >= V_TH_FHN)) + 1
+
+
+def _run(case, backend):
+    start = time.perf_counter()
+    result = case(backend)
+    return result, time.perf_counter() - start
+
+
+def check_parity(case):
+    ref, _ = _run(case, "python")
+    out, _ = _run(case, "numba")
+    same_spikes = np.array_equal(_spike_steps(ref), _spike_steps(out))
+    same_trace = np.array_equal(ref[0], out[0])
+    return same_spikes and same_trace
+
+
+def time_case(case, backend, repeats):
+    _run(case, backend)  # warm-up (JIT compilation for numba)
+    return min(_run(case, backend)[1] for _ in range(repeats))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    if not NUMBA_AVAILABLE:
+        print("Numba is not installed: the numba backend falls back to the Python loop.")
+
+    failures = 0
+    print(f"{'simulator':<50}{'parity':>8}{'python':>14}{'numba':>14}{'speedup':>10}")
+    for name, case in CASES.items():
+        ok = check_parity(case)
+        failures += not ok
+        t_py = time_case(case, "python", args.repeats)
+        t_nb = time_case(case, "numba", args.repeats)
+        print(f"{name:<50}{'OK' if ok else 'FAIL':>8}{t_py*1e6:>12.0f}us{t_nb*1e6:>12.0f}us{t_py/t_nb:>9.1f}x")
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
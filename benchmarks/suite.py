@@ -0,0 +1,279 @@
+"""
+Benchmark suite for every simulation path, with regression tracking.
+
+Each case runs in a fresh (spawned) process, so peak RSS and import state are
+not shared between cases. For every case the suite records
+
+    wall_time      best wall-clock time over --repeat runs (s)
+    steps_per_sec  simulated timesteps (all trials) per second
+    peak_rss_mb    peak resident set size of the worker process (MB)
+    peak_alloc_mb  peak Python/NumPy allocations, from a separate tracemalloc run (MB)
+
+Results are written to JSON. Given a baseline (a previous results file) the
+suite compares wall_time and peak_alloc_mb case by case and exits with
+status 1 when any case is slower or larger than the baseline by more than
+--threshold (relative, default 0.2 = 20%). Timings are machine-specific, so
+no baseline is stored in the repository; record one with --save-baseline.
+A case that raises, or whose process dies, is recorded with an error
+instead of timings, and the run also exits with status 1.
+
+Usage:
+    python -m benchmarks.suite --quick
+    python -m benchmarks.suite --save-baseline benchmarks/baseline.json
+    python -m benchmarks.suite --baseline benchmarks/baseline.json --threshold 0.1
+"""
+import argparse
+import json
+import multiprocessing
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from queue import Empty
+import numpy as np
+
+SIGMA = 0.1
+
+# (T, dt) grid for single-trajectory cases and (T, dt, n_trials) for ensembles
+FULL = {
+    "serial": [(1000, 0.01), (1000, 0.005), (5000, 0.01)],
+    "ensemble": [(1000, 0.01, 10), (1000, 0.01, 100), (1000, 0.005, 100), (5000, 0.01, 100)],
+}
+QUICK = {
+    "serial": [(1000, 0.01)],
+    "ensemble": [(1000, 0.01, 10)],
+}
+
+
+def _deterministic(T, dt, n_trials):
+    from simulation.deterministic import deterministic
+    deterministic(-1.00125, -0.46, dt=dt, T=T)
+
+
+def _additive_noise_fhn(T, dt, n_trials):
+    from simulation.additive_noise import additive_noise_fhn
+    additive_noise_fhn(-1.00125, -0.4, SIGMA, dt=dt, T=T, rng=0)
+
+
+def _multiplicative_noise(T, dt, n_trials):
+    from simulation.multiplicative_noise import multiplicative_noise
+    multiplicative_noise(-1.00125, -0.4, SIGMA, dt=dt, T=T, rng=0)
+
+
+def _additive_noise_lif(T, dt, n_trials):
+    from simulation.additive_noise import additive_noise_lif
+    additive_noise_lif(SIGMA, dt=dt, T=T, rng=0)
+
+
+def _trials_stats(ch):
+    def case(T, dt, n_trials):
+        from analysis.ensemble_stats import ensemble_stats
+        stats = ensemble_stats()
+        # trials_stats with an explicit T and dt
+        stats.store_stats(stats.run_ensemble(ch, SIGMA, n_trials, seed=0, dt=dt, T=T, verbose=False))
+    return case
+
+
+def _option5_pipeline(T, dt, n_trials):
+    # The compute part of main.py option 5 (without the plot and the cache):
+    # additive FHN and LIF ensembles, biological CV and the two KS distances.
+    from analysis.ensemble_stats import ensemble_stats
+    from analysis.reference import load_reference
+    stats = ensemble_stats()
+    reference = load_reference()
+    _, _, fhn_isi, _, _ = stats.store_stats(stats.run_ensemble(2, SIGMA, n_trials, seed=0, dt=dt, T=T, verbose=False))
+    _, _, lif_isi, _, _ = stats.store_stats(stats.run_ensemble(4, SIGMA, n_trials, seed=1, dt=dt, T=T, verbose=False))
+    reference.cv
+    if fhn_isi and lif_isi:
+        reference.ks(np.array(fhn_isi)*dt)
+        reference.ks(np.array(lif_isi)*dt)
+
+
+def _network(ch):
+    # For network cases n_trials is the number of units, each with 10 synaptic
+    # inputs (plus 5 gap junctions for FHN), so steps_per_sec stays comparable
+    def case(T, dt, n_trials):
+        from simulation.network import network_fhn, network_lif, random_coupling
+        rng = np.random.default_rng(0)
+        syn = random_coupling(n_trials, 10, 0.01, rng=rng)
+        if ch == 4:
+            network_lif(SIGMA, n_trials, syn=syn, dt=dt, T=T, rng=rng)
+        else:
+            gap = random_coupling(n_trials, 5, 0.01, symmetric=True, rng=rng)
+            network_fhn(ch, SIGMA, n_trials, gap=gap, syn=syn, dt=dt, T=T, rng=rng)
+    return case
+
+
+# name -> (function, grid kind)
+CASES = {
+    "deterministic": (_deterministic, "serial"),
+    "additive_noise_fhn": (_additive_noise_fhn, "serial"),
+    "multiplicative_noise": (_multiplicative_noise, "serial"),
+    "additive_noise_lif": (_additive_noise_lif, "serial"),
+    "trials_stats_fhn": (_trials_stats(2), "ensemble"),
+    "trials_stats_lif": (_trials_stats(4), "ensemble"),
+    "option5_pipeline": (_option5_pipeline, "ensemble"),
+    "network_fhn": (_network(2), "ensemble"),
+    "network_lif": (_network(4), "ensemble"),
+}
+
+
+def case_id(name, T, dt, n_trials):
+    return f"{name}[T={T},dt={dt},trials={n_trials}]"
+
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return rss/1e6 if sys.platform == "darwin" else rss/1e3
+
+
+def _worker(name, T, dt, n_trials, repeat, track_alloc, queue):
+    try:
+        func = CASES[name][0]
+        best = np.inf
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func(T, dt, n_trials)
+            best = min(best, time.perf_counter() - start)
+        result = {"wall_time": best, "peak_rss_mb": _peak_rss_mb()}
+
+        if track_alloc:
+            # tracemalloc slows the run down, so it gets its own untimed pass
+            tracemalloc.start()
+            func(T, dt, n_trials)
+            result["peak_alloc_mb"] = tracemalloc.get_traced_memory()[1]/1e6
+            tracemalloc.stop()
+    except Exception as e:
+        result = {"error": repr(e)}
+    queue.put(result)
+
+
+def run_case(name, T, dt, n_trials, repeat=1, track_alloc=True):
+    """
+    Runs one benchmark case in a fresh spawned process.
+
+    Returns:
+        dict: wall_time, steps_per_sec, peak_rss_mb and (optionally) peak_alloc_mb,
+            or error if the case raised or its process died (e.g. OOM-killed).
+    """
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_worker, args=(name, T, dt, n_trials, repeat, track_alloc, queue))
+    proc.start()
+    # Poll rather than block: a child that dies never puts a result
+    result = None
+    while result is None:
+        try:
+            result = queue.get(timeout=1.0)
+        except Empty:
+            if not proc.is_alive():
+                # The result may have arrived just before the exit
+                try:
+                    result = queue.get(timeout=1.0)
+                except Empty:
+                    result = {"error": f"benchmark process exited with code {proc.exitcode}"}
+    proc.join()
+    steps = int(T/dt)*n_trials
+    result.update(case=name, T=T, dt=dt, n_trials=n_trials, steps=steps)
+    if "error" not in result:
+        result["steps_per_sec"] = steps/result["wall_time"]
+    return result
+
+
+def run_suite(cases=None, grid=FULL, repeat=1, track_alloc=True, verbose=True):
+    """
+    Runs every selected case over its (T, dt, n_trials) grid.
+
+    Returns:
+        dict: {"meta": environment description, "results": {case_id: result}}.
+    """
+    results = {}
+    for name in cases or CASES:
+        kind = CASES[name][1]
+        for point in grid[kind]:
+            T, dt, n_trials = point if kind == "ensemble" else (*point, 1)
+            result = run_case(name, T, dt, n_trials, repeat, track_alloc)
+            results[case_id(name, T, dt, n_trials)] = result
+            if verbose and "error" in result:
+                print(f"  {case_id(name, T, dt, n_trials):<52} FAILED: {result['error']}")
+            elif verbose:
+                alloc = result.get("peak_alloc_mb")
+                print(f"  {case_id(name, T, dt, n_trials):<52}{result['wall_time']:>9.3f}s"
+                      f"{result['steps_per_sec']:>12.3g} steps/s{result['peak_rss_mb'] or 0:>9.1f} MB RSS"
+                      + (f"{alloc:>9.1f} MB alloc" if alloc is not None else ""))
+    meta = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "repeat": repeat,
+    }
+    return {"meta": meta, "results": results}
+
+
+def compare(results, baseline, threshold=0.2, metrics=("wall_time", "peak_alloc_mb")):
+    """
+    Compares a results dict against a baseline of the same layout.
+
+    Returns:
+        list: (case_id, metric, baseline value, new value, relative change) for
+            every metric that grew by more than threshold.
+    """
+    regressions = []
+    for key, new in results["results"].items():
+        old = baseline["results"].get(key)
+        if old is None:
+            continue
+        for metric in metrics:
+            if new.get(metric) is None or not old.get(metric):
+                continue
+            change = (new[metric] - old[metric]) / old[metric]
+            if change > threshold:
+                regressions.append((key, metric, old[metric], new[metric], change))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cases", nargs="+", choices=sorted(CASES), help="subset of cases (default: all)")
+    parser.add_argument("--quick", action="store_true", help="one small grid point per case")
+    parser.add_argument("--repeat", type=int, default=1, help="timed runs per case; the best one is kept")
+    parser.add_argument("--no-alloc", action="store_true", help="skip the tracemalloc pass")
+    parser.add_argument("--output", default="benchmarks/results.json")
+    parser.add_argument("--baseline", help="results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative slowdown (default 0.2)")
+    parser.add_argument("--save-baseline", help="also write the results to this path as the new baseline")
+    args = parser.parse_args(argv)
+
+    print("Running benchmarks...")
+    results = run_suite(args.cases, QUICK if args.quick else FULL, args.repeat, not args.no_alloc)
+    for path in filter(None, (args.output, args.save_baseline)):
+        with open(path, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {path}")
+
+    failed = [key for key, result in results["results"].items() if "error" in result]
+    if failed:
+        print(f"\n{len(failed)} case(s) failed: " + ", ".join(failed))
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) above {args.threshold:.0%}:")
+            for key, metric, old, new, change in regressions:
+                print(f"  {key:<52}{metric:<15}{old:>10.3f} -> {new:<10.3f}({change:+.1%})")
+            return 1
+        print(f"\nNo regressions above {args.threshold:.0%} against {args.baseline}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
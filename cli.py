@@ -0,0 +1,436 @@
+"""
+Non-interactive command-line interface for batch and cluster runs.
+
+Every subcommand runs headless (matplotlib's Agg backend, no windows, no
+prompts) and writes its figures, metrics and data to a directory under --out:
+
+    python main.py simulate --ch 2 --sigma 0.05 --seed 1
+    python main.py ensemble --ch 3 --sigma 0.05 --n-trials 100 --seed 42
+    python main.py sweep --sigma 0.01 0.03 0.05 --models 2 3 --workers 8
+    python main.py compare-bio --ch 2 --sigma 0.05
+    python main.py fit --ch 4 --candidates 64 --iterations 3 --seed 0
+    python main.py rare-event --ch 2 --sigma 0.004 --seed 1
+    python main.py run jobs.json
+
+`run` executes every job of a JSON spec file in one process, so numpy,
+scipy and matplotlib are imported once for the whole batch. Job keys are
+the option names of the subcommands (with underscores):
+
+    {
+      "out": "results/batch1",
+      "defaults": {"seed": 42, "n_trials": 100},
+      "jobs": [
+        {"command": "ensemble", "ch": 2, "sigma": 0.05},
+        {"command": "compare-bio", "ch": 3, "sigma": 0.05, "name": "bio_mult"}
+      ]
+    }
+
+Model parameters and simulation settings from config/ can be overridden
+for a run, one NAME=VALUE per flag, given before the command
+    python main.py --fhn I_ext=0.27 --fhn tau=10 --sim dt=0.005 ensemble --ch 2 --sigma 0.05
+or per job with "fhn" / "lif" / "simulation" objects in a job or in "defaults".
+
+Each job writes to <out>/<name> (name defaults to the command and its
+parameters) and the batch summary, with per-job status and wall time, goes to
+<out>/summary.json. A failing job is reported and the batch continues; the
+exit status is 1 if any job failed.
+"""
+import argparse
+import inspect
+import json
+import shutil
+import sys
+import time
+import traceback
+from pathlib import Path
+
+DEFAULT_OUT = "results"
+MODEL_NAMES = {1: "Deterministic FHN", 2: "Additive FHN", 3: "Multiplicative FHN", 4: "LIF"}
+
+
+def _write_json(path, data):
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2, default=float)
+
+
+def _save_figures(figures, out):
+    # figures: {file stem: Figure or None}
+    import matplotlib.pyplot as plt
+    paths = []
+    for stem, fig in figures.items():
+        if fig is None:
+            continue
+        path = out / f"{stem}.png"
+        fig.savefig(path, dpi=150)
+        plt.close(fig)  # batches create many figures; keep memory flat
+        paths.append(path.name)
+    return paths
+
+
+def _cache(use_cache):
+    if not use_cache:
+        return None
+    from simulation.cache import SimulationCache
+    return SimulationCache()
+
+
+def job_simulate(out, ch, sigma=0.0, seed=None, dt=None, T=None, plots=("timeseries", "phase")):
+    """
+    One trajectory: trace.npz, its min/max decimation trace_decimated.npz (for
+    quick plotting of long runs), metrics.json (spike times) and the requested
+    plots. dt, T and the initial conditions default to simulation.config.load_settings().
+    """
+    import numpy as np
+    import simulation
+    from simulation.config import load_settings
+    from visualization.decimate import minmax_indices
+    from visualization.timeseries import timeseries as plot_timeseries
+
+    settings = load_settings()
+    dt = settings.dt if dt is None else dt
+    T = settings.T if T is None else T
+    if ch == 1:
+        results = simulation.deterministic(*settings.initial_conditions(1), dt=dt, T=T)
+    elif ch == 2:
+        results = simulation.additive_noise_fhn(*settings.initial_conditions(2), sigma, dt=dt, T=T, rng=seed)
+    elif ch == 3:
+        results = simulation.multiplicative_noise(*settings.initial_conditions(3), sigma, dt=dt, T=T, rng=seed)
+    elif ch == 4:
+        results = simulation.additive_noise_lif(sigma, dt=dt, T=T, rng=seed)
+    else:
+        raise ValueError(f"Invalid simulation type: {ch}")
+
+    v = np.asarray(results[0])
+    if ch == 4:
+        spikes = np.asarray(results[1], dtype=np.int64)
+        traces = {"v": v}
+    else:
+        w = np.asarray(results[1])
+        v_th = settings.v_th_fhn
+        spikes = np.flatnonzero((v[:-1] < v_th) & (v[1:] >= v_th)) + 1
+        traces = {"v": v, "w": w}
+    np.savez(out / "trace.npz", **traces, spikes=spikes, dt=dt)
+    idx = minmax_indices(list(traces.values()))
+    np.savez(out / "trace_decimated.npz", t=idx*dt, **{name: y[idx] for name, y in traces.items()})
+
+    figures = {}
+    if "timeseries" in plots:
+        figures.update(zip(["timeseries_v", "timeseries_w"], plot_timeseries(ch, sigma, show=False, results=results, dt=dt)))
+    if "phase" in plots and ch != 4:
+        from visualization.phase_portrait import plotting
+        figures["phase_portrait"] = plotting(*results[:4], show=False)
+
+    metrics = {
+        "model": MODEL_NAMES[ch], "ch": ch, "sigma": sigma, "seed": seed, "dt": dt, "T": T,
+        "spike_count": len(spikes),
+        "spike_times_ms": (spikes*dt).tolist(),
+        "figures": _save_figures(figures, out),
+    }
+    _write_json(out / "metrics.json", metrics)
+    return metrics
+
+
+def job_ensemble(out, ch, sigma=0.0, n_trials=100, seed=42, dt=None, T=None, cache=True, checkpoint=False):
+    """
+    An ensemble: spikes/ (SpikeStore), metrics.json (CV, CV2, LV, Fano, serial
+    ISI correlation) and isi_histogram.png. With checkpoint, progress is saved
+    in checkpoint/ and rerunning the job resumes it (removed once finished).
+    """
+    import numpy as np
+    from analysis.ensemble_stats import ensemble_stats
+    from simulation.config import load_settings
+    from visualization.isi_histogram import plot_isi_histogram
+
+    settings = load_settings()
+    dt = settings.dt if dt is None else dt
+    T = settings.T if T is None else T
+
+    stats = ensemble_stats()
+    store = stats.run_ensemble(ch, sigma, n_trials, seed=seed, dt=dt, T=T, verbose=False, cache=_cache(cache),
+                               checkpoint=out / "checkpoint" if checkpoint else None)
+    store.save(out / "spikes")
+    shutil.rmtree(out / "checkpoint", ignore_errors=True)
+    count, _, all_isi, cv, fano_factor = stats.store_stats(store)
+    spike_stats = store.statistics()
+
+    figures = {"isi_histogram": plot_isi_histogram(all_isi, ch, sigma, show=False)}
+    metrics = {
+        "model": MODEL_NAMES[ch], "ch": ch, "sigma": sigma, "n_trials": n_trials, "seed": seed, "dt": dt, "T": T,
+        "mean_spike_count": float(np.mean(list(count.values()))),
+        "cv": cv,
+        "cv2": spike_stats["cv2_mean"],
+        "lv": spike_stats["lv_mean"],
+        "fano_factor": fano_factor,
+        "serial_corr_1": None if np.isnan(spike_stats["serial_corr"][0]) else float(spike_stats["serial_corr"][0]),
+        "mean_isi_ms": float(np.mean(all_isi))*dt if len(all_isi) else None,
+        "figures": _save_figures(figures, out),
+    }
+    _write_json(out / "metrics.json", metrics)
+    return metrics
+
+
+def job_sweep(out, sigma, I_ext=None, tau=None, models=(2,), n_trials=100, seed=None, workers=None, checkpoint=False,
+              cv_width=None, fano_width=None):
+    """
+    A parameter sweep (analysis.parameter_sweep): sweep.csv, one row per grid cell.
+    With checkpoint (and a seed), finished cells are kept in checkpoint/ and
+    rerunning the job only simulates the rest. With cv_width / fano_width every
+    cell stops once its intervals are that narrow (n_trials is the budget).
+    """
+    from analysis.parameter_sweep import sweep_grid, run_sweep, write_table
+
+    cells = sweep_grid(sigma, I_ext, tau, models)
+    rows = run_sweep(cells, n_trials, seed, workers, out / "checkpoint" if checkpoint else None, cv_width, fano_width)
+    write_table(rows, out / "sweep.csv")
+    shutil.rmtree(out / "checkpoint", ignore_errors=True)
+    return {"cells": len(cells), "n_trials": n_trials, "seed": seed, "table": "sweep.csv"}
+
+
+def job_compare_bio(out, ch, sigma=0.0, n_trials=100, seed=42, cache=True, n_resamples=2000, n_permutations=0,
+                    workers=1):
+    """
+    The biological ground truth comparison: metrics.json (CVs, Fano factors, KS
+    distances, their bootstrap intervals and optional permutation p-values) and
+    bio_comparison.png.
+    """
+    from analysis.ensemble_stats import ensemble_stats
+    from analysis.bio_comparison import compare_bio
+    from visualization.bio_comparison import plot_bio_comparison
+
+    stats = ensemble_stats()
+    sim_cache = _cache(cache)
+    result = compare_bio(ch, sigma, lambda c, s: stats.run_ensemble(c, s, n_trials, seed=seed, verbose=False, cache=sim_cache),
+                         n_resamples=n_resamples, n_permutations=n_permutations, seed=seed, max_workers=workers)
+    figures = {"bio_comparison": plot_bio_comparison(result, show=False)}
+
+    # ISI arrays and the reference histogram belong to the figure, not the metrics
+    metrics = {key: value for key, value in result.items() if not key.endswith("_isi_ms") and key != "bio_histogram"}
+    metrics.update(ch=ch, n_trials=n_trials, seed=seed, n_resamples=n_resamples, n_permutations=n_permutations,
+                   figures=_save_figures(figures, out))
+    _write_json(out / "metrics.json", metrics)
+    return metrics
+
+
+def job_fit(out, ch, candidates=64, iterations=3, rounds=(8, 32, 100), seed=0, T=None, workers=None, cache=True):
+    """
+    A fit to the biological ISIs (analysis.fitting): fit.json with the best
+    point, its config sections and the scored candidates.
+    """
+    from analysis.fitting import fit, config_sections
+
+    result = fit(ch, candidates, iterations, rounds, seed=seed, T=T, cache=_cache(cache), max_workers=workers,
+                 verbose=False)
+    result["config"] = config_sections(result)
+    _write_json(out / "fit.json", result)
+    return {key: result[key] for key in ("model", "ch", "best", "loss", "ks", "cv", "bio_cv", "n_trials", "config")}
+
+
+def job_rare_event(out, ch, sigma, replicas=200, kill=20, runs=10, seed=None, T=None):
+    """
+    Escape rate, mean ISI and first-passage statistics at small sigma by
+    adaptive multilevel splitting (analysis.rare_events): rare_event.json.
+    """
+    from analysis.rare_events import escape_rate
+
+    result = escape_rate(ch, sigma, replicas, kill, runs, seed=seed, T=T)
+    result.update(model=MODEL_NAMES[ch], seed=seed)
+    _write_json(out / "rare_event.json", result)
+    return {key: result[key] for key in ("model", "ch", "sigma", "rate_hz", "rate_se", "mean_isi_ms", "mean_isi_se",
+                                         "probability", "probability_se", "spike_probability")}
+
+
+JOBS = {
+    "simulate": job_simulate,
+    "ensemble": job_ensemble,
+    "sweep": job_sweep,
+    "compare-bio": job_compare_bio,
+    "fit": job_fit,
+    "rare-event": job_rare_event,
+}
+
+
+def job_name(command, options):
+    if command == "sweep":
+        return "sweep"
+    if command == "fit":
+        return f"fit_ch{options['ch']}_seed{options.get('seed', 0)}"
+    return f"{command}_ch{options['ch']}_sigma{options.get('sigma', 0.0)}"
+
+
+def run_job(command, options, out_root):
+    """
+    Runs one job in the current process and returns its summary entry.
+
+    "fhn", "lif" and "simulation" entries of options are config overrides
+    (see simulation.config) that apply to this job only.
+    """
+    from simulation.config import overrides
+
+    options = dict(options)
+    config = {section: options.pop(section, None) for section in ("fhn", "lif", "simulation")}
+    name = options.pop("name", None) or job_name(command, options)
+    out = Path(out_root) / name
+    out.mkdir(parents=True, exist_ok=True)
+
+    start = time.perf_counter()
+    entry = {"name": name, "command": command, "options": options,
+             "config": {section: values for section, values in config.items() if values}}
+    try:
+        with overrides(**config):
+            entry["result"] = JOBS[command](out, **options)
+        entry["status"] = "ok"
+    except Exception as e:
+        traceback.print_exc()
+        entry["status"] = "failed"
+        entry["error"] = f"{type(e).__name__}: {e}"
+    entry["wall_time"] = time.perf_counter() - start
+    print(f"[{entry['status']}] {name} ({entry['wall_time']:.1f}s) -> {out}")
+    return entry
+
+
+def run_spec(spec, out_root=None):
+    """
+    Runs every job of a spec dict ({"out", "defaults", "jobs"}) in this process.
+
+    Returns:
+        list: Summary entries, also written to <out>/summary.json.
+    """
+    out_root = Path(out_root or spec.get("out", DEFAULT_OUT))
+    out_root.mkdir(parents=True, exist_ok=True)
+    defaults = spec.get("defaults", {})
+
+    summary = []
+    for i, job in enumerate(spec["jobs"]):
+        job = dict(job)
+        command = job.pop("command")
+        if command not in JOBS:
+            error = f"Unknown command '{command}', expected one of {sorted(JOBS)}"
+            print(f"[failed] job {i}: {error}")
+            summary.append({"name": job.get("name", f"job{i}"), "command": command, "status": "failed", "error": error})
+            continue
+        # Only pass on defaults the job function accepts (e.g. no seed for a sweep without one)
+        accepted = set(inspect.signature(JOBS[command]).parameters) | {"fhn", "lif", "simulation"}
+        options = {k: v for k, v in defaults.items() if k in accepted}
+        for section in ("fhn", "lif", "simulation"):
+            # Per-job config overrides extend, not replace, the batch defaults
+            if section in job and section in options:
+                job[section] = dict(options[section], **job[section])
+        options.update(job)
+        summary.append(run_job(command, options, out_root))
+
+    _write_json(out_root / "summary.json", summary)
+    return summary
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="main.py", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", default=None, help=f"output directory (default: {DEFAULT_OUT})")
+    # One NAME=VALUE per flag (repeat the flag for more): nargs="+" would swallow the command
+    parser.add_argument("--fhn", action="append", metavar="NAME=VALUE",
+                        help="override a config/fhn_params.json field (repeatable)")
+    parser.add_argument("--lif", action="append", metavar="NAME=VALUE",
+                        help="override a config/lif_params.json field (repeatable)")
+    parser.add_argument("--sim", action="append", metavar="NAME=VALUE",
+                        help="override a simulation setting (dt, T, ...; repeatable)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def model_options(p, n_trials=True):
+        p.add_argument("--ch", type=int, required=True, choices=[1, 2, 3, 4],
+                       help="1: Deterministic FHN, 2: Additive FHN, 3: Multiplicative FHN, 4: LIF")
+        p.add_argument("--sigma", type=float, default=0.0)
+        if n_trials:
+            p.add_argument("--n-trials", type=int, default=100)
+
+    p = commands.add_parser("simulate", help="one trajectory: trace, spike times, timeseries and phase plots")
+    model_options(p, n_trials=False)
+    p.add_argument("--seed", type=int, default=None)
+    p.add_argument("--dt", type=float, default=None)
+    p.add_argument("--T", type=float, default=None)
+    p.add_argument("--plots", nargs="*", default=["timeseries", "phase"], choices=["timeseries", "phase"])
+
+    p = commands.add_parser("ensemble", help="ensemble statistics (CV, Fano) and ISI histogram")
+    model_options(p)
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--dt", type=float, default=None)
+    p.add_argument("--T", type=float, default=None)
+    p.add_argument("--no-cache", dest="cache", action="store_false")
+    p.add_argument("--checkpoint", action="store_true", help="save progress; rerun to resume")
+
+    p = commands.add_parser("sweep", help="parameter sweep table (see analysis.parameter_sweep)")
+    p.add_argument("--sigma", type=float, nargs="+", required=True)
+    p.add_argument("--I_ext", type=float, nargs="+", default=None)
+    p.add_argument("--tau", type=float, nargs="+", default=None)
+    p.add_argument("--models", type=int, nargs="+", default=[2], choices=[1, 2, 3, 4])
+    p.add_argument("--n-trials", type=int, default=100)
+    p.add_argument("--seed", type=int, default=None)
+    p.add_argument("--workers", type=int, default=None)
+    p.add_argument("--checkpoint", action="store_true", help="save finished cells; rerun to resume (needs --seed)")
+    p.add_argument("--cv-width", type=float, default=None, help="adaptive: target CV interval width per cell")
+    p.add_argument("--fano-width", type=float, default=None, help="adaptive: target Fano interval width per cell")
+
+    p = commands.add_parser("fit", help="fit a noisy model to the biological ISIs (see analysis.fitting)")
+    p.add_argument("--ch", type=int, required=True, choices=[2, 3, 4])
+    p.add_argument("--candidates", type=int, default=64)
+    p.add_argument("--iterations", type=int, default=3)
+    p.add_argument("--rounds", type=int, nargs="+", default=[8, 32, 100], help="trials per halving round")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--T", type=float, default=None)
+    p.add_argument("--workers", type=int, default=None)
+    p.add_argument("--no-cache", dest="cache", action="store_false")
+
+    p = commands.add_parser("compare-bio", help="CV and KS distance of FHN and LIF against the biological ISIs")
+    model_options(p)
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--no-cache", dest="cache", action="store_false")
+    p.add_argument("--n-resamples", type=int, default=2000, help="bootstrap resamples for the 95%% intervals (0: none)")
+    p.add_argument("--n-permutations", type=int, default=0, help="permutations for the KS p-values (0: none)")
+    p.add_argument("--workers", type=int, default=1, help="processes for the resampling (default 1)")
+
+    p = commands.add_parser("rare-event", help="escape rate and mean ISI at small sigma (see analysis.rare_events)")
+    p.add_argument("--ch", type=int, required=True, choices=[2, 3, 4])
+    p.add_argument("--sigma", type=float, required=True)
+    p.add_argument("--replicas", type=int, default=200, help="replicas per splitting run")
+    p.add_argument("--kill", type=int, default=20, help="replicas killed per iteration")
+    p.add_argument("--runs", type=int, default=10, help="independent runs for the error estimate")
+    p.add_argument("--seed", type=int, default=None)
+    p.add_argument("--T", type=float, default=None)
+
+    p = commands.add_parser("run", help="run every job of a JSON spec file in one process")
+    p.add_argument("spec", help="job spec file (see above)")
+    return parser
+
+
+def main(argv=None):
+    # Headless: select Agg before anything imports pyplot
+    import matplotlib
+    matplotlib.use("Agg")
+
+    from simulation.config import parse_assignments, set_overrides
+
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    try:
+        # Process-wide overrides; a job spec can add its own per job
+        set_overrides("fhn", **parse_assignments(args.fhn))
+        set_overrides("lif", **parse_assignments(args.lif))
+        set_overrides("simulation", **parse_assignments(args.sim))
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.command == "run":
+        with open(args.spec) as f:
+            summary = run_spec(json.load(f), args.out)
+    else:
+        options = {k: v for k, v in vars(args).items() if k not in ("command", "out", "fhn", "lif", "sim")}
+        summary = [run_job(args.command, options, args.out or DEFAULT_OUT)]
+
+    failed = [entry for entry in summary if entry["status"] != "ok"]
+    if failed:
+        print(f"{len(failed)} of {len(summary)} job(s) failed")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
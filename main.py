@@ -5,25 +5,49 @@ This script serves as the primary controller for the simulation framework.
 It implements a decoupled architecture where the mathematical model selection 
 is independent of the visualization and analysis methods.
 
+Run without arguments for the interactive dashboard. With arguments it is the 
+headless batch CLI in cli.py (python main.py --help), e.g.
+    python main.py ensemble --ch 2 --sigma 0.05 --out results/
+    python main.py run jobs.json
+
 Author: NM
 Date: February 2026
 Project: Stochastic Dynamics in FitzHugh-Nagumo and LIF Models
 """
 
+import sys
+
+if __name__ == "__main__" and len(sys.argv) > 1:
+    # Batch mode: dispatch before pyplot is imported, so Agg can be selected
+    from cli import main as cli_main
+    sys.exit(cli_main())
+
 from analysis.ensemble_stats import ensemble_stats
 import simulation
 from visualization.timeseries import timeseries as plot_timeseries
 import Models
 import analysis
-import sys
+from simulation.cache import SimulationCache
 import numpy as np
 import matplotlib.pyplot as plt
 
-np.random.seed(42)
-
 # Initialize the statistical analysis engine.
 stats = analysis.ensemble_stats()
 
+# Ensembles are seeded and stored in the content-addressed simulation cache,
+# so asking for the same model/sigma again (in this session or a later one)
+# reopens the stored spikes instead of re-simulating. Run
+# `python -m simulation.cache clear` to invalidate it.
+ENSEMBLE_SEED = 42
+
+# Single trajectories (phase portraits, timeseries) are seeded too; the seed is
+# passed to the simulators (simulation.rng), the global np.random is not used.
+TRACE_SEED = 42
+cache = SimulationCache()
+
+def ensemble_store(ch, sigma):
+    return stats.run_ensemble(ch, sigma, seed=ENSEMBLE_SEED, cache=cache)
+
 while(True):
     print("\n====DASHBOARD====")
     print("1. Deterministic FHN")
@@ -78,10 +102,10 @@ while(True):
             det_phase_portrait()
         elif(ch == 2):
             from visualization.phase_portrait import add_noise_phase_portrait
-            add_noise_phase_portrait(s)
+            add_noise_phase_portrait(s, rng=TRACE_SEED)
         elif(ch == 3):
             from visualization.phase_portrait import mult_noise_phase_portrait
-            mult_noise_phase_portrait(s)
+            mult_noise_phase_portrait(s, rng=TRACE_SEED)
         elif(ch == 4):
             print("Phase Portrait is not available for 1D LIF Model.")
 
@@ -91,17 +115,29 @@ while(True):
         Executes a batch of trials to analyze long-term behavior.
         """
         print('Printing Ensemble Stats...')
-        count, timing, isi, cv, fano_factor = stats.trials_stats(ch, s)
+        count, timing, isi, cv, fano_factor = stats.store_stats(ensemble_store(ch, s))
         print("Trials and Spike Count: ", count)
         print("CV:", cv)
         print("Fano Factor: ", fano_factor)
+        if cv is None and ch != 1:
+            # Too few spikes in T for ISI statistics: estimate them by splitting instead
+            from analysis.rare_events import escape_rate
+            print("Too few spikes for ISI statistics; estimating the escape rate by multilevel splitting...")
+            try:
+                est = escape_rate(ch, s, seed=ENSEMBLE_SEED)
+            except ValueError as e:
+                print("Rare-event estimate not available:", e)
+            else:
+                print(f"Escape rate: {est['rate_hz']:.4g} +- {est['rate_se']*1000:.2g} Hz")
+                print(f"Mean ISI: {est['mean_isi_ms']:.4g} +- {est['mean_isi_se']:.2g} ms")
+                print(f"P(spike within T): {est['spike_probability']:.3e}")
 
     elif(ch_data == 3):
         """
         TIMESERIES PERSPECTIVE
         Standard temporal trace of membrane potential. 
         """
-        plot_timeseries(ch, s)
+        plot_timeseries(ch, s, rng=TRACE_SEED)
 
     elif(ch_data == 4):
         """
@@ -110,85 +146,45 @@ while(True):
         """
         from visualization.isi_histogram import plot_isi_histogram
         print("Generating ISI Histogram...")
-        _, _, all_isi, _, _ = stats.trials_stats(ch, s)
+        _, _, all_isi, _, _ = stats.store_stats(ensemble_store(ch, s))
         plot_isi_histogram(all_isi, ch, s)
 
     elif (ch_data == 5):
-        import scipy.stats as sc_stats  
+        from analysis.bio_comparison import compare_bio
+        from visualization.bio_comparison import plot_bio_comparison
 
         print("Loading biological ground truth...")
+        print("Simulating FHN and LIF Models (100 trials each)...")
         try:
-            bio_isi_ms = np.load('allen_data/biological_isi.npy')
-            # Filter out sleep/pause outliers so we measure the active firing regime
-            bio_isi_ms = bio_isi_ms[bio_isi_ms < 200] 
+            result = compare_bio(ch, s, ensemble_store)
         except FileNotFoundError:
             print("Error: Could not find 'allen_data/biological_isi.npy'.")
             continue
-
-        # Safeguard 's' so FHN doesn't crash on 0 spikes
-        fhn_sigma = 0.05 if s == 0.0 else s
-        
-        # --- THE FIX: Dynamically select Additive vs Multiplicative FHN ---
-        # If the user chose 3, run Multiplicative. Otherwise, default to 2 (Additive).
-        fhn_ch = ch if ch in [2, 3] else 2  
-        fhn_label = "Multiplicative FHN" if fhn_ch == 3 else "Additive FHN"
-
-        print(f"Simulating {fhn_label} Model (100 trials, sigma={fhn_sigma})...")
-        _, _, fhn_isi_timesteps, fhn_cv, _ = stats.trials_stats(fhn_ch, fhn_sigma)
-
-        print("Simulating LIF Model (100 trials)...")
-        _, _, lif_isi_timesteps, lif_cv, _ = stats.trials_stats(4, fhn_sigma)
-        # SAFEGUARD: Replace 'None' CVs with 0.0 so formatting doesn't crash
-        fhn_cv_display = fhn_cv if fhn_cv is not None else 0.0
-        lif_cv_display = lif_cv if lif_cv is not None else 0.0
-
-        # Convert to ms
-        dt = 0.01
-        fhn_ms = np.array(fhn_isi_timesteps) * dt if fhn_isi_timesteps else np.array([])
-        lif_ms = np.array(lif_isi_timesteps) * dt if lif_isi_timesteps else np.array([])
+        fhn_label = result["fhn_label"]
 
         print("\n" + "="*40)
         print("FINAL STATISTICAL BENCHMARKS")
         print("="*40)
 
-        # --- 1. Calculate and Compare CV ---
-        bio_cv = np.std(bio_isi_ms) / np.mean(bio_isi_ms)
-        print(f"Biological Mouse CV : {bio_cv:.3f}")
-        print(f"Math Model ({fhn_label}) CV : {fhn_cv_display:.3f}")
-        print(f"Engineering (LIF) CV: {lif_cv_display:.3f}\n")
+        # 95% bootstrap intervals, printed after each value
+        def ci(name):
+            interval = result[f"{name}_ci"]
+            return "" if interval is None else f"  [95% CI {interval[0]:.3f}, {interval[1]:.3f}]"
 
-        # --- 2. Calculate KS Test ---
-        if len(fhn_ms) > 0 and len(lif_ms) > 0:
-            ks_fhn_stat, _ = sc_stats.ks_2samp(fhn_ms, bio_isi_ms)
-            ks_lif_stat, _ = sc_stats.ks_2samp(lif_ms, bio_isi_ms)
+        # --- 1. Compare CV ---
+        print(f"Biological Mouse CV : {result['bio_cv']:.3f}{ci('bio_cv')}")
+        print(f"Math Model ({fhn_label}) CV : {result['fhn_cv']:.3f}{ci('fhn_cv')}")
+        print(f"Engineering (LIF) CV: {result['lif_cv']:.3f}{ci('lif_cv')}\n")
 
+        # --- 2. KS Test ---
+        if result["ks_fhn"] is not None:
             print("Kolmogorov-Smirnov Distance (Lower is closer to Biology):")
-            print(f"{fhn_label} vs Biology KS Statistic: {ks_fhn_stat:.3f}")
-            print(f"LIF vs Biology KS Statistic: {ks_lif_stat:.3f}")
+            print(f"{fhn_label} vs Biology KS Statistic: {result['ks_fhn']:.3f}{ci('ks_fhn')}")
+            print(f"LIF vs Biology KS Statistic: {result['ks_lif']:.3f}{ci('ks_lif')}")
         else:
             print("Not enough spikes generated to calculate KS Statistic.")
             
         print("="*40 + "\n")
 
         print("Generating the plot...")
-
-        # --- PLOTTING ---
-        fig, ax = plt.subplots(figsize=(10, 6))
-
-        my_bins = np.arange(0, 160, 4)
-
-        ax.hist(bio_isi_ms, bins=my_bins, density=True, alpha=0.5, color='#2ca02c', label=f'Biological (CV: {bio_cv:.2f})', edgecolor='black')
-        ax.hist(fhn_ms, bins=my_bins, density=True, alpha=0.5, color='#9467bd', label=f'{fhn_label} (CV: {fhn_cv_display:.2f})', edgecolor='black')
-        ax.hist(lif_ms, bins=my_bins, density=True, alpha=0.5, color='#ff7f0e', label=f'LIF (CV: {lif_cv_display:.2f})', edgecolor='black')
-
-        ax.set_title(f'Inter-Spike Interval Distribution: Models vs. Reality', fontsize=14, fontweight='bold')
-        ax.set_xlabel('Inter-Spike Interval (ms)', fontsize=12)
-        ax.set_ylabel('Probability Density', fontsize=12)
-
-        ax.set_xlim(0, 160)
-
-        ax.legend(fontsize=11, loc='upper right')
-        ax.grid(axis='y', alpha=0.3, linestyle='--')
-
-        plt.tight_layout()
-        plt.show()
\ No newline at end of file
+        plot_bio_comparison(result)
@@ -1,4 +1,50 @@
+import importlib
+
 from .path_calling import path_calling_fhn, path_calling_lif
 from .deterministic import deterministic
 from .additive_noise import additive_noise_fhn, additive_noise_lif
-from .multiplicative_noise import multiplicative_noise
\ No newline at end of file
+from .multiplicative_noise import multiplicative_noise
+from .batched import batched_deterministic, batched_additive_noise_fhn, batched_multiplicative_noise, batched_additive_noise_lif
+from .exact_lif import exact_lif
+
+# Loaded on first attribute access (PEP 562), so `import simulation` stays cheap
+# for short-lived worker processes. Names that coincide with their submodule
+# (deterministic, exact_lif, ...) are imported above instead: importing the
+# submodule would otherwise replace the function on the package.
+_LAZY = {
+    "integrate": "integrators",
+    "get_integrator": "integrators",
+    "stream_spikes": "streaming",
+    "spike_train": "streaming",
+    "SimulationCache": "cache",
+    "simulation_key": "cache",
+    "network_fhn": "network",
+    "network_lif": "network",
+    "random_coupling": "network",
+    "trial_rng": "rng",
+    "TrialStreams": "rng",
+    "stationary_density": "fokker_planck",
+    "isi_density": "fokker_planck",
+}
+_SUBMODULES = {"batched", "cache", "config", "fokker_planck", "integrators", "kernels", "network", "rng", "streaming"}
+
+__all__ = [
+    "path_calling_fhn", "path_calling_lif", "deterministic", "additive_noise_fhn", "additive_noise_lif",
+    "multiplicative_noise", "batched_deterministic", "batched_additive_noise_fhn",
+    "batched_multiplicative_noise", "batched_additive_noise_lif", "exact_lif", *_LAZY,
+]
+
+
+def __getattr__(name):
+    if name in _LAZY:
+        value = getattr(importlib.import_module(f".{_LAZY[name]}", __name__), name)
+    elif name in _SUBMODULES:
+        value = importlib.import_module(f".{name}", __name__)
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__) | _SUBMODULES)
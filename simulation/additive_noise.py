@@ -3,8 +3,11 @@ from Models.FHN import FHN
 from Models.LIF import LIF
 from simulation.path_calling import path_calling_fhn
 from simulation.path_calling import path_calling_lif
+from simulation.config import load_settings
+from simulation.kernels import use_compiled, kernel_for, euler_maruyama_fhn, lif_threshold_reset
+from simulation.rng import make_rng
 
-def additive_noise_fhn(v0,w0, sigma):
+def additive_noise_fhn(v0,w0, sigma, backend="python", dt=None, T=None, rng=None):
     """
     Simulates the FitzHugh-Nagumo (FHN) model with additive stochastic noise 
     using the Euler-Maruyama numerical method.
@@ -18,32 +21,45 @@ def additive_noise_fhn(v0,w0, sigma):
     Brownian motion (the dW term in an SDE) has a variance that grows linearly with time. 
     To keep the noise consistent across different step sizes, the random displacement must 
     be scaled by the square root of the time interval.
+
+    backend selects the reference Python loop ("python") or the compiled kernel 
+    in simulation.kernels ("numba", falls back to "python" without Numba). 
+    dt and T are the timestep and total time in ms (default:
+    simulation.config.load_settings()). rng is a np.random.Generator
+    or a seed (see simulation.rng); with simulation.rng.trial_rng(seed, k) the
+    trajectory is trial k of the batched ensemble seeded with seed.
     """
 
     # Load model parameters from centralized config
     I_ext,a,b,tau = path_calling_fhn()
-    dt = 0.01        # timestep
-    T = 1000           # total time
+    settings = load_settings()
+    dt = settings.dt if dt is None else dt
+    T = settings.T if T is None else T
     steps = int(T/dt)
 
-    v = np.zeros(steps)
-    w = np.zeros(steps)
-    t = np.linspace(0, T, steps)
-
     neuron = FHN(a, b, tau, I_ext)
 
-    # Initial conditions
-    v[0] = v0
-    w[0] = w0
+    # One standard normal draw per timestep, drawn as a single block
+    z = make_rng(rng).normal(0, 1, steps - 1)
 
-    # Time evolution loop
-    for i in range(1, steps):
-        # Noise intensity parameter (sigma)
-        noise = sigma * np.random.normal(0, 1) * np.sqrt(dt)
-        # Calculate the Wiener increment dW. 
-        # For Brownian motion, variance scales with dt, so std_dev scales with sqrt(dt).
-        v[i] = v[i-1] + neuron.f(v[i-1], w[i-1])*dt
-        w[i] = w[i-1] + neuron.g(v[i-1], w[i-1]) * dt + noise
+    if use_compiled(backend):
+        v, w = kernel_for(euler_maruyama_fhn, backend)(v0, w0, I_ext, a, b, tau, sigma, dt, z)
+    else:
+        v = np.zeros(steps)
+        w = np.zeros(steps)
+
+        # Initial conditions
+        v[0] = v0
+        w[0] = w0
+
+        # Time evolution loop
+        for i in range(1, steps):
+            # Noise intensity parameter (sigma)
+            noise = sigma * z[i-1] * np.sqrt(dt)
+            # Calculate the Wiener increment dW. 
+            # For Brownian motion, variance scales with dt, so std_dev scales with sqrt(dt).
+            v[i] = v[i-1] + neuron.f(v[i-1], w[i-1])*dt
+            w[i] = w[i-1] + neuron.g(v[i-1], w[i-1]) * dt + noise
 
     #print("v values:",v)
     #print("w values:",w)
@@ -56,23 +72,44 @@ def additive_noise_fhn(v0,w0, sigma):
     return v,w,v_e,w_e,J_e
 
 
-def additive_noise_lif(sigma):
-    dt = 0.01        # timestep
-    T = 1000           # total time
+def additive_noise_lif(sigma, backend="python", dt=None, T=None, rng=None):
+    """
+    Simulates the noisy LIF model with threshold, reset and an absolute
+    refractory period (Euler-Maruyama).
+
+    One normal draw is reserved per timestep and left unused while the neuron
+    is refractory, as in the batched and streaming LIF, so with
+    rng=simulation.rng.trial_rng(seed, k) the spikes are those of trial k of
+    the batched ensemble seeded with seed. dt and T (ms), like the threshold
+    and refractory period, default to simulation.config.load_settings().
+
+    Returns:
+        tuple: (v, spike_times) with spike_times a list of timesteps.
+    """
+    # Timestep, duration, threshold, drawn spike peak and absolute refractory period (ms)
+    settings = load_settings()
+    dt = settings.dt if dt is None else dt
+    T = settings.T if T is None else T
     steps = int(T/dt)
 
     I_ext, R, V_r, tau = path_calling_lif()
 
     neuron_2 = LIF(I_ext,R, V_r, tau)
+    
+    v_th = settings.v_th_lif
+    v_peak = settings.v_peak
+    t_ref = settings.t_ref
+
+    z = make_rng(rng).normal(0, 1, steps - 1)
+
+    if use_compiled(backend):
+        v, spike_times = kernel_for(lif_threshold_reset, backend)(I_ext, R, V_r, tau, sigma, v_th, v_peak, t_ref, dt, z)
+        return v, spike_times.tolist()
+
     v = np.zeros(steps)
     v[0] = V_r
     
     spike_times = []
-    
-    v_th = -55.0
-    v_peak = 20.0
-    
-    t_ref = 5.0  # Absolute refractory period in milliseconds
     refractory_time_left = 0.0  # Countdown timer
 
     for i in range(1, steps):
@@ -84,7 +121,7 @@ def additive_noise_lif(sigma):
             continue    # Skip the math below and go to the next timestep
             
         # 2. If NOT in refractory, do the normal integration
-        noise = sigma * np.random.normal(0, 1) * np.sqrt(dt)
+        noise = sigma * z[i-1] * np.sqrt(dt)
         v[i] = v[i-1] + neuron_2.leaky_integrate_and_fire_model(v[i-1])*dt + noise
 
         # 3. Spike Detection
@@ -0,0 +1,271 @@
+import numpy as np
+from Models.FHN import FHN
+from Models.LIF import LIF
+from simulation.path_calling import path_calling_fhn
+from simulation.path_calling import path_calling_lif
+from simulation.rng import batch_rng
+from simulation.config import load_settings
+
+
+def _chunk_steps(n_trials, chunk_size):
+    # Keep the (n_trials, chunk) noise matrix at roughly 4M doubles (~32 MB)
+    # unless the caller asks for a specific chunk length.
+    if chunk_size is None:
+        chunk_size = max(1, 2**22 // max(n_trials, 1))
+    return chunk_size
+
+
+def _trial_column(x):
+    # Per-trial values (an (n_trials,) array) scale the rows of an
+    # (n_trials, chunk) noise block; scalars pass through unchanged
+    return x[:, None] if np.ndim(x) == 1 else x
+
+
+def _resolve(v_th, dt, T, threshold="v_th_fhn"):
+    # Unset threshold / dt / T come from the (possibly overridden) SimSettings
+    settings = load_settings()
+    return (getattr(settings, threshold) if v_th is None else v_th,
+            settings.dt if dt is None else dt,
+            settings.T if T is None else T)
+
+
+def _split_by_trial(trial_idx, step_idx, n_trials):
+    """
+    Groups flat (trial, step) spike coordinates into one sorted index array per trial.
+    """
+    if len(trial_idx) == 0:
+        return [np.array([], dtype=np.int64) for _ in range(n_trials)]
+    trial_idx = np.concatenate(trial_idx)
+    step_idx = np.concatenate(step_idx)
+    # Chunks arrive in time order, so a stable sort on trial keeps steps ascending.
+    order = np.argsort(trial_idx, kind='stable')
+    counts = np.bincount(trial_idx, minlength=n_trials)
+    return np.split(step_idx[order].astype(np.int64), np.cumsum(counts)[:-1])
+
+
+def batched_deterministic(v0, w0, n_trials, v_th=None, dt=None, T=None, chunk_size=None, params=None, state=None, on_chunk=None):
+    """
+    Advances n_trials copies of the deterministic FHN model at once (Euler method).
+
+    Every trial starts from the same initial condition, so all trials are
+    identical; the function exists so that ensemble code can treat every
+    model choice through the same batched interface (including state and
+    on_chunk, see batched_additive_noise_fhn).
+
+    Returns:
+        list: One ndarray of spike indices (timesteps) per trial.
+    """
+    I_ext,a,b,tau = path_calling_fhn() if params is None else params
+    v_th, dt, T = _resolve(v_th, dt, T)
+    steps = int(T/dt)
+    chunk_size = _chunk_steps(n_trials, chunk_size)
+
+    neuron = FHN(a, b, tau, I_ext)
+
+    v = np.full(n_trials, v0, dtype=np.float64)
+    w = np.full(n_trials, w0, dtype=np.float64)
+    first = 1
+    if state is not None:
+        first, v, w = state["step"], np.array(state["v"], dtype=np.float64), np.array(state["w"], dtype=np.float64)
+
+    trial_idx, step_idx = [], []
+    for start in range(first, steps, chunk_size):
+        n = min(chunk_size, steps - start)
+        crossed = np.empty((n_trials, n), dtype=bool)
+        for j in range(n):
+            v_new = v + neuron.f(v, w)*dt
+            w = w + neuron.g(v, w)*dt
+            crossed[:, j] = (v < v_th) & (v_new >= v_th)
+            v = v_new
+        tr, st = np.nonzero(crossed)
+        trial_idx.append(tr)
+        step_idx.append(st + start)
+        if on_chunk is not None:
+            on_chunk(start + n, {"v": v, "w": w}, tr, st + start)
+
+    return _split_by_trial(trial_idx, step_idx, n_trials)
+
+
+def batched_additive_noise_fhn(v0, w0, sigma, n_trials, v_th=None, dt=None, T=None, chunk_size=None, params=None, rng=None,
+                               state=None, on_chunk=None):
+    """
+    Advances n_trials independent additive-noise FHN trajectories at once
+    using the Euler-Maruyama method.
+
+    The state is held as two (n_trials,) vectors. For every chunk of timesteps
+    the full (n_trials, chunk) matrix of Wiener increments is drawn in one call,
+    and upward crossings of v_th are recorded as they happen, so the full
+    voltage traces are never stored.
+
+    Args:
+        v0 (float): Initial condition for the membrane potential (v).
+        w0 (float): Initial condition for the recovery variable (w).
+        sigma (float): Noise intensity.
+        n_trials (int): Number of independent trajectories.
+        v_th (float): Spike detection threshold. v_th, dt and T default to the
+            SimSettings of simulation.config (v_th_fhn, dt, T), overrides included.
+        chunk_size (int): Timesteps per noise block (default keeps the block near 32 MB).
+        params (tuple): Optional (I_ext, a, b, tau) overriding config/fhn_params.json.
+        rng: Random source (see simulation.rng). A seed gives every trial its own
+            stream, so each trial is reproducible on its own (trial_rng) and
+            independent of n_trials and chunk_size; a Generator feeds the whole
+            block from one stream; None draws unseeded.
+        state (dict): Optional integrator state to resume from: "step" (the next
+            timestep) and the state vectors ("v", "w"), as passed to on_chunk.
+        on_chunk (callable): Optional on_chunk(next_step, state, trial_idx, step_idx),
+            called after every chunk with the state vectors and the spikes of
+            the chunk (used by analysis.checkpoint).
+
+    sigma and the entries of params may also be (n_trials,) arrays, one value
+    per trial, so that different parameter sets can share one batch.
+
+    Returns:
+        list: One ndarray of spike indices (timesteps) per trial.
+    """
+    I_ext,a,b,tau = path_calling_fhn() if params is None else params
+    v_th, dt, T = _resolve(v_th, dt, T)
+    steps = int(T/dt)
+    chunk_size = _chunk_steps(n_trials, chunk_size)
+    rng = batch_rng(rng, n_trials)
+    sigma = _trial_column(sigma)
+
+    neuron = FHN(a, b, tau, I_ext)
+
+    v = np.full(n_trials, v0, dtype=np.float64)
+    w = np.full(n_trials, w0, dtype=np.float64)
+    first = 1
+    if state is not None:
+        first, v, w = state["step"], np.array(state["v"], dtype=np.float64), np.array(state["w"], dtype=np.float64)
+
+    trial_idx, step_idx = [], []
+    for start in range(first, steps, chunk_size):
+        n = min(chunk_size, steps - start)
+        noise = sigma * rng.normal(0, 1, size=(n_trials, n)) * np.sqrt(dt)
+        crossed = np.empty((n_trials, n), dtype=bool)
+        for j in range(n):
+            v_new = v + neuron.f(v, w)*dt
+            w = w + neuron.g(v, w)*dt + noise[:, j]
+            crossed[:, j] = (v < v_th) & (v_new >= v_th)
+            v = v_new
+        tr, st = np.nonzero(crossed)
+        trial_idx.append(tr)
+        step_idx.append(st + start)
+        if on_chunk is not None:
+            on_chunk(start + n, {"v": v, "w": w}, tr, st + start)
+
+    return _split_by_trial(trial_idx, step_idx, n_trials)
+
+
+def batched_multiplicative_noise(v0, w0, sigma, n_trials, v_th=None, dt=None, T=None, chunk_size=None, params=None, rng=None,
+                                 state=None, on_chunk=None):
+    """
+    Advances n_trials independent multiplicative-noise FHN trajectories at once
+    using the same Second-Order Stochastic Runge-Kutta (Heun) scheme as
+    simulation.multiplicative_noise.
+
+    As in batched_additive_noise_fhn, sigma and params may hold per-trial
+    arrays, and a run can be resumed from state and observed with on_chunk.
+
+    Returns:
+        list: One ndarray of spike indices (timesteps) per trial.
+    """
+    I_ext,a,b,tau = path_calling_fhn() if params is None else params
+    v_th, dt, T = _resolve(v_th, dt, T)
+    steps = int(T/dt)
+    chunk_size = _chunk_steps(n_trials, chunk_size)
+    rng = batch_rng(rng, n_trials)
+
+    neuron = FHN(a, b, tau, I_ext)
+
+    v = np.full(n_trials, v0, dtype=np.float64)
+    w = np.full(n_trials, w0, dtype=np.float64)
+    first = 1
+    if state is not None:
+        first, v, w = state["step"], np.array(state["v"], dtype=np.float64), np.array(state["w"], dtype=np.float64)
+
+    trial_idx, step_idx = [], []
+    for start in range(first, steps, chunk_size):
+        n = min(chunk_size, steps - start)
+        delta_B = np.sqrt(dt) * rng.normal(0, 1, size=(n_trials, n))
+        crossed = np.empty((n_trials, n), dtype=bool)
+        for j in range(n):
+            dB = delta_B[:, j]
+            f0 = neuron.f(v, w)
+            g0 = neuron.g(v, w)
+            v_predictor = v + f0*dt
+            w_predictor = w + g0*dt + (sigma*dB*w)
+            v_new = v + (1/2)*(f0 + neuron.f(v_predictor, w_predictor))*dt
+            w = w + (1/2)*(g0 + neuron.g(v_predictor, w_predictor))*dt + (1/2)*sigma*(w + w_predictor)*dB
+            crossed[:, j] = (v < v_th) & (v_new >= v_th)
+            v = v_new
+        tr, st = np.nonzero(crossed)
+        trial_idx.append(tr)
+        step_idx.append(st + start)
+        if on_chunk is not None:
+            on_chunk(start + n, {"v": v, "w": w}, tr, st + start)
+
+    return _split_by_trial(trial_idx, step_idx, n_trials)
+
+
+def batched_additive_noise_lif(sigma, n_trials, v_th=None, t_ref=None, dt=None, T=None, chunk_size=None, params=None, rng=None,
+                               state=None, on_chunk=None):
+    """
+    Advances n_trials independent noisy LIF neurons at once, with the same
+    threshold / reset / absolute refractory rules as simulation.additive_noise_lif.
+
+    Each trial keeps its own refractory countdown, so trials that are clamped
+    at V_r simply ignore their column of the noise matrix for that step.
+    params optionally overrides config/lif_params.json as (I_ext, R, V_r, tau);
+    v_th, t_ref, dt and T default to the SimSettings (v_th_lif, t_ref, dt, T).
+    sigma, t_ref and the entries of params may also be (n_trials,) arrays.
+    state and on_chunk work as in batched_additive_noise_fhn, with the state
+    vectors "v" and "refractory_time_left".
+
+    Returns:
+        list: One ndarray of spike indices (timesteps) per trial.
+    """
+    v_th, dt, T = _resolve(v_th, dt, T, "v_th_lif")
+    t_ref = load_settings().t_ref if t_ref is None else t_ref
+    steps = int(T/dt)
+    chunk_size = _chunk_steps(n_trials, chunk_size)
+    rng = batch_rng(rng, n_trials)
+
+    I_ext, R, V_r, tau = path_calling_lif() if params is None else params
+    sigma = _trial_column(sigma)
+    V_r = np.broadcast_to(V_r, n_trials)
+    t_ref = np.broadcast_to(t_ref, n_trials)
+
+    neuron_2 = LIF(I_ext, R, V_r, tau)
+
+    v = np.array(V_r, dtype=np.float64)
+    refractory_time_left = np.zeros(n_trials)
+    first = 1
+    if state is not None:
+        first = state["step"]
+        v = np.array(state["v"], dtype=np.float64)
+        refractory_time_left = np.array(state["refractory_time_left"], dtype=np.float64)
+
+    trial_idx, step_idx = [], []
+    for start in range(first, steps, chunk_size):
+        n = min(chunk_size, steps - start)
+        noise = sigma * rng.normal(0, 1, size=(n_trials, n)) * np.sqrt(dt)
+        crossed = np.empty((n_trials, n), dtype=bool)
+        for j in range(n):
+            refractory = refractory_time_left > 0
+            refractory_time_left = np.where(refractory, refractory_time_left - dt, refractory_time_left)
+
+            v_new = v + neuron_2.leaky_integrate_and_fire_model(v)*dt + noise[:, j]
+            v_new = np.where(refractory, V_r, v_new)
+
+            spiked = ~refractory & (v_new >= v_th)
+            v_new[spiked] = V_r[spiked]
+            refractory_time_left[spiked] = t_ref[spiked]
+            crossed[:, j] = spiked
+            v = v_new
+        tr, st = np.nonzero(crossed)
+        trial_idx.append(tr)
+        step_idx.append(st + start)
+        if on_chunk is not None:
+            on_chunk(start + n, {"v": v, "refractory_time_left": refractory_time_left}, tr, st + start)
+
+    return _split_by_trial(trial_idx, step_idx, n_trials)
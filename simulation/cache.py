@@ -0,0 +1,175 @@
+"""
+Content-addressed on-disk cache for simulation results.
+
+A result is stored under the SHA-256 of a canonical JSON description of the
+run: model, integrator, model parameters, dt, T, initial conditions, sigma,
+RNG seed and trial count. Identical requests therefore map to the same entry
+no matter which session or process produced it, and any change to the
+parameters (for example an edit of config/*.json) produces a new key.
+
+Each entry is a directory of .npy arrays plus meta.json. Arrays are reopened
+memory-mapped. The cache is bounded in size: when it grows beyond max_bytes,
+the least recently used entries are removed.
+
+Usage:
+    python -m simulation.cache info      # list entries and total size
+    python -m simulation.cache clear     # invalidate everything
+    python -m simulation.cache evict --max-bytes 500000000
+    python -m simulation.cache invalidate <key prefix>
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+import numpy as np
+
+DEFAULT_ROOT = Path(__file__).resolve().parent.parent / ".sim_cache"
+DEFAULT_MAX_BYTES = 2 * 1024**3
+
+# Bump when an integrator changes numerically, so stale results are never served.
+CACHE_VERSION = 2  # 2: per-trial random streams (simulation.rng)
+
+
+def simulation_key(**spec):
+    """
+    Hashes a run description into a cache key.
+
+    Keys are order-independent (JSON with sorted keys) and tuples hash like
+    lists, so (0.265, 0.7) and [0.265, 0.7] give the same key.
+    """
+    spec = dict(spec, cache_version=CACHE_VERSION)
+    canonical = json.dumps(spec, sort_keys=True, separators=(",", ":"), default=float)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def _entry_size(path):
+    return sum(f.stat().st_size for f in path.iterdir() if f.is_file())
+
+
+class SimulationCache:
+    """
+    Size-bounded LRU cache of simulation results, keyed by simulation_key.
+    """
+
+    def __init__(self, root=DEFAULT_ROOT, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+
+    def _path(self, key):
+        return self.root / key
+
+    def get(self, key):
+        """
+        Returns (arrays, meta) for a cached entry, or None on a miss.
+        Arrays are memory-mapped read-only. A hit refreshes the entry's LRU time.
+        """
+        path = self._path(key)
+        meta_file = path / "meta.json"
+        if not meta_file.exists():
+            return None
+        with open(meta_file) as f:
+            meta = json.load(f)
+        arrays = {name: np.load(path / f"{name}.npy", mmap_mode="r") for name in meta["arrays"]}
+        os.utime(meta_file)  # mark as recently used
+        return arrays, meta["meta"]
+
+    def put(self, key, arrays, meta=None):
+        """
+        Stores a dict of arrays (plus JSON-serializable meta) under key, then
+        evicts least recently used entries if the cache is over its size bound.
+
+        The entry is written to a temporary directory and renamed into place,
+        so concurrent workers never observe a half-written entry.
+        """
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = Path(tempfile.mkdtemp(dir=self.root, prefix=".tmp-"))
+        for name, arr in arrays.items():
+            np.save(tmp / f"{name}.npy", np.asarray(arr))
+        with open(tmp / "meta.json", "w") as f:
+            json.dump({"arrays": list(arrays), "meta": meta or {}}, f, indent=2)
+        try:
+            os.replace(tmp, self._path(key))
+        except OSError:
+            # Another process stored the same key first; keep its entry
+            shutil.rmtree(tmp, ignore_errors=True)
+        self.evict()
+        return self._path(key)
+
+    def entries(self):
+        """
+        Lists (key, size_bytes, last_used) for every entry, least recently used first.
+        """
+        if not self.root.exists():
+            return []
+        found = []
+        for path in self.root.iterdir():
+            meta_file = path / "meta.json"
+            if path.is_dir() and not path.name.startswith(".") and meta_file.exists():
+                found.append((path.name, _entry_size(path), meta_file.stat().st_mtime))
+        return sorted(found, key=lambda e: e[2])
+
+    def evict(self, max_bytes=None):
+        """
+        Removes least recently used entries until the cache fits in max_bytes.
+
+        Returns:
+            int: Number of entries removed.
+        """
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for key, size, _ in entries:
+            if total <= max_bytes:
+                break
+            shutil.rmtree(self._path(key), ignore_errors=True)
+            total -= size
+            removed += 1
+        return removed
+
+    def invalidate(self, key):
+        """Removes a single entry."""
+        shutil.rmtree(self._path(key), ignore_errors=True)
+
+    def clear(self):
+        """Removes every entry (explicit invalidation of the whole cache)."""
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["info", "clear", "evict", "invalidate"])
+    parser.add_argument("key", nargs="?", help="entry (or unique key prefix) to remove, for invalidate")
+    parser.add_argument("--root", default=DEFAULT_ROOT)
+    parser.add_argument("--max-bytes", type=int, default=DEFAULT_MAX_BYTES)
+    args = parser.parse_args(argv)
+
+    cache = SimulationCache(args.root, args.max_bytes)
+    if args.command == "info":
+        entries = cache.entries()
+        for key, size, last_used in entries:
+            print(f"{key[:16]}  {size/1e6:10.2f} MB  last used {time.ctime(last_used)}")
+        print(f"{len(entries)} entries, {sum(e[1] for e in entries)/1e6:.2f} MB in {cache.root}")
+    elif args.command == "clear":
+        cache.clear()
+        print(f"Cleared {cache.root}")
+    elif args.command == "evict":
+        print(f"Evicted {cache.evict()} entries")
+    elif args.command == "invalidate":
+        if args.key is None:
+            parser.error("invalidate needs a key (or a unique prefix from 'info')")
+        matches = [key for key, _, _ in cache.entries() if key.startswith(args.key)]
+        if len(matches) != 1:
+            parser.error(f"'{args.key}' matches {len(matches)} entries")
+        cache.invalidate(matches[0])
+        print(f"Invalidated {matches[0]}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,235 @@
+"""
+Typed, cached model and simulation configuration.
+
+The JSON files in config/ are parsed into frozen dataclasses:
+
+    FHNParams     I_ext, a, b, tau        (config/fhn_params.json)
+    LIFParams     I_ext, R, V_r, tau      (config/lif_params.json)
+    SimSettings   dt, T, thresholds, refractory period, initial conditions
+                  (config/simulation.json, optional; defaults below)
+
+Each file is read once per process and only re-read when its modification
+time changes, so the loaders are cheap enough to call once per trial. Values
+can be overridden without touching the files, either per process (the CLI)
+or for a block of code:
+
+    with overrides(fhn={"I_ext": 0.27}):
+        simulation.additive_noise_fhn(-1.00125, -0.4, 0.05)
+
+Param objects are immutable; grids are built with .replace():
+
+    base = load_fhn_params()
+    grid = [base.replace(I_ext=i) for i in (0.25, 0.26, 0.27)]
+"""
+import dataclasses
+import json
+import numbers
+import os
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+
+CONFIG_DIR = Path(__file__).resolve().parent.parent / "config"
+
+
+def _check_numbers(obj, positive=()):
+    for field in dataclasses.fields(obj):
+        value = getattr(obj, field.name)
+        if field.type in ("float", float) and (isinstance(value, bool) or not isinstance(value, numbers.Real)):
+            raise ValueError(f"{type(obj).__name__}.{field.name} must be a number, got {value!r}")
+    for name in positive:
+        if getattr(obj, name) <= 0:
+            raise ValueError(f"{type(obj).__name__}.{name} must be positive, got {getattr(obj, name)!r}")
+
+
+@dataclass(frozen=True, slots=True)
+class FHNParams:
+    """FitzHugh-Nagumo parameters, in the order of path_calling_fhn()."""
+    I_ext: float
+    a: float
+    b: float
+    tau: float
+
+    def __post_init__(self):
+        _check_numbers(self, positive=("tau",))
+
+    def as_tuple(self):
+        return (self.I_ext, self.a, self.b, self.tau)
+
+    def replace(self, **changes):
+        return dataclasses.replace(self, **changes)
+
+
+@dataclass(frozen=True, slots=True)
+class LIFParams:
+    """Leaky integrate-and-fire parameters, in the order of path_calling_lif()."""
+    I_ext: float
+    R: float
+    V_r: float
+    tau: float
+
+    def __post_init__(self):
+        _check_numbers(self, positive=("R", "tau"))
+
+    def as_tuple(self):
+        return (self.I_ext, self.R, self.V_r, self.tau)
+
+    def replace(self, **changes):
+        return dataclasses.replace(self, **changes)
+
+
+@dataclass(frozen=True, slots=True)
+class SimSettings:
+    """
+    Integration and spike-detection settings shared by the simulators.
+
+    ic_deterministic is the FHN start for the deterministic run (on the
+    excitable loop, Yamakou et al. Fig. 1); ic_stochastic the start of the
+    noisy FHN runs.
+    """
+    dt: float = 0.01
+    T: float = 1000.0
+    v_th_fhn: float = -0.55
+    v_th_lif: float = -55.0
+    v_peak: float = 20.0
+    t_ref: float = 5.0
+    ic_deterministic: tuple = (-1.00125, -0.46)
+    ic_stochastic: tuple = (-1.00125, -0.4)
+
+    def __post_init__(self):
+        _check_numbers(self, positive=("dt", "T"))
+        if self.t_ref < 0:
+            raise ValueError(f"SimSettings.t_ref must be non-negative, got {self.t_ref!r}")
+        for name in ("ic_deterministic", "ic_stochastic"):
+            value = getattr(self, name)
+            if len(value) != 2:
+                raise ValueError(f"SimSettings.{name} must be (v0, w0), got {value!r}")
+            # JSON gives lists; keep the frozen object hashable
+            object.__setattr__(self, name, tuple(value))
+
+    @property
+    def steps(self):
+        return int(self.T/self.dt)
+
+    def initial_conditions(self, ch):
+        """(v0, w0) of an FHN simulation type (1: deterministic, 2/3: noisy); () for LIF."""
+        if ch == 1:
+            return self.ic_deterministic
+        if ch in (2, 3):
+            return self.ic_stochastic
+        return ()
+
+    def replace(self, **changes):
+        return dataclasses.replace(self, **changes)
+
+
+# section -> (file, top-level JSON key, dataclass, file is required)
+SECTIONS = {
+    "fhn": ("fhn_params.json", "fhn_parameters", FHNParams, True),
+    "lif": ("lif_params.json", "lif_parameters", LIFParams, True),
+    "simulation": ("simulation.json", "simulation_settings", SimSettings, False),
+}
+
+_loaded = {}  # path -> (mtime_ns, parsed dataclass)
+_overrides = {section: {} for section in SECTIONS}
+
+
+def _load(section, path=None):
+    filename, key, cls, required = SECTIONS[section]
+    path = Path(path) if path is not None else CONFIG_DIR / filename
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        if required:
+            raise
+        return cls()
+
+    cached = _loaded.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path) as f:
+            raw = json.load(f)
+        try:
+            values = raw[key]
+            cached = (mtime, cls(**values))
+        except (KeyError, TypeError) as e:
+            raise ValueError(f"{path}: expected a '{key}' object with fields "
+                             f"{[f.name for f in dataclasses.fields(cls)]} ({e})") from None
+        _loaded[path] = cached
+    return cached[1]
+
+
+def _with_overrides(section, obj):
+    extra = _overrides[section]
+    return obj.replace(**extra) if extra else obj
+
+
+def load_fhn_params(path=None):
+    """FHNParams from config/fhn_params.json (or path), with active overrides applied."""
+    return _with_overrides("fhn", _load("fhn", path))
+
+
+def load_lif_params(path=None):
+    """LIFParams from config/lif_params.json (or path), with active overrides applied."""
+    return _with_overrides("lif", _load("lif", path))
+
+
+def load_settings(path=None):
+    """SimSettings from config/simulation.json (or path, or the defaults), with active overrides applied."""
+    return _with_overrides("simulation", _load("simulation", path))
+
+
+def set_overrides(section, **values):
+    """
+    Overrides fields of a section ("fhn", "lif" or "simulation") for the rest
+    of the process. Values are validated immediately.
+
+    Overrides are process-local: worker processes of a sweep do not see them,
+    which is why the sweep passes explicit parameter tuples instead.
+    """
+    if section not in SECTIONS:
+        raise ValueError(f"Unknown config section '{section}', expected one of {sorted(SECTIONS)}")
+    names = {f.name for f in dataclasses.fields(SECTIONS[section][2])}
+    unknown = set(values) - names
+    if unknown:
+        raise ValueError(f"Unknown {section} field(s) {sorted(unknown)}, expected some of {sorted(names)}")
+    candidate = dict(_overrides[section], **values)
+    # Build once so invalid values fail here, not inside a simulation
+    _load(section).replace(**candidate)
+    _overrides[section] = candidate
+
+
+def clear_overrides(section=None):
+    for name in SECTIONS if section is None else (section,):
+        _overrides[name] = {}
+
+
+@contextmanager
+def overrides(**sections):
+    """
+    Temporarily overrides config fields, e.g. overrides(fhn={"I_ext": 0.27}, simulation={"dt": 0.005}).
+    """
+    saved = {name: dict(values) for name, values in _overrides.items()}
+    try:
+        for section, values in sections.items():
+            if values:
+                set_overrides(section, **values)
+        yield
+    finally:
+        _overrides.update(saved)
+
+
+def parse_assignments(items):
+    """
+    Parses CLI-style ["I_ext=0.27", "tau=10"] into {"I_ext": 0.27, "tau": 10.0}.
+    Values are read as JSON, so lists like "ic_stochastic=[-1,-0.4]" work too.
+    """
+    values = {}
+    for item in items or ():
+        name, sep, text = item.partition("=")
+        if not sep:
+            raise ValueError(f"Expected NAME=VALUE, got '{item}'")
+        try:
+            values[name.strip()] = json.loads(text)
+        except json.JSONDecodeError:
+            raise ValueError(f"Could not parse the value of '{item}'") from None
+    return values
@@ -1,9 +1,11 @@
 import numpy as np
 from Models.FHN import FHN
 from simulation.path_calling import path_calling_fhn
+from simulation.config import load_settings
+from simulation.kernels import use_compiled, kernel_for, euler_fhn
 
 
-def deterministic(v0,w0):
+def deterministic(v0,w0, backend="python", dt=None, T=None):
     """
     Simulates the deterministic time evolution of the FitzHugh-Nagumo (FHN) model.
     
@@ -15,6 +17,10 @@ def deterministic(v0,w0):
     Args:
         v0 (float): Initial condition for the membrane potential (v).
         w0 (float): Initial condition for the recovery variable (w).
+        backend (str): "python" for the reference loop, "numba" for the compiled 
+            kernel in simulation.kernels (falls back to "python" without Numba).
+        dt (float): Timestep in ms (default: simulation.config.load_settings()).
+        T (float): Total simulated time in ms (default: simulation.config.load_settings()).
 
     Returns:
         tuple: (v, w, v_e, w_e, J_e)
@@ -25,25 +31,28 @@ def deterministic(v0,w0):
             - J_e (ndarray): The Jacobian matrix evaluated at the equilibrium point.
     """
     I_ext,a,b,tau =path_calling_fhn()
+    settings = load_settings()
+    dt = settings.dt if dt is None else dt
+    T = settings.T if T is None else T
 
-    dt = 0.01        # timestep
-    T = 1000           # total time
     steps = int(T/dt)
 
-    v = np.zeros(steps)
-    w = np.zeros(steps)
-    t = np.linspace(0, T, steps)
-
     neuron = FHN(a, b, tau, I_ext)
 
-    # Initial conditions
-    v[0] = v0
-    w[0] = w0
+    if use_compiled(backend):
+        v, w = kernel_for(euler_fhn, backend)(v0, w0, I_ext, a, b, tau, dt, steps)
+    else:
+        v = np.zeros(steps)
+        w = np.zeros(steps)
+
+        # Initial conditions
+        v[0] = v0
+        w[0] = w0
 
-    # Time evolution loop
-    for i in range(1, steps):
-        v[i] = v[i-1] + neuron.f(v[i-1], w[i-1])*dt
-        w[i] = w[i-1] + neuron.g(v[i-1], w[i-1])*dt
+        # Time evolution loop
+        for i in range(1, steps):
+            v[i] = v[i-1] + neuron.f(v[i-1], w[i-1])*dt
+            w[i] = w[i-1] + neuron.g(v[i-1], w[i-1])*dt
 
     #print("v values:",v)
     #print("w values:",w)
@@ -0,0 +1,153 @@
+import numpy as np
+from simulation.path_calling import path_calling_lif
+from simulation.config import load_settings
+from simulation.rng import make_rng
+
+
+def refractory_steps(t_ref, dt):
+    """
+    Number of timesteps clamped at V_r after a spike.
+
+    Counted with the same floating-point countdown as additive_noise_lif
+    (refractory_time_left -= dt while it is > 0), so both engines agree on
+    the length of the refractory period.
+    """
+    refractory_time_left = t_ref
+    k = 0
+    while refractory_time_left > 0:
+        refractory_time_left -= dt
+        k += 1
+    return k
+
+
+def lif_crossing_time(v0, V_inf, v_th, tau):
+    """
+    Time for the noiseless LIF, dv/dt = -(v - V_inf)/tau, to climb from v0 to v_th.
+
+    Returns:
+        float: Crossing time, or np.inf if v_th is never reached (V_inf <= v_th).
+    """
+    if V_inf <= v_th:
+        return np.inf
+    return tau*np.log((v0 - V_inf)/(v_th - V_inf))
+
+
+def _event_driven(v, V_r, V_inf, v_th, v_peak, decay, n_ref, steps):
+    # Deterministic LIF on the grid: v_n = V_inf + (V_r - V_inf) decay^n after each reset.
+    # Every inter-spike segment is the same, so it is computed once and tiled.
+    x0 = V_r - V_inf
+    if V_inf <= v_th:
+        v[:] = V_inf + x0*decay**np.arange(steps)
+        return []
+
+    # First grid index with V_inf + x0*decay^n >= v_th, from the analytic crossing
+    # time, then nudged by one step either way to absorb rounding.
+    n_cross = max(1, int(np.ceil(np.log((v_th - V_inf)/x0)/np.log(decay))))
+    while n_cross > 1 and V_inf + x0*decay**(n_cross - 1) >= v_th:
+        n_cross -= 1
+    while V_inf + x0*decay**n_cross < v_th:
+        n_cross += 1
+
+    segment = V_inf + x0*decay**np.arange(n_cross)
+    spike_times = []
+    i = 0
+    while i < steps - 1:
+        spike = i + n_cross
+        end = min(spike, steps)
+        v[i:end] = segment[:end - i]
+        if spike >= steps:
+            break
+        v[spike - 1] = v_peak
+        v[spike] = V_r
+        spike_times.append(spike)
+        i = spike + n_ref
+        v[spike:min(i + 1, steps)] = V_r
+    return spike_times
+
+
+def exact_lif(sigma, T=None, dt=None, v_th=None, v_peak=None, t_ref=None, params=None, rng=None, event_driven=None):
+    """
+    Simulates the noisy LIF model with its exact transition density instead of Euler steps.
+
+    Between spikes the LIF with additive noise,
+        dv = (1/tau)*(-(v - V_r) + R*I_ext) dt + sigma dW,
+    is an Ornstein-Uhlenbeck process with mean V_inf = V_r + R*I_ext, so over
+    one step
+        v(t+dt) = V_inf + (v(t) - V_inf)*exp(-dt/tau) + sigma*sqrt(tau/2*(1 - exp(-2dt/tau))) * N(0,1)
+    holds exactly. That recursion is a first-order linear filter, so a whole
+    block of steps is generated at once with scipy.signal.lfilter and then
+    scanned for the first threshold crossing. A refractory period is written
+    in one slice instead of being counted down step by step.
+
+    With sigma = 0 (or event_driven=True) no noise is drawn at all: the
+    crossing time follows analytically from the exponential relaxation
+    towards V_inf, and the trace is tiled from one inter-spike segment.
+
+    Args:
+        sigma (float): Noise intensity.
+        T (float): Total time in ms.
+        dt (float): Output grid spacing in ms.
+        v_th, v_peak, t_ref (float): Threshold, drawn spike peak, absolute refractory period.
+            Unset T, dt, v_th, v_peak and t_ref come from simulation.config.load_settings().
+        params (tuple): Optional (I_ext, R, V_r, tau) overriding config/lif_params.json.
+        rng (np.random.Generator or int): Random source or seed (simulation.rng).
+        event_driven (bool): Force/disable the analytic sigma = 0 mode (default: sigma == 0).
+
+    Returns:
+        tuple: (v, spike_times), as simulation.additive_noise_lif.
+    """
+    I_ext, R, V_r, tau = path_calling_lif() if params is None else params
+    settings = load_settings()
+    T = settings.T if T is None else T
+    dt = settings.dt if dt is None else dt
+    v_th = settings.v_th_lif if v_th is None else v_th
+    v_peak = settings.v_peak if v_peak is None else v_peak
+    t_ref = settings.t_ref if t_ref is None else t_ref
+    steps = int(T/dt)
+    rng = make_rng(rng)
+    if event_driven is None:
+        event_driven = sigma == 0
+
+    V_inf = V_r + R*I_ext
+    decay = np.exp(-dt/tau)
+    n_ref = refractory_steps(t_ref, dt)
+
+    v = np.zeros(steps)
+    v[0] = V_r
+
+    if event_driven:
+        return v, _event_driven(v, V_r, V_inf, v_th, v_peak, decay, n_ref, steps)
+
+    # scipy.signal is slow to import and only needed for the noisy case
+    from scipy.signal import lfilter
+
+    noise_std = sigma*np.sqrt(tau/2*(1 - decay**2))
+
+    # Generate roughly two deterministic ISIs per block; noise-driven (V_inf < v_th)
+    # firing gets a fixed block size.
+    t_cross = lif_crossing_time(V_r, V_inf, v_th, tau)
+    block = 8192 if np.isinf(t_cross) else int(np.clip(2*t_cross/dt, 256, 65536))
+
+    spike_times = []
+    i = 0  # v[i] is the last computed sample
+    while i < steps - 1:
+        n = min(block, steps - 1 - i)
+        # x_{k+1} = decay*x_k + noise_k with x = v - V_inf, started from v[i]
+        x, _ = lfilter([1.0], [1.0, -decay], noise_std*rng.normal(0, 1, n), zi=[decay*(v[i] - V_inf)])
+        segment = V_inf + x
+        hit = np.flatnonzero(segment >= v_th)
+        if len(hit) == 0:
+            v[i+1:i+1+n] = segment
+            i += n
+            continue
+
+        spike = i + 1 + int(hit[0])
+        v[i+1:spike] = segment[:hit[0]]
+        v[spike-1] = v_peak    # Draw peak
+        v[spike] = V_r         # Reset
+        spike_times.append(spike)
+        # Absolute refractory period: clamp at V_r in one jump
+        i = min(spike + n_ref, steps - 1)
+        v[spike+1:i+1] = V_r
+
+    return v, spike_times
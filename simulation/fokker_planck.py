@@ -0,0 +1,418 @@
+"""
+Fokker-Planck solver for the noisy FHN and LIF models: stationary density,
+firing rate and ISI density computed from the probability density itself,
+without trajectories.
+
+The density evolves as dp/dt = -div J, with the probability flux
+
+    FHN (2D)   J_v = f(v, w) p
+               J_w = g(v, w) p - (sigma^2/2) dp/dw             additive noise
+               J_w = (g - sigma^2 w/2) p - (sigma^2 w^2/2) dp/dw  multiplicative
+    LIF (1D)   J_v = mu(v) p - (sigma^2/2) dp/dv
+
+(the multiplicative FHN is integrated with Heun, i.e. in the Stratonovich
+sense, hence the extra sigma^2 w/2 drift). It is discretized with finite
+volumes on a uniform grid. Drift-diffusion fluxes (J_w of the FHN, the LIF)
+use the Scharfetter-Gummel exponential fitting, which is exact for constant
+drift and diffusion and keeps densities positive. The pure advection J_v of
+the FHN uses the upwind-biased kappa = 1/3 reconstruction of p at the cell
+faces; plain upwinding would smear the density with a numerical diffusion in
+v that biases the rate at small sigma. The result is a sparse generator
+matrix A acting on cell masses, dm/dt = A m, with columns summing to zero
+except where probability leaves the domain.
+
+Spikes:
+    FHN   upward flux across the line v = v_th, which is a grid line. The
+          firing rate is the stationary upward flux. The ISI density is the
+          first-passage density back to that flux when the upward transfer
+          across the line is made absorbing and the density starts where
+          stationary spikes cross it.
+    LIF   absorbing boundary at v = v_th. The outflux is re-injected at V_r
+          after the refractory period t_ref. The ISI density is t_ref plus
+          the first-passage density from V_r to v_th.
+
+The stationary density is one sparse solve (one row replaced by the
+normalization), the ISI mean and CV two more (the moments of the
+first-passage time), and the ISI density curve comes from implicit BDF2 time
+stepping on one sparse LU factorization.
+
+Usage:
+    python -m simulation.fokker_planck --ch 2 --sigma 0.05
+    python -m simulation.fokker_planck --ch 4 --sigma 1.0 --I-ext 0.5 --validate 1000
+"""
+import argparse
+import sys
+import numpy as np
+from scipy import sparse
+from scipy.sparse import linalg as sparse_linalg
+from Models.FHN import FHN
+from Models.LIF import LIF
+from simulation.config import load_settings
+from simulation.path_calling import path_calling_fhn, path_calling_lif
+
+# Default grids: FHN (cells along v, cells along w) and the box they cover
+# (large enough for the spike excursions up to sigma ~ 0.15); LIF cells
+FHN_CELLS = (240, 240)
+FHN_BOX = ((-2.6, 2.6), (-1.2, 2.0))
+LIF_CELLS = 1000
+
+# Time step (ms) of the ISI density and the survival probability at which it stops
+ISI_DT = 0.25
+ISI_TOL = 1e-4
+
+
+def _bernoulli(x):
+    # x/(e^x - 1), continued by 1 at x = 0
+    out = np.ones_like(x)
+    nz = x != 0
+    with np.errstate(over="ignore"):
+        out[nz] = x[nz]/np.expm1(x[nz])
+    return out
+
+
+def _flux_coefficients(a, D, h):
+    """
+    Scharfetter-Gummel flux J = up*p_left - down*p_right across interfaces
+    with drift a and diffusion D between cells h apart (upwind where D = 0).
+    """
+    a = np.asarray(a, dtype=np.float64)
+    D = np.broadcast_to(np.asarray(D, dtype=np.float64), a.shape)
+    up = np.maximum(a, 0.0)
+    down = np.maximum(-a, 0.0)
+    diffusive = D > 0
+    pe = a[diffusive]*h/D[diffusive]
+    up[diffusive] = D[diffusive]/h*_bernoulli(-pe)
+    down[diffusive] = D[diffusive]/h*_bernoulli(pe)
+    return up, down
+
+
+def _advection_flux(f, n_v, n_w, upwind=None):
+    """
+    Flux matrix of the advection along v: flux = F @ m across the v interfaces
+    (row i*n_w + j: between cells (i, j) and (i+1, j)), times the cell width.
+    The interface value is the kappa = 1/3 upwind-biased reconstruction
+    -p_{i-1}/6 + 5p_i/6 + p_{i+1}/3 (mirrored for f < 0), first-order
+    upwind where the stencil would leave the grid and on the faces marked in
+    upwind (a boolean array shaped like f).
+    """
+    i, j = np.meshgrid(np.arange(n_v - 1), np.arange(n_w), indexing="ij")
+    i, j, f = i.ravel(), j.ravel(), f.ravel()
+    plain = np.zeros(len(f), dtype=bool) if upwind is None else upwind.ravel()
+    row = i*n_w + j
+    rows, cols, vals = [], [], []
+    for forward in (True, False):
+        side = f > 0 if forward else f <= 0
+        source = i if forward else i + 1
+        step = 1 if forward else -1
+        inner = side & ~plain & ((i >= 1) if forward else (i <= n_v - 3))
+        edge = side & ~inner
+        for offset, coef in ((-step, -1/6), (0, 5/6), (step, 1/3)):
+            rows.append(row[inner])
+            cols.append((source[inner] + offset)*n_w + j[inner])
+            vals.append(coef*f[inner])
+        rows.append(row[edge])
+        cols.append(source[edge]*n_w + j[edge])
+        vals.append(f[edge])
+    rows, cols, vals = (np.concatenate(x) for x in (rows, cols, vals))
+    return sparse.csr_matrix((vals, (rows, cols)), shape=((n_v - 1)*n_w, n_v*n_w))
+
+
+def _transfers(left, right, up, down, h):
+    """COO entries of the mass transfers left <-> right across a set of interfaces."""
+    rows = np.concatenate([left, right, right, left])
+    cols = np.concatenate([left, left, right, right])
+    vals = np.concatenate([-up, up, -down, down])/h
+    return rows, cols, vals
+
+
+class FokkerPlanck:
+    """
+    The discretized Fokker-Planck operator of one noisy model.
+
+    Args:
+        ch (int): The simulation type (2: Additive FHN, 3: Multiplicative FHN, 4: LIF).
+        sigma (float): Noise intensity.
+        cells: (n_v, n_w) for the FHN, n_v for the LIF (default FHN_CELLS / LIF_CELLS).
+        box: FHN ((v_min, v_max), (w_min, w_max)) (default FHN_BOX); LIF v_min
+            (default well below V_r and the resting potential).
+        params (tuple): Optional model parameters, as for the batched integrators.
+        monitor_dt (float): LIF only: the time step of an integrator to match.
+            Threshold crossings are only checked at its steps, so the rate of
+            the continuous process is reached from below; shifting the
+            absorbing boundary up by 0.5826*sigma*sqrt(dt) (Broadie,
+            Glasserman & Kou 1997) reproduces the discretely monitored rate.
+
+    Attributes:
+        v, w (ndarray): Cell centres (w is None for the LIF).
+        rate (float): Stationary firing rate (spikes per ms), after stationary().
+    """
+
+    def __init__(self, ch, sigma, cells=None, box=None, params=None, monitor_dt=None):
+        if ch not in (2, 3, 4):
+            raise ValueError(f"The Fokker-Planck solver needs a noisy model (ch 2, 3 or 4), got ch={ch}")
+        settings = load_settings()
+        self.ch, self.sigma = ch, sigma
+        self._stationary = None
+        if ch == 4:
+            self._build_lif(sigma, cells or LIF_CELLS, box, params, settings, monitor_dt)
+        else:
+            self._build_fhn(ch, sigma, cells or FHN_CELLS, box or FHN_BOX, params, settings)
+
+    def _build_fhn(self, ch, sigma, cells, box, params, settings):
+        I_ext, a, b, tau = path_calling_fhn() if params is None else params
+        neuron = FHN(a, b, tau, I_ext)
+        self.v_th = settings.v_th_fhn
+        (v_min, v_max), (w_min, w_max) = box
+        n_v, n_w = cells
+        # Shift the v grid so that v_th falls on a cell edge
+        h_v = (v_max - v_min)/n_v
+        v_min = self.v_th - round((self.v_th - v_min)/h_v)*h_v
+        h_w = (w_max - w_min)/n_w
+        v_edges = v_min + h_v*np.arange(n_v + 1)
+        w_edges = w_min + h_w*np.arange(n_w + 1)
+        self.v = (v_edges[:-1] + v_edges[1:])/2
+        self.w = (w_edges[:-1] + w_edges[1:])/2
+        self.h = (h_v, h_w)
+        self.shape = (n_v, n_w)
+        index = np.arange(n_v*n_w).reshape(n_v, n_w)
+        v_e, w_e = neuron.get_equilibrium()
+        self._rest = index[np.abs(self.v - v_e).argmin(), np.abs(self.w - w_e).argmin()]
+
+        # v interfaces: pure advection by f, as a flux matrix; it moves mass
+        # from cell (i, j) to (i+1, j) (divergence matrix G)
+        V, W = np.meshgrid(v_edges[1:-1], self.w, indexing="ij")
+        f = neuron.f(V, W)
+        # Faces on v = v_th (edge k, between cells k-1 and k) are plain upwind, so
+        # that the spike flux only takes mass from below the threshold
+        k = int(round((self.v_th - v_min)/h_v))
+        threshold = np.zeros(f.shape, dtype=bool)
+        threshold[k - 1] = True
+        F = _advection_flux(f, n_v, n_w, upwind=threshold)
+        n_faces = (n_v - 1)*n_w
+        faces = np.arange(n_faces)
+        G = sparse.csr_matrix((np.concatenate([-np.ones(n_faces), np.ones(n_faces)])/h_v,
+                               (np.concatenate([index[:-1].ravel(), index[1:].ravel()]), np.tile(faces, 2))),
+                              shape=(n_v*n_w, n_faces))
+        # w interfaces: drift and diffusion of the noise on w
+        V, W = np.meshgrid(self.v, w_edges[1:-1], indexing="ij")
+        if ch == 2:
+            drift, D = neuron.g(V, W), sigma**2/2
+        else:
+            drift, D = neuron.g(V, W) - sigma**2*W/2, sigma**2*W*W/2
+        up_w, down_w = _flux_coefficients(drift, D, h_w)
+        rows, cols, vals = _transfers(index[:, :-1].ravel(), index[:, 1:].ravel(), up_w.ravel(), down_w.ravel(), h_w)
+        size = n_v*n_w
+        self.A = (G @ F + sparse.csr_matrix((vals, (rows, cols)), shape=(size, size))).tocsc()
+
+        # Upward fluxes across v = v_th
+        up = np.flatnonzero(f[k - 1] > 0)
+        self._up_flux = F[(k - 1)*n_w + up]/h_v   # one row per upward face: its mass flux
+        self._above = index[k, up]
+        self._spike = sparse.csr_matrix(
+            (np.ones(len(up)), (self._above, np.arange(len(up)))), shape=(size, len(up))) @ self._up_flux
+
+    def _build_lif(self, sigma, n_v, v_min, params, settings, monitor_dt):
+        I_ext, R, V_r, tau = path_calling_lif() if params is None else params
+        neuron = LIF(I_ext, R, V_r, tau)
+        self.v_th, self.t_ref = settings.v_th_lif, settings.t_ref
+        v_th = self.v_th if monitor_dt is None else self.v_th + 0.5826*sigma*np.sqrt(monitor_dt)
+        if v_min is None:
+            # Several stationary standard deviations below reset and rest
+            v_min = min(V_r, V_r + R*I_ext) - 8*sigma*np.sqrt(tau/2) - 1.0
+        h = (v_th - v_min)/n_v
+        edges = v_min + h*np.arange(n_v + 1)
+        self.v = (edges[:-1] + edges[1:])/2
+        self.w = None
+        self.h = (h,)
+        self.shape = (n_v,)
+        D = sigma**2/2
+        up, down = _flux_coefficients(neuron.leaky_integrate_and_fire_model(edges[1:-1]), D, h)
+        rows, cols, vals = _transfers(np.arange(n_v - 1), np.arange(1, n_v), up, down, h)
+        # Absorbing boundary: p = 0 at v_th, half a cell beyond the last centre
+        exit_up, _ = _flux_coefficients(np.array([neuron.leaky_integrate_and_fire_model(v_th)]), D, h/2)
+        self._exit = np.zeros(n_v)
+        self._exit[-1] = exit_up[0]/h
+        rows = np.append(rows, n_v - 1)
+        cols = np.append(cols, n_v - 1)
+        vals = np.append(vals, -self._exit[-1])
+        self.A = sparse.csc_matrix((vals, (rows, cols)), shape=(n_v, n_v))
+        self._reset = int(np.clip(np.searchsorted(edges, V_r, side="right") - 1, 0, n_v - 1))
+        self._rest = self._reset
+
+    def _solve_normalized(self, M):
+        # M has zero column sums, so one equation is redundant: replace it by
+        # m = 1 in the cell at rest (a dense sum(m) = 1 row would ruin the
+        # sparsity of the LU factors), then normalize
+        size = M.shape[0]
+        pin = sparse.csr_matrix(([1.0], ([0], [self._rest])), shape=(1, size))
+        M = sparse.vstack([M.tocsr()[:self._rest], pin, M.tocsr()[self._rest + 1:]]).tocsc()
+        rhs = np.zeros(size)
+        rhs[self._rest] = 1.0
+        m = sparse_linalg.splu(M).solve(rhs)
+        return m/m.sum()
+
+    def stationary(self):
+        """
+        The stationary state.
+
+        Returns:
+            dict: v, w (cell centres; w None for LIF), density (probability
+                density on the grid, shape (n_v, n_w) or (n_v,)), rate (spikes
+                per ms), rate_hz, mean_isi_ms (1/rate) and boundary_mass (mass
+                in the outermost cells: should be negligible, otherwise widen
+                the box).
+        """
+        if self._stationary is not None:
+            return self._stationary
+        if self.ch == 4:
+            # Re-inject the outflux at V_r; the refractory mass r*t_ref sits outside the grid
+            last = len(self.v) - 1
+            reinject = sparse.csc_matrix(([self._exit[-1]], ([self._reset], [last])), shape=self.A.shape)
+            m = self._solve_normalized(self.A + reinject)
+            rate = float(self._exit @ m)
+            scale = 1/(1 + rate*self.t_ref)
+            m, rate = m*scale, rate*scale
+            boundary = m[0]
+        else:
+            m = self._solve_normalized(self.A)
+            rate = float((self._up_flux @ m).sum())
+            grid = m.reshape(self.shape)
+            boundary = grid[0].sum() + grid[-1].sum() + grid[1:-1, 0].sum() + grid[1:-1, -1].sum()
+        self.rate = rate
+        self._mass = m
+        self._stationary = {
+            "v": self.v, "w": self.w,
+            # The kappa scheme is not strictly positive: clip its tiny undershoots
+            "density": np.maximum(m, 0.0).reshape(self.shape)/np.prod(self.h),
+            "rate": rate,
+            "rate_hz": rate*1000.0,
+            "mean_isi_ms": 1/rate if rate > 0 else float("inf"),
+            "boundary_mass": float(boundary),
+        }
+        return self._stationary
+
+    def _first_passage(self):
+        """Generator with absorbing spikes, the start distribution after a spike and the exit rates."""
+        if self.ch == 4:
+            m0 = np.zeros(len(self.v))
+            m0[self._reset] = 1.0
+            return self.A, m0, self._exit
+        self.stationary()
+        # Start where stationary spikes cross v_th, in proportion to their flux
+        arriving = np.maximum(self._up_flux @ self._mass, 0.0)
+        m0 = np.zeros(self.A.shape[0])
+        m0[self._above] = arriving/arriving.sum()
+        exit_rate = np.asarray(self._up_flux.sum(axis=0)).ravel()
+        return (self.A - self._spike).tocsc(), m0, exit_rate
+
+    def isi_moments(self):
+        """
+        Mean (ms) and CV of the ISI, from the moments of the first-passage
+        time: with B = -A_absorbing, E[T] = 1'B^-1 m0 and E[T^2] = 2*1'B^-2 m0.
+        """
+        A, m0, _ = self._first_passage()
+        lu = sparse_linalg.splu(-A)
+        x1 = lu.solve(m0)
+        x2 = lu.solve(x1)
+        mean, second = x1.sum(), 2*x2.sum()
+        if self.ch == 4:
+            # The refractory period shifts every ISI by t_ref
+            mean, second = mean + self.t_ref, second + 2*self.t_ref*x1.sum() + self.t_ref**2
+        return float(mean), float(np.sqrt(max(second - mean*mean, 0.0))/mean)
+
+    def isi_density(self, dt=ISI_DT, t_max=None, tol=ISI_TOL):
+        """
+        ISI density by BDF2 time stepping of the first-passage problem.
+
+        Args:
+            dt (float): Time step (ms).
+            t_max (float): Last ISI (ms); default: until the survival
+                probability falls below tol (at most 50 mean ISIs).
+            tol (float): Survival probability at which stepping stops.
+
+        Returns:
+            dict: t (ms), density (per ms, same length), mass (probability
+                covered by t, i.e. 1 - survival), mean_isi_ms and cv (from
+                isi_moments, not truncated).
+        """
+        A, m, exit_rate = self._first_passage()
+        mean, cv = self.isi_moments()
+        if t_max is None:
+            t_max = 50*mean
+        shift = self.t_ref if self.ch == 4 else 0.0
+        n_steps = int(np.ceil((t_max - shift)/dt))
+        eye = sparse.identity(A.shape[0], format="csc")
+        # The first step is backward Euler, every other one BDF2
+        first = sparse_linalg.splu((eye - dt*A).tocsc())
+        bdf2 = sparse_linalg.splu((1.5*eye - dt*A).tocsc())
+        density = [float(exit_rate @ m)]
+        previous, m = m, first.solve(m)
+        survival = m.sum()
+        density.append(float(exit_rate @ m))
+        for _ in range(1, n_steps):
+            if survival < tol:
+                break
+            previous, m = m, bdf2.solve(2*m - 0.5*previous)
+            survival = m.sum()
+            density.append(float(exit_rate @ np.maximum(m, 0.0)))
+        t = shift + dt*np.arange(len(density))
+        return {"t": t, "density": np.array(density), "mass": float(1 - survival),
+                "mean_isi_ms": mean, "cv": cv}
+
+
+def stationary_density(ch, sigma, cells=None, box=None, params=None, monitor_dt=None):
+    """Stationary density and firing rate of a noisy model (see FokkerPlanck.stationary)."""
+    return FokkerPlanck(ch, sigma, cells, box, params, monitor_dt).stationary()
+
+
+def isi_density(ch, sigma, dt=ISI_DT, t_max=None, cells=None, box=None, params=None, monitor_dt=None):
+    """ISI density of a noisy model (see FokkerPlanck.isi_density)."""
+    return FokkerPlanck(ch, sigma, cells, box, params, monitor_dt).isi_density(dt, t_max)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ch", type=int, required=True, choices=[2, 3, 4],
+                        help="2: Additive FHN, 3: Multiplicative FHN, 4: LIF")
+    parser.add_argument("--sigma", type=float, required=True)
+    parser.add_argument("--cells", type=int, nargs="+", default=None, help="grid cells (FHN: N_V N_W)")
+    parser.add_argument("--I-ext", dest="I_ext", type=float, default=None, help="override the input current")
+    parser.add_argument("--validate", type=int, default=0, metavar="N",
+                        help="also run an N-trial Monte Carlo ensemble and compare")
+    parser.add_argument("--monitor-dt", type=float, default=None,
+                        help="LIF: match the threshold checks of an integrator with this dt "
+                             "(default with --validate: the simulation dt)")
+    args = parser.parse_args(argv)
+
+    params = None
+    if args.I_ext is not None:
+        params = path_calling_lif() if args.ch == 4 else path_calling_fhn()
+        params = (args.I_ext, *params[1:])
+    cells = None if args.cells is None else (args.cells[0] if args.ch == 4 else tuple(args.cells))
+    settings = load_settings()
+    monitor_dt = args.monitor_dt
+    if monitor_dt is None and args.validate and args.ch == 4:
+        monitor_dt = settings.dt
+    solver = FokkerPlanck(args.ch, args.sigma, cells, params=params, monitor_dt=monitor_dt)
+    state = solver.stationary()
+    mean, cv = solver.isi_moments()
+    print(f"Firing rate        {state['rate_hz']:.4g} Hz   (boundary mass {state['boundary_mass']:.1e})")
+    print(f"Mean ISI           {mean:.4g} ms")
+    print(f"ISI CV             {cv:.4f}")
+
+    if args.validate:
+        from analysis.ensemble_stats import ensemble_stats
+        store = ensemble_stats().run_ensemble(args.ch, args.sigma, args.validate, params=params, seed=0,
+                                              verbose=False)
+        isi = np.concatenate([np.diff(store.trial(k)) for k in range(args.validate)])*settings.dt
+        counts = np.diff(np.asarray(store.offsets))
+        # ISIs longer than T never show up, so when they are common the
+        # ensemble's mean ISI and CV are biased low; its rate is not
+        print(f"Monte Carlo ({args.validate} trials of {settings.T:g} ms; ISI statistics only see ISIs < T):")
+        print(f"  rate {counts.mean()/settings.T*1000:.4g} Hz   mean ISI {isi.mean():.4g} ms   "
+              f"ISI CV {isi.std()/isi.mean():.4f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
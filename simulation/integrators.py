@@ -0,0 +1,248 @@
+"""
+Pluggable registry of single-trajectory FHN integrators.
+
+Fixed-step schemes (Euler, Euler-Maruyama, Heun/SRK, Milstein) sit beside
+adaptive ones. The adaptive schemes spend few steps near the stable fixed
+point and concentrate them on the fast spike upstroke:
+
+    rk45               adaptive Dormand-Prince ODE solver (deterministic FHN)
+    adaptive_milstein  adaptive SDE scheme with Brownian-bridge refinement
+
+Every integrator has the same call signature and returns a Trajectory, so
+analysis code can switch schemes by name:
+
+    traj = integrate("adaptive_milstein", -1.00125, -0.4, sigma=0.1, rtol=1e-2)
+"""
+from collections import namedtuple
+import numpy as np
+from simulation.path_calling import path_calling_fhn
+from simulation.config import load_settings
+from simulation.kernels import kernel_for, euler_fhn, euler_maruyama_fhn, heun_fhn, milstein_fhn
+from simulation.rng import make_rng
+
+# t, v, w   : time grid (ms) and states; the grid is non-uniform for adaptive schemes
+# spikes    : upward v_th crossing times in ms (linearly interpolated between steps)
+# n_steps   : accepted steps
+# n_rejected: rejected step attempts (0 for fixed-step schemes)
+Trajectory = namedtuple("Trajectory", ["t", "v", "w", "spikes", "n_steps", "n_rejected"])
+
+INTEGRATORS = {}
+
+
+def register(name, noise):
+    """
+    Decorator adding an integrator to the registry.
+
+    noise is the kind of sigma term the scheme handles: "none", "additive"
+    (sigma*dW on w) or "multiplicative" (sigma*w*dW on w).
+    """
+    def decorator(func):
+        func.noise = noise
+        INTEGRATORS[name] = func
+        return func
+    return decorator
+
+
+def get_integrator(name):
+    if name not in INTEGRATORS:
+        raise ValueError(f"Unknown integrator '{name}', expected one of {sorted(INTEGRATORS)}")
+    return INTEGRATORS[name]
+
+
+def integrate(name, v0, w0, sigma=0.0, T=None, dt=None, params=None, rng=None, v_th=None, **options):
+    """
+    Runs the integrator registered under name.
+
+    Args:
+        name (str): Registry key (see INTEGRATORS).
+        v0, w0 (float): Initial conditions.
+        sigma (float): Noise intensity.
+        T (float): Total time in ms (default: simulation.config.load_settings()).
+        dt (float): Fixed step, or initial step for adaptive schemes (default: as T).
+        params (tuple): Optional (I_ext, a, b, tau) overriding config/fhn_params.json.
+        rng (np.random.Generator or int): Random source or seed (simulation.rng).
+        v_th (float): Spike detection threshold (default: SimSettings.v_th_fhn).
+        **options: Scheme-specific options (rtol, atol, max_step, backend, ...).
+
+    Returns:
+        Trajectory
+    """
+    params = path_calling_fhn() if params is None else tuple(params)
+    settings = load_settings()
+    T = settings.T if T is None else T
+    dt = settings.dt if dt is None else dt
+    v_th = settings.v_th_fhn if v_th is None else v_th
+    rng = make_rng(rng)
+    return get_integrator(name)(v0, w0, sigma, T, dt, params, rng, v_th, **options)
+
+
+def spike_times(t, v, v_th=-0.55):
+    """
+    Upward threshold crossing times, linearly interpolated inside each step.
+    """
+    t = np.asarray(t)
+    v = np.asarray(v)
+    i = np.flatnonzero((v[:-1] < v_th) & (v[1:] >= v_th))
+    frac = (v_th - v[i]) / (v[i+1] - v[i])
+    return t[i] + frac*(t[i+1] - t[i])
+
+
+def _fixed_step(kernel, v0, w0, sigma, T, dt, params, rng, v_th, backend, noisy=True):
+    I_ext, a, b, tau = params
+    steps = int(T/dt)
+    if noisy:
+        z = rng.normal(0, 1, steps - 1)
+        v, w = kernel_for(kernel, backend)(v0, w0, I_ext, a, b, tau, sigma, dt, z)
+    else:
+        v, w = kernel_for(kernel, backend)(v0, w0, I_ext, a, b, tau, dt, steps)
+    t = np.arange(steps)*dt
+    return Trajectory(t, v, w, spike_times(t, v, v_th), steps - 1, 0)
+
+
+@register("euler", noise="none")
+def euler(v0, w0, sigma, T, dt, params, rng, v_th, backend="python"):
+    return _fixed_step(euler_fhn, v0, w0, sigma, T, dt, params, rng, v_th, backend, noisy=False)
+
+
+@register("euler_maruyama", noise="additive")
+def euler_maruyama(v0, w0, sigma, T, dt, params, rng, v_th, backend="python"):
+    return _fixed_step(euler_maruyama_fhn, v0, w0, sigma, T, dt, params, rng, v_th, backend)
+
+
+@register("heun", noise="multiplicative")
+def heun(v0, w0, sigma, T, dt, params, rng, v_th, backend="python"):
+    return _fixed_step(heun_fhn, v0, w0, sigma, T, dt, params, rng, v_th, backend)
+
+
+@register("milstein", noise="multiplicative")
+def milstein(v0, w0, sigma, T, dt, params, rng, v_th, backend="python"):
+    """
+    Strong order 1.0 Milstein scheme for dw = g dt + sigma*w dW
+    (Stratonovich, like the Heun scheme).
+    """
+    return _fixed_step(milstein_fhn, v0, w0, sigma, T, dt, params, rng, v_th, backend)
+
+
+@register("rk45", noise="none")
+def rk45(v0, w0, sigma, T, dt, params, rng, v_th, rtol=1e-6, atol=1e-9, max_step=np.inf):
+    """
+    Adaptive explicit Runge-Kutta 4(5) (Dormand-Prince) for the deterministic
+    FHN. Spike times come from event location, not from the output grid.
+    """
+    # scipy.integrate is only needed here, so it is not imported at module load
+    from scipy.integrate import solve_ivp
+    I_ext, a, b, tau = params
+
+    def rhs(t, y):
+        v, w = y
+        return [v - (v*v*v/3) - w + I_ext, (1/tau)*(v + a - (b*w))]
+
+    def crossing(t, y):
+        return y[0] - v_th
+    crossing.direction = 1
+
+    sol = solve_ivp(rhs, (0, T), [v0, w0], method="RK45", rtol=rtol, atol=atol,
+                    first_step=dt, max_step=max_step, events=crossing)
+    # solve_ivp does not report rejections, but every Dormand-Prince attempt
+    # costs 6 new evaluations (FSAL) after the initial one
+    n_steps = len(sol.t) - 1
+    n_rejected = max(0, (sol.nfev - 1)//6 - n_steps)
+    return Trajectory(sol.t, sol.y[0], sol.y[1], sol.t_events[0], n_steps, n_rejected)
+
+
+class _BrownianPath:
+    """
+    Wiener increments for an adaptive scheme whose steps may be rejected.
+
+    Increments that have been drawn but not yet used (because a step was
+    rejected, or a smaller step consumed only part of an interval) are kept on
+    a stack of (h, dW) pieces. A piece that is longer than the requested step
+    is split with the Brownian bridge
+        dW_1 ~ N(dW * h/H, h*(H-h)/H),   dW_2 = dW - dW_1
+    so the sampled path stays the same no matter how it is subdivided.
+    """
+
+    def __init__(self, rng, block=4096):
+        self.rng = rng
+        self.block = block
+        self.normals = []
+        self.future = []
+
+    def _normal(self):
+        if not self.normals:
+            self.normals = self.rng.normal(0, 1, self.block).tolist()
+        return self.normals.pop()
+
+    def take(self, h):
+        """Returns (h, dW) for the next step; h may shrink to match a stored piece."""
+        if not self.future:
+            return h, np.sqrt(h)*self._normal()
+        H, dW = self.future.pop()
+        if h >= H:
+            return H, dW
+        dW_1 = dW*h/H + np.sqrt(h*(H - h)/H)*self._normal()
+        self.future.append((H - h, dW - dW_1))
+        return h, dW_1
+
+    def give_back(self, h, dW):
+        """Returns a rejected increment to the front of the path."""
+        self.future.append((h, dW))
+
+
+@register("adaptive_milstein", noise="multiplicative")
+def adaptive_milstein(v0, w0, sigma, T, dt, params, rng, v_th, rtol=1e-2, atol=1e-4,
+                      max_step=0.5, min_step=1e-6, noise="multiplicative"):
+    """
+    Adaptive-timestep SDE scheme with Brownian-bridge refinement.
+
+    Each attempt compares an Euler(-Maruyama) step with a Heun-drift /
+    Milstein-diffusion step (Stratonovich) over the same Wiener increment; their
+    difference is the local error estimate. Rejected attempts hand their
+    increment back to the Brownian path, which is then bisected with the
+    Brownian bridge, so rejections never bias the noise.
+
+    noise selects the diffusion on w: "multiplicative" (sigma*w) or "additive" (sigma).
+    """
+    I_ext, a, b, tau = params
+    multiplicative = noise == "multiplicative"
+    path = _BrownianPath(rng)
+
+    t, v, w = 0.0, float(v0), float(w0)
+    ts, vs, ws = [t], [v], [w]
+    h = dt
+    n_rejected = 0
+    while t < T:
+        h, dW = path.take(min(h, max_step, T - t))
+
+        f0 = v - (v*v*v/3) - w + I_ext
+        g0 = (1/tau)*(v + a - (b*w))
+        diff = sigma*w if multiplicative else sigma
+        # Stratonovich correction (1/2) b b' dW^2, with b' = sigma for sigma*w noise
+        correction = (1/2)*sigma*diff*dW*dW if multiplicative else 0.0
+
+        v_low = v + f0*h
+        w_low = w + g0*h + diff*dW
+        f1 = v_low - (v_low*v_low*v_low/3) - w_low + I_ext
+        g1 = (1/tau)*(v_low + a - (b*w_low))
+        v_high = v + (1/2)*(f0 + f1)*h
+        w_high = w + (1/2)*(g0 + g1)*h + diff*dW + correction
+
+        err = max(abs(v_high - v_low)/(atol + rtol*abs(v_high)),
+                  abs(w_high - w_low)/(atol + rtol*abs(w_high)))
+
+        if err <= 1 or h <= min_step:
+            t += h
+            v, w = v_high, w_high
+            ts.append(t)
+            vs.append(v)
+            ws.append(w)
+        else:
+            path.give_back(h, dW)
+            n_rejected += 1
+
+        # Local error of the pair scales like h^(1/2) or better; grow/shrink gently
+        factor = 0.9*err**-0.5 if err > 0 else 2.0
+        h = max(min_step, h*min(2.0, max(0.2, factor)))
+
+    ts, vs, ws = np.array(ts), np.array(vs), np.array(ws)
+    return Trajectory(ts, vs, ws, spike_times(ts, vs, v_th), len(ts) - 1, n_rejected)
@@ -0,0 +1,318 @@
+import importlib.util
+import warnings
+import numpy as np
+
+# Numba is an optional dependency, and an expensive import. The kernels below
+# are plain Python functions wrapped in _Deferred; Numba is only imported, and
+# the kernels only compiled, the first time the numba backend is requested.
+# Without Numba the simulators fall back to their original loops.
+NUMBA_AVAILABLE = importlib.util.find_spec("numba") is not None
+
+BACKENDS = ("python", "numba")
+
+_DEFERRED = []
+
+
+class _Deferred:
+    """
+    A kernel whose Numba compilation is deferred until it is first needed.
+
+    Like a Numba dispatcher it has a py_func attribute with the plain-Python
+    body. Calling it runs that body, so the pure-Python path never imports
+    Numba; compiled() (or kernel_for(func, "numba")) returns the dispatcher.
+    """
+
+    def __init__(self, func, options):
+        self.py_func = func
+        self.options = options
+        self.__name__ = func.__name__
+        self.__doc__ = func.__doc__
+        _DEFERRED.append(self)
+
+    def compiled(self):
+        if not NUMBA_AVAILABLE:
+            return self.py_func
+        _compile_all()
+        return globals()[self.__name__]
+
+    def __call__(self, *args):
+        return self.py_func(*args)
+
+
+def njit(*args, **kwargs):
+    """
+    Drop-in for numba.njit that defers compilation (see _Deferred).
+    """
+    if len(args) == 1 and callable(args[0]):
+        return _Deferred(args[0], kwargs)
+    return lambda func: _Deferred(func, kwargs)
+
+
+def _compile_all():
+    # Swap every deferred kernel in the module namespace for its Numba
+    # dispatcher, so kernels calling each other (euler_fhn -> _fhn_f) resolve
+    # to compiled code. Dispatchers still compile per signature on first call.
+    namespace = globals()
+    if not any(namespace[k.__name__] is k for k in _DEFERRED):
+        return
+    import numba
+    for kernel in _DEFERRED:
+        if namespace[kernel.__name__] is kernel:
+            namespace[kernel.__name__] = numba.njit(**kernel.options)(kernel.py_func)
+
+
+def use_compiled(backend):
+    """
+    Resolves the per-call backend choice.
+
+    Returns True when the compiled kernels should be used. Asking for the
+    numba backend without Numba installed falls back to the pure-Python path
+    with a warning instead of failing.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend '{backend}', expected one of {BACKENDS}")
+    if backend == "numba" and not NUMBA_AVAILABLE:
+        warnings.warn("Numba is not installed; using the pure-Python integrator.", RuntimeWarning, stacklevel=3)
+        return False
+    return backend == "numba"
+
+
+def kernel_for(func, backend):
+    """
+    The compiled kernel, or its plain-Python body when the numba backend is
+    not requested (or not available).
+    """
+    if use_compiled(backend):
+        return func.compiled() if isinstance(func, _Deferred) else func
+    return getattr(func, "py_func", func)
+
+
+# The drift terms are written out exactly as in Models.FHN.f / FHN.g and
+# Models.LIF.leaky_integrate_and_fire_model so the kernels follow the same
+# arithmetic as the object-oriented path.
+
+@njit(cache=True)
+def _fhn_f(vt, wt, I_ext):
+    return vt - (vt*vt*vt/3) - wt + I_ext
+
+
+@njit(cache=True)
+def _fhn_g(vt, wt, a, b, tau):
+    return (1/tau)*(vt + a - (b*wt))
+
+
+@njit(cache=True)
+def euler_fhn(v0, w0, I_ext, a, b, tau, dt, steps):
+    """
+    Deterministic FHN trajectory with the explicit Euler method.
+    """
+    v = np.zeros(steps)
+    w = np.zeros(steps)
+    v[0] = v0
+    w[0] = w0
+    for i in range(1, steps):
+        v[i] = v[i-1] + _fhn_f(v[i-1], w[i-1], I_ext)*dt
+        w[i] = w[i-1] + _fhn_g(v[i-1], w[i-1], a, b, tau)*dt
+    return v, w
+
+
+@njit(cache=True)
+def euler_maruyama_fhn(v0, w0, I_ext, a, b, tau, sigma, dt, z):
+    """
+    Additive-noise FHN trajectory with the Euler-Maruyama method.
+
+    z holds the steps-1 standard normal draws, one per timestep.
+    """
+    steps = len(z) + 1
+    v = np.zeros(steps)
+    w = np.zeros(steps)
+    v[0] = v0
+    w[0] = w0
+    sqrt_dt = np.sqrt(dt)
+    for i in range(1, steps):
+        noise = sigma * z[i-1] * sqrt_dt
+        v[i] = v[i-1] + _fhn_f(v[i-1], w[i-1], I_ext)*dt
+        w[i] = w[i-1] + _fhn_g(v[i-1], w[i-1], a, b, tau)*dt + noise
+    return v, w
+
+
+@njit(cache=True)
+def heun_fhn(v0, w0, I_ext, a, b, tau, sigma, dt, z):
+    """
+    Multiplicative-noise (sigma*w*dW) FHN trajectory with the stochastic
+    Heun (SRK2) predictor-corrector scheme.
+
+    z holds the steps-1 standard normal draws, one per timestep.
+    """
+    steps = len(z) + 1
+    v = np.zeros(steps)
+    w = np.zeros(steps)
+    v[0] = v0
+    w[0] = w0
+    sqrt_dt = np.sqrt(dt)
+    for i in range(1, steps):
+        delta_B = sqrt_dt * z[i-1]
+        f0 = _fhn_f(v[i-1], w[i-1], I_ext)
+        g0 = _fhn_g(v[i-1], w[i-1], a, b, tau)
+        v_predictor = v[i-1] + f0*dt
+        w_predictor = w[i-1] + g0*dt + (sigma*delta_B*w[i-1])
+        v[i] = v[i-1] + (1/2)*(f0 + _fhn_f(v_predictor, w_predictor, I_ext))*dt
+        w[i] = w[i-1] + (1/2)*(g0 + _fhn_g(v_predictor, w_predictor, a, b, tau))*dt + (1/2)*sigma*(w[i-1]+w_predictor)*delta_B
+    return v, w
+
+
+@njit(cache=True)
+def milstein_fhn(v0, w0, I_ext, a, b, tau, sigma, dt, z):
+    """
+    Multiplicative-noise (sigma*w*dW) FHN trajectory with the strong
+    order 1.0 Milstein scheme.
+
+    The correction term is taken in the Stratonovich sense,
+        w += g dt + sigma w dW + (1/2) sigma^2 w dW^2,
+    so that it converges to the same solution as the Heun scheme.
+
+    z holds the steps-1 standard normal draws, one per timestep.
+    """
+    steps = len(z) + 1
+    v = np.zeros(steps)
+    w = np.zeros(steps)
+    v[0] = v0
+    w[0] = w0
+    sqrt_dt = np.sqrt(dt)
+    for i in range(1, steps):
+        dW = sqrt_dt * z[i-1]
+        v[i] = v[i-1] + _fhn_f(v[i-1], w[i-1], I_ext)*dt
+        w[i] = w[i-1] + _fhn_g(v[i-1], w[i-1], a, b, tau)*dt + sigma*w[i-1]*dW + (1/2)*sigma*sigma*w[i-1]*dW*dW
+    return v, w
+
+
+@njit(cache=True)
+def lif_threshold_reset(I_ext, R, V_r, tau, sigma, v_th, v_peak, t_ref, dt, z):
+    """
+    Noisy LIF trajectory with threshold, reset and absolute refractory period.
+
+    z holds one normal draw per timestep; draws of refractory steps are
+    unused, as in simulation.additive_noise_lif and the batched LIF.
+
+    Returns:
+        tuple: (v, spike_times) where spike_times is an int64 array of timesteps.
+    """
+    steps = len(z) + 1
+    v = np.zeros(steps)
+    v[0] = V_r
+    spikes = np.zeros(steps, dtype=np.int64)
+    n_spikes = 0
+    sqrt_dt = np.sqrt(dt)
+    refractory_time_left = 0.0
+    for i in range(1, steps):
+        if refractory_time_left > 0:
+            v[i] = V_r
+            refractory_time_left -= dt
+            continue
+        noise = sigma * z[i-1] * sqrt_dt
+        v[i] = v[i-1] + ((1/tau)*(-(v[i-1] - V_r) + (R*I_ext)))*dt + noise
+        if v[i] >= v_th:
+            v[i-1] = v_peak
+            v[i] = V_r
+            spikes[n_spikes] = i
+            n_spikes += 1
+            refractory_time_left = t_ref
+    return v, spikes[:n_spikes]
+
+
+# Chunked kernels used by simulation.streaming. They advance the state over one
+# block of draws, record threshold crossings and an optional decimated trace,
+# and hand the final state back so the next block can continue from it.
+
+EULER, EULER_MARUYAMA, HEUN = 0, 1, 2
+
+
+@njit(cache=True)
+def _fhn_step(scheme, v, w, I_ext, a, b, tau, sigma, dt, sqrt_dt, z):
+    f0 = _fhn_f(v, w, I_ext)
+    g0 = _fhn_g(v, w, a, b, tau)
+    if scheme == EULER:
+        return v + f0*dt, w + g0*dt
+    if scheme == EULER_MARUYAMA:
+        return v + f0*dt, w + g0*dt + sigma * z * sqrt_dt
+    delta_B = sqrt_dt * z
+    v_predictor = v + f0*dt
+    w_predictor = w + g0*dt + (sigma*delta_B*w)
+    v_new = v + (1/2)*(f0 + _fhn_f(v_predictor, w_predictor, I_ext))*dt
+    w_new = w + (1/2)*(g0 + _fhn_g(v_predictor, w_predictor, a, b, tau))*dt + (1/2)*sigma*(w+w_predictor)*delta_B
+    return v_new, w_new
+
+
+@njit(cache=True)
+def _n_kept(start, n, decimate):
+    # Number of global step indices in [start, start+n) divisible by decimate
+    if decimate <= 0:
+        return 0
+    first = ((start + decimate - 1) // decimate) * decimate
+    if first > start + n - 1:
+        return 0
+    return (start + n - 1 - first) // decimate + 1
+
+
+@njit(cache=True)
+def fhn_chunk(scheme, v, w, I_ext, a, b, tau, sigma, dt, v_th, z, start, decimate):
+    """
+    Advances one FHN trajectory over len(z) steps, starting at global step `start`.
+
+    Returns:
+        tuple: (v, w, spikes, v_trace, w_trace) with the final state, the global
+            step indices of upward v_th crossings, and v/w at every step index
+            divisible by decimate (empty when decimate is 0).
+    """
+    n = len(z)
+    sqrt_dt = np.sqrt(dt)
+    spikes = np.empty(n, dtype=np.int64)
+    n_spikes = 0
+    v_trace = np.empty(_n_kept(start, n, decimate))
+    w_trace = np.empty(len(v_trace))
+    k = 0
+    for j in range(n):
+        v_new, w = _fhn_step(scheme, v, w, I_ext, a, b, tau, sigma, dt, sqrt_dt, z[j])
+        if v < v_th and v_new >= v_th:
+            spikes[n_spikes] = start + j
+            n_spikes += 1
+        v = v_new
+        if decimate > 0 and (start + j) % decimate == 0:
+            v_trace[k] = v
+            w_trace[k] = w
+            k += 1
+    return v, w, spikes[:n_spikes], v_trace, w_trace
+
+
+@njit(cache=True)
+def lif_chunk(v, refractory_time_left, I_ext, R, V_r, tau, sigma, v_th, t_ref, dt, z, start, decimate):
+    """
+    Advances one noisy LIF trajectory over len(z) steps, starting at global step `start`.
+
+    One draw of z is reserved per step; it is simply unused while the neuron
+    is refractory.
+
+    Returns:
+        tuple: (v, refractory_time_left, spikes, v_trace)
+    """
+    n = len(z)
+    sqrt_dt = np.sqrt(dt)
+    spikes = np.empty(n, dtype=np.int64)
+    n_spikes = 0
+    v_trace = np.empty(_n_kept(start, n, decimate))
+    k = 0
+    for j in range(n):
+        if refractory_time_left > 0:
+            v = V_r
+            refractory_time_left -= dt
+        else:
+            v = v + ((1/tau)*(-(v - V_r) + (R*I_ext)))*dt + sigma * z[j] * sqrt_dt
+            if v >= v_th:
+                v = V_r
+                spikes[n_spikes] = start + j
+                n_spikes += 1
+                refractory_time_left = t_ref
+        if decimate > 0 and (start + j) % decimate == 0:
+            v_trace[k] = v
+            k += 1
+    return v, refractory_time_left, spikes[:n_spikes], v_trace
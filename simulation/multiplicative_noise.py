@@ -1,8 +1,11 @@
 import numpy as np
 from Models.FHN import FHN
 from simulation.path_calling import path_calling_fhn
+from simulation.config import load_settings
+from simulation.kernels import use_compiled, kernel_for, heun_fhn
+from simulation.rng import make_rng
 
-def multiplicative_noise(v0,w0, sigma):
+def multiplicative_noise(v0,w0, sigma, backend="python", dt=None, T=None, rng=None):
     """
     Simulates the FitzHugh-Nagumo (FHN) model with multiplicative stochastic noise 
     using a Second-Order Stochastic Runge-Kutta (Heun) method.
@@ -14,32 +17,44 @@ def multiplicative_noise(v0,w0, sigma):
     Args:
         v0 (float): Initial condition for membrane potential.
         w0 (float): Initial condition for recovery variable.
+        sigma (float): Noise intensity.
+        backend (str): "python" for the reference loop, "numba" for the compiled 
+            kernel in simulation.kernels (falls back to "python" without Numba).
+        dt (float): Timestep in ms (default: simulation.config.load_settings()).
+        T (float): Total simulated time in ms (default: simulation.config.load_settings()).
+        rng (np.random.Generator or int): Random source or seed (simulation.rng).
         
     Returns:
         tuple: (v, w, v_e, w_e, J_e) arrays of states, equilibrium points, and Jacobian.
     """
     I_ext,a,b,tau = path_calling_fhn()
-    dt = 0.01        # timestep
-    T = 1000           # total time
+    settings = load_settings()
+    dt = settings.dt if dt is None else dt
+    T = settings.T if T is None else T
     steps = int(T/dt)
 
-    v = np.zeros(steps)
-    w = np.zeros(steps)
-    t = np.linspace(0, T, steps)
-
     neuron = FHN(a, b, tau, I_ext)
 
-    # Initial conditions
-    v[0] = v0
-    w[0] = w0
-
-    # Time evolution loop
-    for i in range(1, steps):
-        delta_B = np.sqrt(dt) * np.random.normal(0, 1)
-        v_predictor = v[i-1] + neuron.f(v[i-1], w[i-1])*dt
-        w_predictor = w[i-1] + neuron.g(v[i-1], w[i-1]) * dt + (sigma*delta_B*w[i-1])
-        v[i] = v[i-1] + (1/2)*((neuron.f(v[i-1], w[i-1])) + (neuron.f(v_predictor, w_predictor)))*dt
-        w[i] = w[i-1] +(1/2)*((neuron.g(v[i-1], w[i-1])) + (neuron.g(v_predictor, w_predictor)))*dt + (1/2)*sigma*(w[i-1]+w_predictor)*delta_B
+    # One standard normal draw per timestep, drawn as a single block
+    z = make_rng(rng).normal(0, 1, steps - 1)
+
+    if use_compiled(backend):
+        v, w = kernel_for(heun_fhn, backend)(v0, w0, I_ext, a, b, tau, sigma, dt, z)
+    else:
+        v = np.zeros(steps)
+        w = np.zeros(steps)
+
+        # Initial conditions
+        v[0] = v0
+        w[0] = w0
+
+        # Time evolution loop
+        for i in range(1, steps):
+            delta_B = np.sqrt(dt) * z[i-1]
+            v_predictor = v[i-1] + neuron.f(v[i-1], w[i-1])*dt
+            w_predictor = w[i-1] + neuron.g(v[i-1], w[i-1]) * dt + (sigma*delta_B*w[i-1])
+            v[i] = v[i-1] + (1/2)*((neuron.f(v[i-1], w[i-1])) + (neuron.f(v_predictor, w_predictor)))*dt
+            w[i] = w[i-1] +(1/2)*((neuron.g(v[i-1], w[i-1])) + (neuron.g(v_predictor, w_predictor)))*dt + (1/2)*sigma*(w[i-1]+w_predictor)*delta_B
 
     #print("v values:",v)
     #print("w values:",w)
@@ -0,0 +1,279 @@
+"""
+Networks of coupled FHN or LIF units with sparse connectivity.
+
+The state of a population of n units is held as contiguous (n,) vectors, and
+the coupling enters every unit's voltage equation as an extra input current,
+next to I_ext:
+
+    electrical (gap junctions)   I_gap_i = sum_j gap[i, j] (v_j - v_i)
+    chemical synapses            I_syn_i = (E_syn - v_i) sum_j syn[i, j] s_j
+
+gap and syn are scipy.sparse CSR matrices (row i = postsynaptic unit), so one
+step costs one sparse matrix-vector product per coupling type: the work grows
+with the number of synapses, never with n^2. s_j is the synaptic gating
+variable of unit j: it decays with time constant tau_syn and jumps by one at
+every spike of j.
+
+Noise is per unit, as in the single-neuron models: additive or multiplicative
+on the FHN recovery variable w, additive on the LIF voltage. Spikes are
+recorded as a population raster in an analysis.spike_store.SpikeStore with
+one row per unit (store.trial(i) are the spike steps of unit i).
+"""
+import numpy as np
+from scipy import sparse
+from Models.FHN import FHN
+from Models.LIF import LIF
+from simulation.path_calling import path_calling_fhn
+from simulation.path_calling import path_calling_lif
+from simulation.config import load_settings
+from simulation.batched import _chunk_steps
+from simulation.rng import make_rng
+
+
+def random_coupling(n, k, weight=1.0, symmetric=False, rng=None):
+    """
+    Sparse random connectivity in which every unit receives k inputs.
+
+    Presynaptic partners are drawn uniformly among the other n - 1 units
+    (no self-coupling), with replacement; a repeated draw collapses into a
+    single synapse, so for k << n the in-degree is k up to rare duplicates.
+    Building the matrix costs O(n k).
+
+    Args:
+        n (int): Number of units.
+        k (int): Inputs per unit.
+        weight (float): Value of every synapse.
+        symmetric (bool): Make the matrix symmetric (gap junctions couple both ways).
+        rng (np.random.Generator or int): Random source or seed (simulation.rng).
+
+    Returns:
+        scipy.sparse.csr_matrix: (n, n) connectivity, row i = inputs of unit i.
+    """
+    if n < 2 or k < 1:
+        return sparse.csr_matrix((n, n))
+    rng = make_rng(rng)
+    rows = np.repeat(np.arange(n), k)
+    cols = rng.integers(0, n - 1, size=n*k)
+    # Skip the diagonal: draws at or above the own index move up by one
+    cols = cols + (cols >= rows)
+    W = sparse.csr_matrix((np.ones(n*k), (rows, cols)), shape=(n, n))
+    if symmetric:
+        W = W.maximum(W.T).tocsr()
+    # Duplicate draws were summed; every synapse gets the same weight
+    W.data[:] = weight
+    return W
+
+
+def _as_csr(W, n, name):
+    if W is None:
+        return None
+    W = sparse.csr_matrix(W, dtype=np.float64)
+    if W.shape != (n, n):
+        raise ValueError(f"{name} must be ({n}, {n}), got {W.shape}")
+    return W
+
+
+class _Coupling:
+    """
+    Coupling current of the network, evaluated with one sparse product per
+    coupling type. The synaptic drive syn @ s is computed once per step, since
+    s only changes at spikes.
+    """
+
+    def __init__(self, n, gap, syn, E_syn, tau_syn, dt):
+        self.gap = _as_csr(gap, n, "gap")
+        self.syn = _as_csr(syn, n, "syn")
+        self.gap_degree = None if self.gap is None else np.asarray(self.gap.sum(axis=1)).ravel()
+        self.E_syn = E_syn
+        self.decay = np.exp(-dt/tau_syn)
+        self.s = np.zeros(n)
+        self.drive = np.zeros(n)
+
+    @property
+    def n_synapses(self):
+        return sum(W.nnz for W in (self.gap, self.syn) if W is not None)
+
+    def begin_step(self):
+        if self.syn is not None:
+            self.drive = self.syn @ self.s
+
+    def current(self, v):
+        I = np.zeros_like(v)
+        if self.gap is not None:
+            I += self.gap @ v - self.gap_degree*v
+        if self.syn is not None:
+            I += (self.E_syn - v)*self.drive
+        return I
+
+    def end_step(self, spiked):
+        if self.syn is not None:
+            self.s *= self.decay
+            self.s[spiked] += 1.0
+
+
+def _raster(unit_idx, step_idx, n, meta):
+    from analysis.spike_store import SpikeStore
+
+    if unit_idx:
+        unit_idx = np.concatenate(unit_idx)
+        step_idx = np.concatenate(step_idx).astype(np.int64)
+    else:
+        unit_idx = np.array([], dtype=np.int64)
+        step_idx = np.array([], dtype=np.int64)
+    # Chunks arrive in time order, so a stable sort on the unit keeps steps ascending
+    order = np.argsort(unit_idx, kind='stable')
+    offsets = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(unit_idx, minlength=n), out=offsets[1:])
+    return SpikeStore(step_idx[order], offsets, meta)
+
+
+def network_fhn(ch, sigma, n, gap=None, syn=None, E_syn=2.0, tau_syn=5.0, v0=None, w0=None,
+                v_th=None, dt=None, T=None, chunk_size=None, params=None, rng=None):
+    """
+    Simulates n coupled FHN units.
+
+    Args:
+        ch (int): Noise of every unit (1: none / Euler, 2: additive / Euler-Maruyama,
+            3: multiplicative / Heun), as in the single-neuron simulation types.
+        sigma (float): Noise intensity (ignored for ch 1).
+        n (int): Number of units.
+        gap (sparse matrix): Optional (n, n) gap-junction conductances, usually symmetric.
+        syn (sparse matrix): Optional (n, n) chemical conductances, syn[i, j] from j onto i.
+        E_syn (float): Synaptic reversal potential (2.0 is excitatory for FHN units).
+        tau_syn (float): Decay time of the synaptic gating variable.
+        v0, w0 (float or ndarray): Initial state, shared or per unit (default: the
+            initial conditions of simulation.config.load_settings()).
+        v_th, dt, T: Spike threshold and time grid (default: load_settings()).
+        chunk_size (int): Timesteps per noise block (default keeps the block near 32 MB).
+        params (tuple): Optional (I_ext, a, b, tau) overriding config/fhn_params.json;
+            any entry may be an (n,) array for a heterogeneous population.
+        rng (np.random.Generator or int): Random source or seed (simulation.rng).
+
+    Returns:
+        SpikeStore: One row of spike steps per unit, with the run description as metadata.
+    """
+    if ch not in (1, 2, 3):
+        raise ValueError(f"ch must be 1, 2 or 3 for an FHN network, got {ch!r}")
+    settings = load_settings()
+    dt = settings.dt if dt is None else dt
+    T = settings.T if T is None else T
+    v_th = settings.v_th_fhn if v_th is None else v_th
+    ic_v, ic_w = settings.initial_conditions(ch)
+    I_ext, a, b, tau = path_calling_fhn() if params is None else params
+    steps = int(T/dt)
+    chunk_size = _chunk_steps(n, chunk_size)
+    rng = make_rng(rng)
+
+    neuron = FHN(a, b, tau, I_ext)
+    coupling = _Coupling(n, gap, syn, E_syn, tau_syn, dt)
+
+    v = np.array(np.broadcast_to(ic_v if v0 is None else v0, n), dtype=np.float64)
+    w = np.array(np.broadcast_to(ic_w if w0 is None else w0, n), dtype=np.float64)
+
+    unit_idx, step_idx = [], []
+    for start in range(1, steps, chunk_size):
+        m = min(chunk_size, steps - start)
+        # (m, n): each step reads one contiguous row
+        dB = np.sqrt(dt)*rng.normal(0, 1, size=(m, n)) if ch != 1 else None
+        crossed = np.empty((m, n), dtype=bool)
+        for j in range(m):
+            coupling.begin_step()
+            f0 = neuron.f(v, w) + coupling.current(v)
+            g0 = neuron.g(v, w)
+            if ch == 3:
+                v_predictor = v + f0*dt
+                w_predictor = w + g0*dt + sigma*dB[j]*w
+                v_new = v + (1/2)*(f0 + neuron.f(v_predictor, w_predictor) + coupling.current(v_predictor))*dt
+                w = w + (1/2)*(g0 + neuron.g(v_predictor, w_predictor))*dt + (1/2)*sigma*(w + w_predictor)*dB[j]
+            else:
+                v_new = v + f0*dt
+                w = w + g0*dt
+                if ch == 2:
+                    w += sigma*dB[j]
+            spiked = (v < v_th) & (v_new >= v_th)
+            crossed[j] = spiked
+            coupling.end_step(spiked)
+            v = v_new
+        st, un = np.nonzero(crossed)
+        unit_idx.append(un)
+        step_idx.append(st + start)
+
+    meta = {
+        "model": "FHN network", "ch": ch, "sigma": sigma, "n": n, "n_synapses": coupling.n_synapses,
+        "params": [np.asarray(p).tolist() for p in (I_ext, a, b, tau)],
+        "E_syn": E_syn, "tau_syn": tau_syn, "dt": dt, "T": T,
+    }
+    return _raster(unit_idx, step_idx, n, meta)
+
+
+def network_lif(sigma, n, gap=None, syn=None, E_syn=0.0, tau_syn=5.0, v0=None,
+                v_th=None, t_ref=None, dt=None, T=None, chunk_size=None, params=None, rng=None):
+    """
+    Simulates n coupled noisy LIF units with the threshold / reset / absolute
+    refractory rules of simulation.additive_noise_lif.
+
+    The coupling current is injected like I_ext (through R), and a unit that
+    is refractory stays clamped at V_r whatever its input.
+
+    Args:
+        sigma (float): Additive noise intensity on the voltage.
+        n (int): Number of units.
+        gap, syn (sparse matrix): Optional (n, n) coupling, as in network_fhn.
+        E_syn (float): Synaptic reversal potential in mV (0 mV is excitatory).
+        tau_syn (float): Decay time of the synaptic gating variable (ms).
+        v0 (float or ndarray): Initial voltage (default V_r).
+        v_th, t_ref, dt, T: Threshold, refractory period and time grid (default: load_settings()).
+        params (tuple): Optional (I_ext, R, V_r, tau) overriding config/lif_params.json;
+            any entry may be an (n,) array.
+        rng (np.random.Generator or int): Random source or seed (simulation.rng).
+
+    Returns:
+        SpikeStore: One row of spike steps per unit, with the run description as metadata.
+    """
+    settings = load_settings()
+    dt = settings.dt if dt is None else dt
+    T = settings.T if T is None else T
+    v_th = settings.v_th_lif if v_th is None else v_th
+    t_ref = settings.t_ref if t_ref is None else t_ref
+    I_ext, R, V_r, tau = path_calling_lif() if params is None else params
+    steps = int(T/dt)
+    chunk_size = _chunk_steps(n, chunk_size)
+    rng = make_rng(rng)
+
+    neuron = LIF(I_ext, R, V_r, tau)
+    coupling = _Coupling(n, gap, syn, E_syn, tau_syn, dt)
+
+    v = np.array(np.broadcast_to(V_r if v0 is None else v0, n), dtype=np.float64)
+    V_reset = np.broadcast_to(V_r, n)
+    refractory_time_left = np.zeros(n)
+
+    unit_idx, step_idx = [], []
+    for start in range(1, steps, chunk_size):
+        m = min(chunk_size, steps - start)
+        noise = sigma*rng.normal(0, 1, size=(m, n))*np.sqrt(dt)
+        crossed = np.empty((m, n), dtype=bool)
+        for j in range(m):
+            refractory = refractory_time_left > 0
+            refractory_time_left = np.where(refractory, refractory_time_left - dt, refractory_time_left)
+
+            coupling.begin_step()
+            I_c = coupling.current(v)
+            v_new = v + (neuron.leaky_integrate_and_fire_model(v) + R*I_c/tau)*dt + noise[j]
+            v_new = np.where(refractory, V_reset, v_new)
+
+            spiked = ~refractory & (v_new >= v_th)
+            v_new[spiked] = V_reset[spiked]
+            refractory_time_left[spiked] = t_ref
+            crossed[j] = spiked
+            coupling.end_step(spiked)
+            v = v_new
+        st, un = np.nonzero(crossed)
+        unit_idx.append(un)
+        step_idx.append(st + start)
+
+    meta = {
+        "model": "LIF network", "ch": 4, "sigma": sigma, "n": n, "n_synapses": coupling.n_synapses,
+        "params": [np.asarray(p).tolist() for p in (I_ext, R, V_r, tau)],
+        "E_syn": E_syn, "tau_syn": tau_syn, "dt": dt, "T": T, "t_ref": t_ref,
+    }
+    return _raster(unit_idx, step_idx, n, meta)
@@ -0,0 +1,102 @@
+"""
+Random streams of the simulators.
+
+Every simulation entry point takes an `rng` argument, which may be
+
+    a np.random.Generator     used as is
+    an int or SeedSequence    a seed (batched ensembles: one stream per trial)
+    None                      a fresh, unseeded Generator
+
+The legacy global np.random state is never used: np.random.seed() has no
+effect on simulations, and simulations in different threads or processes
+cannot disturb each other's draws.
+
+Trial k of an ensemble seeded with s draws from its own stream, child k of
+SeedSequence(s) (trial_seed). Its noise is therefore independent of how many
+trials share its batch, of the chunk size and of the process that runs it:
+the trial simulated alone (rng=trial_rng(s, k)), inside any batch
+(TrialStreams) or on a pool worker follows bit for bit the same trajectory.
+Noise is drawn in blocks, never one number per step.
+"""
+import numpy as np
+
+
+def make_rng(rng=None):
+    """
+    The random source for one trajectory (or one coupled network).
+
+    Args:
+        rng: Generator (returned unchanged), int or SeedSequence seed, or None
+            for a fresh unseeded Generator.
+
+    Returns:
+        np.random.Generator: (or the object passed in, if it already draws normals).
+    """
+    if rng is None or isinstance(rng, (int, np.integer, np.random.SeedSequence)):
+        return np.random.default_rng(rng)
+    return rng
+
+
+def trial_seed(seed, k):
+    """
+    Seed of trial k of an ensemble seeded with seed: SeedSequence(seed).spawn(n)[k],
+    built directly so that any subset of trials can be seeded on its own.
+    """
+    root = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    return np.random.SeedSequence(root.entropy, spawn_key=(*root.spawn_key, k), pool_size=root.pool_size)
+
+
+def trial_rng(seed, k):
+    """Generator of trial k of an ensemble seeded with seed."""
+    return np.random.default_rng(trial_seed(seed, k))
+
+
+class TrialStreams:
+    """
+    Random source for trials start, ..., start + n_trials - 1 of a seeded
+    ensemble. Row k of every (n_trials, chunk) block is drawn from trial
+    start + k's own Generator, so a block holds exactly the draws the trial
+    would see if it ran alone.
+
+    Args:
+        seed (int or SeedSequence): Ensemble seed.
+        n_trials (int): Trials in this batch.
+        start (int): Index of the first trial of the batch in the ensemble.
+    """
+
+    def __init__(self, seed, n_trials, start=0):
+        self.seed = seed
+        self.start = start
+        self.generators = [trial_rng(seed, start + k) for k in range(n_trials)]
+
+    def __len__(self):
+        return len(self.generators)
+
+    def normal(self, loc, scale, size):
+        rows, cols = size
+        if rows != len(self.generators):
+            raise ValueError(f"TrialStreams holds {len(self.generators)} trials, {rows} rows requested")
+        out = np.empty((rows, cols))
+        for k, gen in enumerate(self.generators):
+            out[k] = gen.normal(loc, scale, cols)
+        return out
+
+    def get_state(self):
+        """Bit generator states of every trial (plain, JSON-serializable dicts)."""
+        return [gen.bit_generator.state for gen in self.generators]
+
+    def set_state(self, states):
+        """Restores states from get_state, so the streams continue where they were."""
+        for gen, state in zip(self.generators, states):
+            gen.bit_generator.state = state
+
+
+def batch_rng(rng, n_trials):
+    """
+    The random source of a batch of n_trials trials: seeds become per-trial
+    TrialStreams, Generators (one stream for the whole block) and other
+    sources with a normal(loc, scale, size) method are used as they are.
+    """
+    if isinstance(rng, (int, np.integer, np.random.SeedSequence)):
+        return TrialStreams(rng, n_trials)
+    return make_rng(rng)
@@ -0,0 +1,128 @@
+from collections import namedtuple
+import numpy as np
+from simulation.path_calling import path_calling_fhn
+from simulation.path_calling import path_calling_lif
+from simulation.config import load_settings
+from simulation.kernels import kernel_for, fhn_chunk, lif_chunk, EULER, EULER_MARUYAMA, HEUN
+from simulation.rng import make_rng
+
+# One block of a streamed simulation.
+#   start  : global step index of the first step in the block
+#   stop   : one past the last step in the block
+#   spikes : global step indices of the spikes detected in the block
+#   v, w   : decimated traces (None when decimate is 0; w is None for LIF)
+StreamChunk = namedtuple("StreamChunk", ["start", "stop", "spikes", "v", "w"])
+
+SCHEMES = {1: EULER, 2: EULER_MARUYAMA, 3: HEUN}
+
+
+def stream_fhn(ch, v0, w0, sigma, T=None, dt=None, v_th=None, chunk_size=100_000,
+               decimate=0, params=None, rng=None, backend="python"):
+    """
+    Streams a single FHN simulation block by block, without storing the full traces.
+
+    Only the current (v, w) state is carried between blocks. Each block draws
+    chunk_size normals, advances the state with the scheme selected by ch
+    (1: Euler, 2: Euler-Maruyama, 3: Heun/SRK) and yields the spikes it found,
+    so memory use does not grow with T apart from the spike times themselves.
+
+    Args:
+        ch (int): The simulation type (1: Deterministic, 2: Additive, 3: Multiplicative).
+        v0, w0 (float): Initial conditions.
+        sigma (float): Noise intensity.
+        T (float): Total simulated time in ms.
+        dt (float): Timestep in ms.
+        v_th (float): Spike detection threshold.
+            Unset T, dt and v_th come from simulation.config.load_settings().
+        chunk_size (int): Timesteps per block.
+        decimate (int): Keep every decimate-th sample of v and w (0 keeps none).
+        params (tuple): Optional (I_ext, a, b, tau) overriding config/fhn_params.json.
+        rng (np.random.Generator or int): Random source or seed (simulation.rng).
+        backend (str): "python" or "numba" (see simulation.kernels).
+
+    Yields:
+        StreamChunk: Spikes (global step indices) and optional decimated traces per block.
+    """
+    I_ext,a,b,tau = path_calling_fhn() if params is None else params
+    settings = load_settings()
+    T = settings.T if T is None else T
+    dt = settings.dt if dt is None else dt
+    v_th = settings.v_th_fhn if v_th is None else v_th
+    steps = int(T/dt)
+    scheme = SCHEMES[ch]
+    rng = make_rng(rng)
+    kernel = kernel_for(fhn_chunk, backend)
+
+    v, w = float(v0), float(w0)
+    for start in range(1, steps, chunk_size):
+        n = min(chunk_size, steps - start)
+        z = rng.normal(0, 1, n) if scheme != EULER else np.zeros(n)
+        v, w, spikes, v_trace, w_trace = kernel(scheme, v, w, I_ext, a, b, tau, sigma, dt, v_th, z, start, decimate)
+        if decimate and start == 1:
+            # Step 0 (the initial condition) is part of the decimated trace
+            v_trace = np.concatenate(([float(v0)], v_trace))
+            w_trace = np.concatenate(([float(w0)], w_trace))
+        yield StreamChunk(start, start + n, spikes,
+                          v_trace if decimate else None, w_trace if decimate else None)
+
+
+def stream_lif(sigma, T=None, dt=None, v_th=None, t_ref=None, chunk_size=100_000,
+               decimate=0, params=None, rng=None, backend="python"):
+    """
+    Streams a single noisy LIF simulation block by block, without storing the full trace.
+
+    Carries only the membrane potential and the refractory countdown between
+    blocks. Arguments and output follow stream_fhn; params overrides
+    config/lif_params.json as (I_ext, R, V_r, tau) and t_ref, the refractory
+    period (ms), also defaults to simulation.config.load_settings().
+
+    Yields:
+        StreamChunk: Spikes (global step indices) and an optional decimated v trace per block.
+    """
+    I_ext, R, V_r, tau = path_calling_lif() if params is None else params
+    settings = load_settings()
+    T = settings.T if T is None else T
+    dt = settings.dt if dt is None else dt
+    v_th = settings.v_th_lif if v_th is None else v_th
+    t_ref = settings.t_ref if t_ref is None else t_ref
+    steps = int(T/dt)
+    rng = make_rng(rng)
+    kernel = kernel_for(lif_chunk, backend)
+
+    v, refractory_time_left = float(V_r), 0.0
+    for start in range(1, steps, chunk_size):
+        n = min(chunk_size, steps - start)
+        z = rng.normal(0, 1, n)
+        v, refractory_time_left, spikes, v_trace = kernel(v, refractory_time_left, I_ext, R, V_r, tau,
+                                                          sigma, v_th, t_ref, dt, z, start, decimate)
+        if decimate and start == 1:
+            v_trace = np.concatenate(([float(V_r)], v_trace))
+        yield StreamChunk(start, start + n, spikes, v_trace if decimate else None, None)
+
+
+def stream_spikes(ch, sigma, T=None, **kwargs):
+    """
+    Streams one simulation of the model selected by ch, with the same initial
+    conditions as analysis.ensemble_stats.spikes.
+
+    Yields:
+        StreamChunk: One per block of chunk_size timesteps.
+    """
+    if ch == 1:
+        return stream_fhn(1, *load_settings().initial_conditions(1), 0.0, T, **kwargs)
+    if ch in (2, 3):
+        return stream_fhn(ch, *load_settings().initial_conditions(ch), sigma, T, **kwargs)
+    if ch == 4:
+        return stream_lif(sigma, T, **kwargs)
+    raise ValueError(f"Invalid simulation type: {ch}")
+
+
+def spike_train(ch, sigma, T=None, **kwargs):
+    """
+    Runs a streamed simulation to completion and returns only its spike times.
+
+    Returns:
+        ndarray: Global step indices (int64) of every spike.
+    """
+    chunks = [chunk.spikes for chunk in stream_spikes(ch, sigma, T, **kwargs)]
+    return np.concatenate(chunks) if chunks else np.array([], dtype=np.int64)
@@ -0,0 +1,35 @@
+"""
+Command-line tests: the documented override examples parse and run end to end.
+"""
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def run_main(*args):
+    return subprocess.run([sys.executable, "main.py", *args], cwd=ROOT, capture_output=True, text=True)
+
+
+def test_overrides_before_command(tmp_path):
+    # README example (with T and n-trials cut down): the override flags must not swallow the command
+    result = run_main("--out", str(tmp_path), "--fhn", "I_ext=0.27", "--sim", "dt=0.005", "--sim", "T=50",
+                      "ensemble", "--ch", "2", "--sigma", "0.05", "--n-trials", "4", "--no-cache")
+    assert result.returncode == 0, result.stderr
+
+    [path] = tmp_path.glob("*/metrics.json")
+    metrics = json.loads(path.read_text())
+    assert metrics["dt"] == 0.005
+    assert metrics["T"] == 50
+    assert metrics["n_trials"] == 4
+
+
+@pytest.mark.parametrize("args", [["--fhn", "I_ext"], ["--sim", "dt=not-json"]])
+def test_bad_override_is_a_usage_error(tmp_path, args):
+    result = run_main("--out", str(tmp_path), *args, "ensemble", "--ch", "2")
+    assert result.returncode == 2
+    assert "usage:" in result.stderr
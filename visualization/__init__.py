@@ -1,2 +1,27 @@
-from .timeseries import timeseries
-from .phase_portrait import det_phase_portrait, add_noise_phase_portrait, mult_noise_phase_portrait
\ No newline at end of file
+import importlib
+
+# matplotlib is only imported when a plotting function is first used (PEP 562),
+# so analysis code can import this package without paying for it.
+_LAZY = {
+    "timeseries": "timeseries",
+    "det_phase_portrait": "phase_portrait",
+    "add_noise_phase_portrait": "phase_portrait",
+    "mult_noise_phase_portrait": "phase_portrait",
+    "plot_isi_histogram": "isi_histogram",
+    "plot_bio_comparison": "bio_comparison",
+    "plot_decimated": "decimate",
+}
+
+__all__ = list(_LAZY)
+
+
+def __getattr__(name):
+    if name not in _LAZY:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{_LAZY[name]}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,44 @@
+import matplotlib.pyplot as plt
+import numpy as np
+
+
+def plot_bio_comparison(result, show=True):
+    """
+    Overlays the biological, FHN and LIF ISI densities from analysis.bio_comparison.compare_bio.
+
+    Returns:
+        Figure: The histogram figure (shown unless show=False).
+    """
+    fig, ax = plt.subplots(figsize=(10, 6))
+
+    my_bins = np.arange(0, 160, 4)
+
+    def cv_label(name):
+        # CV with its bootstrap interval when compare_bio computed one
+        interval = result.get(f"{name}_ci")
+        text = f'CV: {result[name]:.2f}'
+        return text if interval is None else f'{text} [{interval[0]:.2f}, {interval[1]:.2f}]'
+
+    if "bio_histogram" in result:
+        # Densities precomputed by analysis.reference: only the bars are drawn
+        density, edges = result["bio_histogram"]
+        bio_kwargs = dict(x=edges[:-1], bins=edges, weights=density)
+    else:
+        bio_kwargs = dict(x=result["bio_isi_ms"], bins=my_bins, density=True)
+    ax.hist(**bio_kwargs, alpha=0.5, color='#2ca02c', label=f'Biological ({cv_label("bio_cv")})', edgecolor='black')
+    ax.hist(result["fhn_isi_ms"], bins=my_bins, density=True, alpha=0.5, color='#9467bd', label=f'{result["fhn_label"]} ({cv_label("fhn_cv")})', edgecolor='black')
+    ax.hist(result["lif_isi_ms"], bins=my_bins, density=True, alpha=0.5, color='#ff7f0e', label=f'LIF ({cv_label("lif_cv")})', edgecolor='black')
+
+    ax.set_title('Inter-Spike Interval Distribution: Models vs. Reality', fontsize=14, fontweight='bold')
+    ax.set_xlabel('Inter-Spike Interval (ms)', fontsize=12)
+    ax.set_ylabel('Probability Density', fontsize=12)
+
+    ax.set_xlim(0, 160)
+
+    ax.legend(fontsize=11, loc='upper right')
+    ax.grid(axis='y', alpha=0.3, linestyle='--')
+
+    fig.tight_layout()
+    if show:
+        plt.show()
+    return fig
@@ -0,0 +1,120 @@
+"""
+Min/max decimation of long, uniformly sampled traces for plotting.
+
+A trace of N samples is split into one bucket per horizontal pixel, and only
+the first and last sample and the minimum and maximum of each bucket are kept
+(in time order). The drawn line then covers exactly the same pixels as the
+full trace, so spike peaks and troughs survive, while matplotlib only sees a
+few thousand points. Buckets are evaluated as one (buckets, size) reshape, so
+10^7 samples decimate in a few tens of milliseconds; memory-mapped traces are
+only read for the visible range.
+
+DecimatedLine redoes the decimation for the visible range whenever the x
+limits change (zoom / pan), so zooming in reveals the full resolution.
+"""
+import numpy as np
+
+# Buckets when the axes width in pixels is unknown (and the minimum otherwise)
+DEFAULT_BINS = 2000
+
+
+def minmax_indices(series, n_bins=DEFAULT_BINS, start=0, stop=None):
+    """
+    Indices of the samples kept by min/max decimation of series[start:stop].
+
+    Args:
+        series (ndarray or list): One trace or several traces of equal length
+            (e.g. [v, w]); the kept indices are the union over all of them.
+        n_bins (int): Number of buckets (about the width in pixels).
+        start (int): First sample of the range.
+        stop (int): End of the range (default: the whole trace).
+
+    Returns:
+        ndarray: Sorted sample indices, at most 2*n_bins*len(series) + 2 of them.
+    """
+    series = [series] if isinstance(series, np.ndarray) and series.ndim == 1 else list(series)
+    stop = len(series[0]) if stop is None else stop
+    n = stop - start
+    if n <= 2*n_bins:
+        return np.arange(start, stop)
+    size = -(-n // n_bins)
+    m = n // size
+    end = start + m*size
+    base = (start + np.arange(m)*size)[:, None]
+    parts = [[start, stop - 1]]
+    for y in series:
+        body = np.asarray(y[start:end]).reshape(m, size)
+        parts.append((body.argmin(axis=1)[:, None] + base).ravel())
+        parts.append((body.argmax(axis=1)[:, None] + base).ravel())
+        if end < stop:
+            tail = np.asarray(y[end:stop])
+            parts.append([end + tail.argmin(), end + tail.argmax()])
+    return np.unique(np.concatenate(parts))
+
+
+def decimate(y, n_bins=DEFAULT_BINS, dt=1.0, t0=0.0):
+    """
+    Min/max-decimated (t, y) of a trace sampled at t0 + k*dt.
+
+    Returns:
+        tuple: (t, y) arrays of the kept samples.
+    """
+    idx = minmax_indices(y, n_bins)
+    return t0 + idx*dt, np.asarray(y[idx])
+
+
+def _pixel_bins(ax):
+    return max(DEFAULT_BINS, int(ax.get_window_extent().width))
+
+
+class DecimatedLine:
+    """
+    A line of a uniformly sampled trace that is re-decimated for the visible x
+    range on every change of the x limits.
+
+    Args:
+        ax (Axes): Axes to draw on.
+        y (ndarray): The full trace (may be memory-mapped).
+        dt (float): Sampling interval, in x units.
+        t0 (float): x of the first sample.
+        n_bins (int): Buckets (default: the axes width in pixels).
+        **kwargs: Passed to ax.plot.
+    """
+
+    def __init__(self, ax, y, dt=1.0, t0=0.0, n_bins=None, **kwargs):
+        self.ax = ax
+        self.y = y if isinstance(y, np.ndarray) else np.asarray(y)
+        self.dt = dt
+        self.t0 = t0
+        self.n_bins = _pixel_bins(ax) if n_bins is None else n_bins
+        t, v = decimate(self.y, self.n_bins, dt, t0)
+        self.line, = ax.plot(t, v, **kwargs)
+        self._range = (0, len(self.y))
+        # A closure, not the bound method: matplotlib only keeps weak
+        # references to bound methods, and the line must outlive this object
+        self._cid = ax.callbacks.connect("xlim_changed", lambda ax: self._update(ax))
+
+    def _update(self, ax):
+        lo, hi = ax.get_xlim()
+        # One sample of margin on each side so the line reaches the axes edges
+        start = int(np.clip(np.floor((lo - self.t0)/self.dt) - 1, 0, len(self.y)))
+        stop = int(np.clip(np.ceil((hi - self.t0)/self.dt) + 2, start, len(self.y)))
+        if (start, stop) == self._range or stop - start < 2:
+            return
+        self._range = (start, stop)
+        idx = minmax_indices(self.y, self.n_bins, start, stop)
+        self.line.set_data(self.t0 + idx*self.dt, np.asarray(self.y[idx]))
+
+    def disconnect(self):
+        """Stops re-decimating on zoom."""
+        self.ax.callbacks.disconnect(self._cid)
+
+
+def plot_decimated(ax, y, dt=1.0, t0=0.0, n_bins=None, **kwargs):
+    """
+    ax.plot of a long uniformly sampled trace through a DecimatedLine.
+
+    Returns:
+        DecimatedLine: Holds the Line2D (.line) and the zoom callback.
+    """
+    return DecimatedLine(ax, y, dt, t0, n_bins, **kwargs)
@@ -1,13 +1,18 @@
 import matplotlib.pyplot as plt
 import numpy as np
 
-def plot_isi_histogram(all_isi, ch, sigma):
+def plot_isi_histogram(all_isi, ch, sigma, show=True):
     """
     Plots the probability density function (PDF) of the Inter-Spike Intervals.
+
+    With show=False the figure is only built (for saving in headless runs).
+
+    Returns:
+        Figure: The histogram figure, or None if there are no ISIs.
     """
-    if not all_isi:
+    if len(all_isi) == 0:
         print("No spikes detected. Cannot plot ISI histogram.")
-        return
+        return None
 
     # Convert timestep counts into actual time (milliseconds)
     dt = 0.01
@@ -29,4 +34,6 @@ def plot_isi_histogram(all_isi, ch, sigma):
     ax.set_ylabel('Probability Density')
     ax.grid(axis='y', alpha=0.5, linestyle='--')
     
-    plt.show()
\ No newline at end of file
+    if show:
+        plt.show()
+    return fig
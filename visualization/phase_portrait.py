@@ -1,13 +1,10 @@
 import matplotlib.pyplot as plt
 import numpy as np
-from Models.FHN import FHN
 import simulation
+from simulation.config import load_settings
+from visualization.decimate import minmax_indices
 
-I_ext,a,b,tau = simulation.path_calling_fhn()
-
-neuron = FHN(a, b, tau, I_ext)
-
-def det_phase_portrait():
+def det_phase_portrait(show=True):
     """
     Generates deterministic trajectories to verify the excitable regime.
     
@@ -19,21 +16,22 @@ def det_phase_portrait():
     #M.E. Yamakou et al. paper Fig.1 shows two trajectories w = -0.45, -0.46
     #A large "action potential" loop starting at w = -0.46
     #A small sub-threshold oscillation starting at w = -0.45
-    v,w,v_e,w_e,J_e = simulation.deterministic(-1.00125,-0.46)
-    plotting(v,w,v_e,w_e)
+    #(the starting point is ic_deterministic of config/simulation.json)
+    v,w,v_e,w_e,J_e = simulation.deterministic(*load_settings().initial_conditions(1))
+    return plotting(v,w,v_e,w_e, show)
 
-def add_noise_phase_portrait(sigma):
+def add_noise_phase_portrait(sigma, show=True, rng=None):
     """
     Generates trajectories driven by additive stochastic noise.
     
     Captures the 'fuzzy' limit cycle where constant random fluctuations 
     force the system out of the stable fixed point into noise-induced spikes.
     """
-    v,w,v_e,w_e,J_e = simulation.additive_noise_fhn(-1.00125,-0.4, sigma)
-    plotting(v,w,v_e,w_e)
+    v,w,v_e,w_e,J_e = simulation.additive_noise_fhn(*load_settings().initial_conditions(2), sigma, rng=rng)
+    return plotting(v,w,v_e,w_e, show)
 
 
-def mult_noise_phase_portrait(sigma):
+def mult_noise_phase_portrait(sigma, show=True, rng=None):
     """
     Why use SRK (Heun) instead of Euler?
     While the Euler-Maruyama method used for additive noise, multiplicative noise 
@@ -45,12 +43,19 @@ def mult_noise_phase_portrait(sigma):
     The Solution: SRK takes a "predictor" step to see where the system is headed, then uses 
     that future value to "correct" the noise and drift estimates.
     """
-    v,w,v_e,w_e,J_e = simulation.multiplicative_noise(-1.00125,-0.4, sigma)
-    plotting(v,w,v_e,w_e)
+    v,w,v_e,w_e,J_e = simulation.multiplicative_noise(*load_settings().initial_conditions(3), sigma, rng=rng)
+    return plotting(v,w,v_e,w_e, show)
+
 
 
+def plotting(v,w,v_e,w_e, show=True):
+    """
+    Draws a trajectory over the nullclines and returns the figure (shown unless show=False).
+    """
+    # Parameters are read at call time, not on import, so edits to
+    # config/fhn_params.json are picked up and importing stays side-effect free
+    I_ext,a,b,tau = simulation.path_calling_fhn()
 
-def plotting(v,w,v_e,w_e):
     V = np.linspace(-3,3,400)
     W = np.linspace(-1.0,1.5,400)
 
@@ -60,7 +65,10 @@ def plotting(v,w,v_e,w_e):
 
     fig, ax = plt.subplots()
 
-    ax.plot(v, w, color='blue')
+    # Min/max of v and w per time bucket keep every excursion of the loop
+    v, w = np.asarray(v), np.asarray(w)
+    idx = minmax_indices([v, w])
+    ax.plot(v[idx], w[idx], color='blue')
     ax.plot(V, v_null, label = 'v-nullcline',color = 'lightpink')
     ax.plot(V, w_null, label = 'w-nullcline',color = '#EFBF04')
     ax.plot(v_e, w_e, 'ro', markersize=8, label=f'Eq Point ({v_e}, {w_e})')
@@ -69,4 +77,6 @@ def plotting(v,w,v_e,w_e):
     ax.set_xlabel('v (membrane potential)')
     ax.set_ylabel('w (recovery variable)')
     ax.set_title('Phase Plane Portrait')
-    plt.show()
\ No newline at end of file
+    if show:
+        plt.show()
+    return fig
\ No newline at end of file
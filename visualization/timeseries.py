@@ -1,35 +1,56 @@
 
 from Models.FHN import FHN
 import matplotlib.pyplot as plt
-import numpy as np
+from simulation.config import load_settings
+from visualization.decimate import plot_decimated
+
+def timeseries(ch, sigma, show=True, results=None, rng=None, dt=None, T=None):
+    """
+    Plots v(t) (and w(t) for the FHN models) of one simulation.
+
+    results can be the output of an already-run simulator (same ch and sigma), 
+    in which case no new simulation is run. Otherwise rng (a Generator or a
+    seed, see simulation.rng) drives the noise. dt is the timestep (ms) of
+    the traces, for the time axis, and T the simulated time; they and the
+    initial conditions default to simulation.config.load_settings().
+
+    Returns:
+        list: The created figures, [v figure] or [v figure, w figure]. With 
+            show=False they are not displayed, only returned.
+    """
+    settings = load_settings()
+    dt = settings.dt if dt is None else dt
+    T = settings.T if T is None else T
 
-def timeseries(ch, sigma):
     # 1. Run the correct simulation based on choice
-    if(int(ch) == 1):
+    if results is not None:
+        pass
+
+    elif(int(ch) == 1):
         from simulation import deterministic
-        results = deterministic(-1.00125,-0.46)
+        results = deterministic(*settings.initial_conditions(1), dt=dt, T=T)
 
     elif(int(ch) == 2):
         from simulation.additive_noise import additive_noise_fhn
-        results = additive_noise_fhn(-1.00125,-0.4,sigma)
+        results = additive_noise_fhn(*settings.initial_conditions(2), sigma, dt=dt, T=T, rng=rng)
 
     elif(int(ch) == 3):
         from simulation import multiplicative_noise
-        results = multiplicative_noise(-1.00125,-0.4,sigma)
+        results = multiplicative_noise(*settings.initial_conditions(3), sigma, dt=dt, T=T, rng=rng)
 
     elif(int(ch) == 4):
         from simulation.additive_noise import additive_noise_lif
-        results = additive_noise_lif(sigma)
+        results = additive_noise_lif(sigma, dt=dt, T=T, rng=rng)
 
     # 2. Extract data (Assuming all return v, w as the first two elements)
     v_data = results[0]
     w_data = results[1]
-    dt = 0.01 
-    t = np.arange(len(v_data)) * dt
 
+    # Traces are min/max-decimated to the axes width (and re-decimated on
+    # zoom), so long runs plot as fast as short ones
     print("Plotting Vt vs T...")
     fig, ax = plt.subplots(figsize=(10, 4))
-    ax.plot(t, v_data, color='red', linewidth=0.8)
+    plot_decimated(ax, v_data, dt, color='red', linewidth=0.8)
     ax.set_ylim([-2.2, 2.2])
     ax.set_yticks([-2, -1, 0, 1, 2])
     ax.set_xlabel('T (ms) ')
@@ -48,14 +69,15 @@ def timeseries(ch, sigma):
         title = f'Simulation: sigma = {sigma}'
     
     ax.set_title(title)
+    figures = [fig]
 
-    plt.show()
+    if show:
+        plt.show()
 
     if ch in [1, 2, 3]:  # Only plot w(t) for FHN simulations
         print("Plotting Wt vs T...")
-        tw = np.arange(len(w_data)) * dt
         fig, ax = plt.subplots(figsize=(10, 4))
-        ax.plot(tw,w_data,color='blue', linewidth=0.8)
+        plot_decimated(ax, w_data, dt, color='blue', linewidth=0.8)
         ax.set_ylim([-1.2,1.7])
         ax.set_yticks([-1.0,-0.5,0,0.5,1,1.5])
         ax.set_xlabel('T (ms)')
@@ -70,14 +92,8 @@ def timeseries(ch, sigma):
             title = f'Multiplicative Noise FHN: sigma = {sigma}'
         
         ax.set_title(title)
-        plt.show()
-
-
-
+        figures.append(fig)
+        if show:
+            plt.show()
 
-
-        
-
-
-
-    
+    return figures